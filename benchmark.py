@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 21:00
+@Auth ： xiaolongtuan
+@File ：benchmark.py
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from colections_cul import split_into_disjoint_sets
+from label_namespace import tree_to_dnf, iter_tree_edges, dnf_mapping_2_set
+from state_resolver import decompose_states
+from workload import generate_workload, build_model
+
+'''
+分阶段基准：对不同规模的合成负载分别计时 tree_to_dnf、split_into_disjoint_sets、decompose_states、
+graph_normalization、graph_union，记录各阶段的峰值内存（tracemalloc），输出随规模变化的曲线。
+结果可写为 JSON 供回归比较：python benchmark.py --sizes 1 2 4 8 --output bench_output.txt --baseline old.json
+'''
+
+STAGES = ['tree_to_dnf', 'split_into_disjoint_sets', 'decompose_states', 'graph_normalization', 'graph_union']
+
+
+def _measure(run, memory):
+    '''
+    :return: (耗时秒数, 峰值内存字节数或 None, run 的返回值)
+    '''
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        value = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return elapsed, peak, value
+
+
+def bench_size(size, seed=0, repeat=3, memory=True, **options):
+    '''
+    单个规模下各阶段取 repeat 次中的最短耗时与最大峰值内存
+    :param options: 传给 JanusPolicyModel 的参数，如 workers
+    :return: {'size', 'policies', 'pairs', 阶段: {'seconds', 'peak_bytes'}}
+    '''
+    workload = generate_workload(size, seed=seed)
+    edges = list(iter_tree_edges(workload.label_trees))
+    EPGs = {p.src_EPG.label for p in workload.policies} | {p.dst_EPG.label for p in workload.policies}
+    states = list({state for p in workload.policies for state in p.state_NFs_map})
+
+    result = {'size': size, 'policies': len(workload.policies)}
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        seconds, peak, dnf = _measure(lambda: tree_to_dnf(edges, workload.label_mapping_pairs), memory)
+        samples['tree_to_dnf'].append((seconds, peak))
+
+        node_sets, _ = dnf_mapping_2_set(dnf)
+        EPG_sets = [node_sets[EPG] for EPG in EPGs if EPG in node_sets]
+        seconds, peak, _ = _measure(lambda: split_into_disjoint_sets(EPG_sets), memory)
+        samples['split_into_disjoint_sets'].append((seconds, peak))
+
+        seconds, peak, _ = _measure(lambda: decompose_states(states), memory)
+        samples['decompose_states'].append((seconds, peak))
+
+        model = build_model(workload, **options)
+        seconds, peak, normalized = _measure(model.graph_normalization, memory)
+        samples['graph_normalization'].append((seconds, peak))
+        result['pairs'] = len(normalized)
+
+        seconds, peak, _ = _measure(lambda: model.graph_union(normalized), memory)
+        samples['graph_union'].append((seconds, peak))
+
+    for stage, runs in samples.items():
+        peaks = [peak for _, peak in runs if peak is not None]
+        result[stage] = {'seconds': min(seconds for seconds, _ in runs), 'peak_bytes': max(peaks) if peaks else None}
+    return result
+
+
+def run_suite(sizes, seed=0, repeat=3, memory=True, **options):
+    return [bench_size(size, seed, repeat, memory, **options) for size in sizes]
+
+
+def format_table(results):
+    # 每个阶段一行，每个规模一列：耗时（毫秒）/ 峰值内存（KiB）
+    header = ['stage'] + [f"size={result['size']}" for result in results]
+    rows = [header, ['policies'] + [str(result['policies']) for result in results],
+            ['pairs'] + [str(result['pairs']) for result in results]]
+    for stage in STAGES:
+        row = [stage]
+        for result in results:
+            seconds, peak = result[stage]['seconds'], result[stage]['peak_bytes']
+            row.append(f'{seconds * 1000:.2f}ms' + (f' / {peak / 1024:.0f}KiB' if peak is not None else ''))
+        rows.append(row)
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def compare(results, baseline, threshold=0.2):
+    '''
+    与基线结果比较，返回耗时增长超过 threshold 的 (规模, 阶段, 基线秒数, 当前秒数)
+    '''
+    previous = {result['size']: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result['size'])
+        if old is None:
+            continue
+        for stage in STAGES:
+            old_seconds, seconds = old[stage]['seconds'], result[stage]['seconds']
+            if old_seconds and seconds > old_seconds * (1 + threshold):
+                regressions.append((result['size'], stage, old_seconds, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='策略图编译分阶段基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help='不记录峰值内存（tracemalloc 会拖慢计时）')
+    parser.add_argument('--output', help='结果写为 JSON')
+    parser.add_argument('--baseline', help='基线 JSON，耗时增长超过阈值时以非零状态退出')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.seed, args.repeat, not args.no_memory, workers=args.workers)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for size, stage, old_seconds, seconds in regressions:
+            print(f'回退: size={size} {stage} {old_seconds * 1000:.2f}ms -> {seconds * 1000:.2f}ms')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
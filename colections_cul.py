@@ -4,32 +4,253 @@
 @Auth ： xiaolongtuan
 @File ：colections_cul.py
 """
-from functools import reduce
-from itertools import combinations
+import weakref
+from collections import defaultdict
+
+
+def compute_atoms(sets):
+    '''
+    按成员签名划分原子：每个元素所属的集合下标构成其签名，签名相同的元素属于同一个原子。
+    只需遍历一次所有元素，复杂度为 O(所有集合大小之和)，不再枚举集合组合。
+
+    :param sets: 集合列表
+    :return: (atoms, memberships)，atoms[i] 为第 i 个不相交原子，
+             memberships[i] 为包含该原子的原始集合下标元组（升序）
+    '''
+    signatures = defaultdict(list)  # 元素 -> 包含它的集合下标
+    for index, s in enumerate(sets):
+        for element in s:
+            signatures[element].append(index)
+
+    groups = defaultdict(set)  # 签名 -> 原子
+    for element, signature in signatures.items():
+        groups[tuple(signature)].add(element)
+
+    # 与原先的组合枚举保持相同的输出顺序：组合越大越靠前，同样大小按字典序
+    ordered = sorted(groups, key=lambda signature: (-len(signature), signature))
+    atoms = [groups[signature] for signature in ordered]
+    return atoms, ordered
+
+
+def mask_from_indices(indices):
+    # 由下标构造位图，先写入 bytearray 再一次性转换，避免逐位移位产生的大整数复制
+    indices = list(indices)
+    if not indices:
+        return 0
+    buffer = bytearray(max(indices) // 8 + 1)
+    for index in indices:
+        buffer[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(mask):
+    # 按升序遍历位图中置 1 的下标
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (byte_index << 3) + low.bit_length() - 1
+            byte ^= low
 
 
 def split_into_disjoint_sets(sets):
     # 将EPGs拆分为不相交集合，同时记录他们与原始EPGs的关联，用于后面的约束复制
-    all_elements = set().union(*sets)
-    disjoint_sets = []
-
-    # 找到所有可能的交集
-    all_intersections = []
-    for i in reversed(range(1, len(sets) + 1)):
-        for combo in combinations(sets, i):
-            intersect = set.intersection(*combo)
-            if intersect:
-                all_intersections.append(intersect)
-
-    # 去重并确保每个元素只出现在一个集合中
-    used_elements = set()
-    for intersect in all_intersections:
-        intersect -= used_elements
-        if intersect:
-            disjoint_sets.append(intersect)
-            used_elements.update(intersect)
-
-    return disjoint_sets
+    atoms, _ = compute_atoms(sets)
+    return atoms
+
+
+class AtomIndex:
+    '''
+    原子倒排索引，每次规范化构建一次，之后可随集合的增删增量维护：
+    叶标签编号 -> 所属原子，集合键（如EPG标签） -> 其包含的原子，原子 -> 包含它的集合键
+    原子以位图表示
+    '''
+
+    def __init__(self, keyed_masks: {}, components=None):
+        '''
+        :param components: 可选，集合键 -> 所属分量；不同分量的集合必然互斥，按分量分别划分原子，
+                           分量内只有一个集合时直接以其位图为原子
+        '''
+        self.members = {}  # 原子 -> 集合键元组
+        self.signature_atom = {}  # frozenset(集合键) -> 原子，用于删除集合后合并签名相同的原子
+        self.leaf_atom = {}  # 叶标签编号 -> 原子
+        self.key_atoms = defaultdict(dict)  # 集合键 -> 原子（以dict作有序集合）
+
+        groups = defaultdict(list)
+        for key in keyed_masks:
+            groups[None if components is None else components[key]].append(key)
+        for keys in groups.values():
+            if len(keys) == 1:
+                if keyed_masks[keys[0]]:
+                    self._add_atom(keyed_masks[keys[0]], (keys[0],))
+                continue
+            leaf_atoms, memberships = compute_atoms([iter_bits(keyed_masks[key]) for key in keys])
+            for leaves, membership in zip(leaf_atoms, memberships):
+                self._add_atom(mask_from_indices(leaves), tuple(keys[index] for index in membership))
+
+    @property
+    def atoms(self):
+        return list(self.members)
+
+    def atoms_of(self, key):
+        return list(self.key_atoms.get(key, ()))
+
+    def atom_of_leaf(self, leaf):
+        return self.leaf_atom.get(leaf)
+
+    def _add_atom(self, atom, member_keys, leaves_changed=True):
+        self.members[atom] = member_keys
+        self.signature_atom[frozenset(member_keys)] = atom
+        for key in member_keys:
+            self.key_atoms[key][atom] = None
+        if leaves_changed:
+            for leaf in iter_bits(atom):
+                self.leaf_atom[leaf] = atom
+
+    def _drop_atom(self, atom):
+        member_keys = self.members.pop(atom)
+        del self.signature_atom[frozenset(member_keys)]
+        for key in member_keys:
+            atoms = self.key_atoms[key]
+            del atoms[atom]
+            if not atoms:
+                del self.key_atoms[key]
+        return member_keys
+
+    def add_set(self, key, mask):
+        '''
+        增量加入一个集合，只拆分与其相交的原子
+
+        :return: (removed, added)，被移除的原子与新增的原子；成员变化而位图不变的原子同时出现在两者中
+        '''
+        touched = {}
+        fresh = []
+        for leaf in iter_bits(mask):
+            atom = self.leaf_atom.get(leaf)
+            if atom is None:
+                fresh.append(leaf)
+            else:
+                touched[atom] = None
+
+        removed, added = [], []
+        for atom in touched:
+            member_keys = self._drop_atom(atom)
+            removed.append(atom)
+            inside = atom & mask
+            outside = atom & ~mask
+            if outside:
+                self._add_atom(outside, member_keys)
+                added.append(outside)
+            self._add_atom(inside, member_keys + (key,), leaves_changed=bool(outside))
+            added.append(inside)
+        if fresh:
+            atom = mask_from_indices(fresh)
+            self._add_atom(atom, (key,))
+            added.append(atom)
+        return removed, added
+
+    def remove_set(self, key):
+        '''
+        增量删除一个集合，失去唯一归属的叶被移除，签名变得相同的原子被合并
+
+        :return: (removed, added)
+        '''
+        removed, added = [], []
+        for atom in list(self.key_atoms.get(key, ())):
+            member_keys = tuple(k for k in self._drop_atom(atom) if k != key)
+            removed.append(atom)
+            if not member_keys:
+                for leaf in iter_bits(atom):
+                    del self.leaf_atom[leaf]
+                continue
+            twin = self.signature_atom.get(frozenset(member_keys))
+            if twin is None:
+                self._add_atom(atom, member_keys, leaves_changed=False)
+                added.append(atom)
+            else:
+                self._drop_atom(twin)
+                if twin in added:  # 本轮刚产生的原子
+                    added.remove(twin)
+                else:
+                    removed.append(twin)
+                merged = twin | atom
+                self._add_atom(merged, member_keys)
+                added.append(merged)
+        return removed, added
+
+
+class FrozenDict(dict):
+    '''
+    只读 dict：构造时计算一次哈希，可作为 dict 键或集合成员，读取接口与 dict 相同
+    '''
+    __slots__ = ('_hash',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hash = hash(frozenset(self.items()))
+
+    def __hash__(self):
+        return self._hash
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('FrozenDict 不可修改')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    # 递归转换为不可变、可哈希的形式：dict -> FrozenDict，list -> tuple，set -> frozenset
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(freeze(item) for item in value)
+    return value
+
+
+def freeze_result(atomic_state_value_map):
+    # 合并结果 原子状态 -> (NFs, Qos) 的只读形式：NF 链为元组，可在输入相同的源目的对之间安全共享
+    if isinstance(atomic_state_value_map, FrozenDict):
+        return atomic_state_value_map
+    # 沿用自旧结果的值已是只读形式，保持共享
+    return FrozenDict((atomic_state, value if isinstance(value[0], tuple) else (tuple(value[0]), value[1]))
+                      for atomic_state, value in atomic_state_value_map.items())
+
+
+class InternTable:
+    '''
+    驻留表：内容键 -> 唯一对象。以弱引用保存，不再被引用的对象自动移出
+    '''
+
+    def __init__(self):
+        self._table = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._table)
+
+    def intern(self, key, factory):
+        obj = self._table.get(key)
+        if obj is not None:
+            self.hits += 1
+            return obj
+        self.misses += 1
+        obj = self._table[key] = factory()
+        return obj
 
 
 if __name__ == '__main__':
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 18:40
+@Auth ： xiaolongtuan
+@File ：compile_store.py
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+from collections.abc import Mapping
+from enum import Enum
+
+from sympy import Basic, srepr
+
+from colections_cul import FrozenDict
+from label_namespace import LabelInterner
+
+'''
+编译结果的持久化存储，用于控制器重启：
+    输入（标签树、标签映射、策略）完全不变时，只读取文件头与索引，编译结果按需解码；
+    部分输入变化时正常编译，但输入摘要未变的源目的对直接从旧文件读取结果，不再合并。
+
+文件布局（小端）：
+    文件头  MAGIC、格式版本、模型输入摘要、各段的偏移与长度
+    表段    pickle 的 (叶标签列表, NF 列表, 原子状态列表, Qos 列表)，条目中均以编号引用
+    条目段  每个合并结果一个条目：原子状态数 I，之后每个原子状态为 状态编号 I、Qos编号 I、NF数 H、NF编号 I*n
+    索引段  按源目的对输入摘要排序的定长记录 (摘要 16s, 偏移 Q, 长度 I)，通过 mmap 二分查找
+    源目的对段  pickle 的 [(src原子, dst原子, 条目序号)]，只在输入完全不变时读取
+输入相同的源目的对共享同一个条目
+'''
+
+MAGIC = b'JPGCSTOR'
+FORMAT_VERSION = 1
+DIGEST_SIZE = 16
+
+_HEADER = struct.Struct('<8sHH16sQQQQQQ')  # magic, 版本, 保留, 模型摘要, 表段, 条目段起点, 索引段, 索引条数, 源目的对段, 其长度
+_INDEX_RECORD = struct.Struct('<16sQI')
+_COUNT = struct.Struct('<I')
+_ATOMIC_STATE = struct.Struct('<IIH')
+
+
+def _canonical(obj):
+    '''
+    跨进程稳定的规范文本：不依赖随机化的 hash 与对象身份，dict 按键排序
+    '''
+    if isinstance(obj, Basic):
+        return srepr(obj)
+    if isinstance(obj, Enum):
+        return f'{type(obj).__name__}.{obj.name}'
+    if isinstance(obj, dict):
+        return '{' + ','.join(sorted(f'{_canonical(key)}:{_canonical(value)}' for key, value in obj.items())) + '}'
+    if isinstance(obj, (list, tuple)):
+        return '(' + ','.join(_canonical(item) for item in obj) + ')'
+    if isinstance(obj, (set, frozenset)):
+        return '{' + ','.join(sorted(_canonical(item) for item in obj)) + '}'
+    if hasattr(obj, 'match') and hasattr(obj, 'action'):  # NFBNode
+        return 'NF' + _canonical((obj.label, obj.match, obj.action, obj.priority, obj.qos))
+    return repr(obj)
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+def pair_digest(states_value_map):
+    # 源目的对输入（状态及其 NF 链与 Qos，保持顺序）的内容摘要
+    return _digest(_canonical([(state, NFs_Qos_list) for state, NFs_Qos_list in states_value_map.items()]))
+
+
+def model_digest(model):
+    # 模型全部输入的内容摘要，与格式版本一起决定是否可以整体复用
+    policies = [(p.src_EPG.label, p.dst_EPG.label, list(p.state_NFs_map.items())) for p in model.policys]
+    return _digest(_canonical((FORMAT_VERSION, model.label_trees_edges, model.label_mapping_pairs, policies)))
+
+
+class CompileStore:
+    '''
+    只读的存储文件：mmap 打开，表段在第一次解码条目时才读取，条目按摘要二分查找后解码
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空文件
+            self._file.close()
+            raise
+        (magic, version, _, self.model_digest, self._tables_offset, self._entries_offset, self._index_offset,
+         self._index_count, self._pairs_offset, self._pairs_length) = _HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'不支持的编译存储文件: {path}')
+        self._tables = None
+        self._decoded = {}  # 条目偏移 -> 结果，同一条目只解码一次以保持共享
+
+    @classmethod
+    def open(cls, path):
+        '''
+        :return: CompileStore；文件不存在、为空或版本不符时返回 None
+        '''
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (ValueError, struct.error):
+            return None
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._index_count
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            self._tables = pickle.loads(self._data[self._tables_offset:self._entries_offset])
+        return self._tables
+
+    @property
+    def labels(self):
+        return self.tables[0]
+
+    def _record(self, position):
+        return _INDEX_RECORD.unpack_from(self._data, self._index_offset + position * _INDEX_RECORD.size)
+
+    def _decode(self, entry_offset):
+        result = self._decoded.get(entry_offset)
+        if result is not None:
+            return result
+        _, NFs, states, qos_values = self.tables
+        result = {}
+        offset = entry_offset
+        (count,) = _COUNT.unpack_from(self._data, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            state_id, qos_id, length = _ATOMIC_STATE.unpack_from(self._data, offset)
+            offset += _ATOMIC_STATE.size
+            NF_ids = struct.unpack_from(f'<{length}I', self._data, offset)
+            offset += 4 * length
+            result[states[state_id]] = (tuple(NFs[NF_id] for NF_id in NF_ids), qos_values[qos_id])
+        # 摘要相同的源目的对共享解码结果，以只读形式保存
+        result = self._decoded[entry_offset] = FrozenDict(result)
+        return result
+
+    def get(self, digest):
+        '''
+        :return: 摘要对应的 原子状态 -> (NFs, Qos)，不存在时返回 None
+        '''
+        lo, hi = 0, self._index_count
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self._record(middle)[0] < digest:
+                lo = middle + 1
+            else:
+                hi = middle
+        if lo < self._index_count:
+            record_digest, offset, _ = self._record(lo)
+            if record_digest == digest:
+                return self._decode(offset)
+        return None
+
+    def lookup(self, states_value_map):
+        return self.get(pair_digest(states_value_map))
+
+    def compiled(self):
+        # 整体复用：源目的对 -> 惰性解码的结果
+        return LazyCompiled(self, pickle.loads(self._data[self._pairs_offset:self._pairs_offset + self._pairs_length]))
+
+
+class LazyCompiled(Mapping):
+    '''
+    只读的编译结果视图，访问某个源目的对时才解码其条目
+    '''
+
+    def __init__(self, store, pairs):
+        self.store = store
+        self._entries = {(src, dst): entry for src, dst, entry in pairs}
+
+    def __getitem__(self, pair):
+        return self.store._decode(self.store._record(self._entries[pair])[1])
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def write_store(model, path, digest=None):
+    '''
+    将模型的编译结果写入 path（先写临时文件再替换）
+    '''
+    labels = list(model.label_interner.labels)
+    NF_ids, state_ids, qos_ids = {}, {}, {}
+    entries = {}  # 输入摘要 -> 条目字节
+    pair_digests = {}
+    for pair, atomic_state_value_map in model.compiled.items():
+        entry_digest = pair_digest(model.pair_inputs[pair])
+        pair_digests[pair] = entry_digest
+        if entry_digest in entries:
+            continue
+        parts = [_COUNT.pack(len(atomic_state_value_map))]
+        for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items():
+            ids = [NF_ids.setdefault(NF, len(NF_ids)) for NF in atomic_FNs]
+            parts.append(_ATOMIC_STATE.pack(state_ids.setdefault(atomic_state, len(state_ids)),
+                                            qos_ids.setdefault(atomic_qos, len(qos_ids)), len(ids)))
+            parts.append(struct.pack(f'<{len(ids)}I', *ids))
+        entries[entry_digest] = b''.join(parts)
+
+    tables = pickle.dumps((labels, list(NF_ids), list(state_ids), list(qos_ids)), protocol=pickle.HIGHEST_PROTOCOL)
+    ordered = sorted(entries)
+    positions = {entry_digest: position for position, entry_digest in enumerate(ordered)}
+    pairs = pickle.dumps([(src, dst, positions[pair_digests[(src, dst)]]) for src, dst in model.compiled],
+                         protocol=pickle.HIGHEST_PROTOCOL)
+
+    tables_offset = _HEADER.size
+    entries_offset = tables_offset + len(tables)
+    index = []
+    offset = entries_offset
+    for entry_digest in ordered:
+        index.append(_INDEX_RECORD.pack(entry_digest, offset, len(entries[entry_digest])))
+        offset += len(entries[entry_digest])
+    index_offset = offset
+    pairs_offset = index_offset + len(index) * _INDEX_RECORD.size
+
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, digest or model_digest(model), tables_offset, entries_offset,
+                             index_offset, len(index), pairs_offset, len(pairs)))
+        f.write(tables)
+        for entry_digest in ordered:
+            f.write(entries[entry_digest])
+        f.writelines(index)
+        f.write(pairs)
+    os.replace(temp_path, path)
+
+
+def compile_with_store(model, path):
+    '''
+    启动时编译：输入与存储完全一致时直接返回惰性结果（模型保持未编译状态，之后调用 compile() 为全量编译）；
+    否则编译模型，摘要未变的源目的对复用存储中的结果，最后写回存储
+    :return: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)，原子以 model.label_interner 的位图表示
+    '''
+    digest = model_digest(model)
+    store = CompileStore.open(path)
+    if store is not None and store.model_digest == digest and model.compiled is None \
+            and (not len(model.label_interner) or model.label_interner.labels == store.labels):
+        if not len(model.label_interner):
+            model.label_interner = LabelInterner(store.labels)  # 原子位图沿用存储中的叶标签编号
+        return store.compiled()
+
+    model.compile_store = store
+    try:
+        compiled = model.compile()
+    finally:
+        model.compile_store = None
+    if store is not None:
+        store.close()
+    write_store(model, path, digest)
+    return compiled
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 20:05
+@Auth ： xiaolongtuan
+@File ：compiled_diff.py
+"""
+from collections import namedtuple
+
+'''
+两次编译结果之间的增量：以 (src原子, dst原子, 原子状态) 为键，输出新增、删除、修改的条目，
+下发到数据平面时只需推送这些变化。
+    diff_compiled        两个编译结果按哈希键比较，复杂度与条目数线性；结果对象相同的源目的对直接跳过
+    compile_delta        对模型做增量编译，只比较本次编译涉及的脏源目的对
+    diff_sorted_records  两个按键排序的记录流归并比较，不需要把任一侧整体载入内存
+'''
+
+ADDED, REMOVED, MODIFIED = 'added', 'removed', 'modified'
+
+# old / new 为 (NFs, Qos)，新增时 old 为 None，删除时 new 为 None
+DeltaEntry = namedtuple('DeltaEntry', ['kind', 'src', 'dst', 'state', 'old', 'new'])
+
+
+def _value(NFs_Qos):
+    return list(NFs_Qos[0]), NFs_Qos[1]
+
+
+def _same(value, other):
+    return value[1] == other[1] and list(value[0]) == list(other[0])
+
+
+def _diff_pair(src, dst, old_map, new_map):
+    old_map = old_map or {}
+    new_map = new_map or {}
+    for state, value in old_map.items():
+        other = new_map.get(state)
+        if other is None:
+            yield DeltaEntry(REMOVED, src, dst, state, _value(value), None)
+        elif not _same(value, other):
+            yield DeltaEntry(MODIFIED, src, dst, state, _value(value), _value(other))
+    for state, other in new_map.items():
+        if state not in old_map:
+            yield DeltaEntry(ADDED, src, dst, state, None, _value(other))
+
+
+def _relabel(compiled, label_interner):
+    # 原子位图换为叶标签 frozenset，使不同叶标签编号的编译结果可以比较
+    return {(frozenset(label_interner.from_mask(src)), frozenset(label_interner.from_mask(dst))): atomic_state_value_map
+            for (src, dst), atomic_state_value_map in compiled.items()}
+
+
+def diff_compiled(old, new, pairs=None, old_interner=None, new_interner=None):
+    '''
+    :param old, new: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)
+    :param pairs: 只比较这些源目的对（已知其余未变时使用）；缺省比较两侧全部源目的对
+    :param old_interner, new_interner: 两侧叶标签编号不同时给出，原子以叶标签 frozenset 比较与输出
+    :return: DeltaEntry 生成器
+    '''
+    if old_interner is not None and new_interner is not None and old_interner is not new_interner:
+        old, new = _relabel(old, old_interner), _relabel(new, new_interner)
+        pairs = None  # 位图表示的源目的对在换算后不再适用
+    if pairs is None:
+        pairs = list(old)
+        pairs.extend(pair for pair in new if pair not in old)
+    for pair in pairs:
+        old_map, new_map = old.get(pair), new.get(pair)
+        if old_map is new_map:
+            continue  # 共享的结果对象（未重新合并或哈希一致化的结果）
+        yield from _diff_pair(pair[0], pair[1], old_map, new_map)
+
+
+def compile_delta(model):
+    '''
+    编译模型并产出与上一次编译结果之间的增量；首次编译时全部条目为新增
+    '''
+    if model.compiled is None:
+        compiled = model.compile()
+        yield from diff_compiled({}, compiled)
+        return
+    old = dict(model.compiled)  # 增量编译就地替换源目的对的结果，先保留旧的引用
+    dirty_pairs = set(model.dirty_pairs)
+    compiled = model.compile()
+    yield from diff_compiled(old, compiled, pairs=dirty_pairs)
+
+
+def record_key(record):
+    # 编译记录（compiled_export.CompiledRecord）的排序键；读回的原子为叶标签列表时转换为元组
+    src = tuple(record.src) if isinstance(record.src, list) else record.src
+    dst = tuple(record.dst) if isinstance(record.dst, list) else record.dst
+    return src, dst, str(record.state)
+
+
+def diff_sorted_records(old_records, new_records, key=record_key):
+    '''
+    两个按 key 升序排列的记录流归并比较，每侧只保留当前一条记录
+    :return: DeltaEntry 生成器，state 为记录中的原子状态
+    '''
+    old_records, new_records = iter(old_records), iter(new_records)
+    old_record, new_record = next(old_records, None), next(new_records, None)
+    while old_record is not None or new_record is not None:
+        old_key = key(old_record) if old_record is not None else None
+        new_key = key(new_record) if new_record is not None else None
+        if new_record is None or (old_record is not None and old_key < new_key):
+            yield DeltaEntry(REMOVED, old_record.src, old_record.dst, old_record.state,
+                             (list(old_record.NFs), old_record.qos), None)
+            old_record = next(old_records, None)
+        elif old_record is None or new_key < old_key:
+            yield DeltaEntry(ADDED, new_record.src, new_record.dst, new_record.state,
+                             None, (list(new_record.NFs), new_record.qos))
+            new_record = next(new_records, None)
+        else:
+            old_value = (list(old_record.NFs), old_record.qos)
+            new_value = (list(new_record.NFs), new_record.qos)
+            if not _same(old_value, new_value):
+                yield DeltaEntry(MODIFIED, new_record.src, new_record.dst, new_record.state, old_value, new_value)
+            old_record, new_record = next(old_records, None), next(new_records, None)
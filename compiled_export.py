@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 19:25
+@Auth ： xiaolongtuan
+@File ：compiled_export.py
+"""
+import json
+from collections import namedtuple
+from enum import Enum
+
+'''
+编译结果的流式导出：记录逐条产出（JanusPolicyModel.iter_compile 或 iter_records），逐条写入 sink，
+sink 只保存原子、状态、NF、Qos 的编号表，内存占用与不同取值的数量相关，而不是与记录数量相关。
+
+二进制规则格式：MAGIC 之后为一串记录，每条记录以类型字节开头，整数均为无符号 LEB128 变长编码，
+    定义记录  类型(ATOM/STATE/NF/QOS)、编号、UTF-8 JSON 长度、JSON，在第一次被引用之前写出
+    规则记录  类型 RULE、src原子编号、dst原子编号、状态编号、Qos编号、NF数、NF编号*n
+'''
+
+# (src原子, dst原子, 原子状态, NF链, Qos)，原子为叶标签位图
+CompiledRecord = namedtuple('CompiledRecord', ['src', 'dst', 'state', 'NFs', 'qos'])
+
+BINARY_MAGIC = b'JPGRULE1'
+ATOM, STATE, NF, QOS, RULE = 1, 2, 3, 4, 16
+
+
+def iter_records(compiled):
+    # 已有编译结果（dict 或 compile_store.LazyCompiled）转换为记录流
+    for (src, dst), atomic_state_value_map in compiled.items():
+        for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items():
+            yield CompiledRecord(src, dst, atomic_state, atomic_FNs, atomic_qos)
+
+
+def _jsonable(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_jsonable(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def NF_to_json(NF):
+    return {'nf': NF.label, 'match': _jsonable(NF.match), 'action': _jsonable(NF.action), 'priority': NF.priority}
+
+
+class JsonLinesSink:
+    '''
+    每条记录写为一行 JSON：src/dst 为叶标签列表，state 为状态表达式文本
+    '''
+
+    def __init__(self, stream, label_interner):
+        self.stream = stream
+        self.label_interner = label_interner
+        self.count = 0
+        self._atoms = {}  # 原子 -> 叶标签列表
+
+    def _labels(self, atom):
+        labels = self._atoms.get(atom)
+        if labels is None:
+            labels = self._atoms[atom] = _jsonable(self.label_interner.from_mask(atom))
+        return labels
+
+    def write(self, record: CompiledRecord):
+        self.stream.write(json.dumps({
+            'src': self._labels(record.src),
+            'dst': self._labels(record.dst),
+            'state': str(record.state),
+            'NFs': [NF_to_json(NF) for NF in record.NFs],
+            'qos': _jsonable(record.qos),
+        }, ensure_ascii=False))
+        self.stream.write('\n')
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+class BinaryRuleSink:
+    '''
+    紧凑二进制规则格式（见模块说明），写入二进制流
+    '''
+
+    def __init__(self, stream, label_interner):
+        self.stream = stream
+        self.label_interner = label_interner
+        self.count = 0
+        self._ids = {ATOM: {}, STATE: {}, NF: {}, QOS: {}}
+        stream.write(BINARY_MAGIC)
+
+    def _id(self, kind, value, to_json):
+        ids = self._ids[kind]
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(ids)
+            payload = json.dumps(to_json(value), ensure_ascii=False).encode('utf-8')
+            self.stream.write(bytes((kind,)) + _varint(value_id) + _varint(len(payload)) + payload)
+        return value_id
+
+    def write(self, record: CompiledRecord):
+        atom_json = lambda atom: _jsonable(self.label_interner.from_mask(atom))
+        src = self._id(ATOM, record.src, atom_json)
+        dst = self._id(ATOM, record.dst, atom_json)
+        state = self._id(STATE, record.state, str)
+        qos = self._id(QOS, record.qos, _jsonable)
+        NF_ids = [self._id(NF, NF_node, NF_to_json) for NF_node in record.NFs]
+        self.stream.write(bytes((RULE,)) + b''.join(_varint(value) for value in (src, dst, state, qos, len(NF_ids)))
+                          + b''.join(_varint(NF_id) for NF_id in NF_ids))
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+
+def _read_varint(stream):
+    value = 0
+    shift = 0
+    while True:
+        data = stream.read(1)
+        if not data:
+            raise EOFError('二进制规则流不完整')
+        value |= (data[0] & 0x7F) << shift
+        if not data[0] & 0x80:
+            return value
+        shift += 7
+
+
+def read_binary_rules(stream):
+    '''
+    读取二进制规则流，逐条产出 CompiledRecord，其中原子为叶标签列表，状态为文本，NF 为 dict
+    '''
+    if stream.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError('不是二进制规则流')
+    tables = {ATOM: [], STATE: [], NF: [], QOS: []}
+    while True:
+        kind = stream.read(1)
+        if not kind:
+            return
+        kind = kind[0]
+        if kind == RULE:
+            src, dst, state, qos, length = (_read_varint(stream) for _ in range(5))
+            NFs = [tables[NF][_read_varint(stream)] for _ in range(length)]
+            yield CompiledRecord(tables[ATOM][src], tables[ATOM][dst], tables[STATE][state], NFs, tables[QOS][qos])
+        elif kind in tables:
+            value_id = _read_varint(stream)
+            payload = stream.read(_read_varint(stream))
+            if value_id != len(tables[kind]):
+                raise ValueError('二进制规则流中的定义记录编号不连续')
+            tables[kind].append(json.loads(payload.decode('utf-8')))
+        else:
+            raise ValueError(f'未知的记录类型: {kind}')
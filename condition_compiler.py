@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 22:40
+@Auth ： xiaolongtuan
+@File ：condition_compiler.py
+"""
+import ast
+import operator
+from itertools import product
+
+import numpy as np
+from sympy import S, Symbol, And, Or, Not, Eq, Ne, Add, Mul, Pow
+from sympy.core.relational import Relational
+from sympy.logic.boolalg import BooleanTrue, BooleanFalse, BooleanFunction, BooleanAtom
+
+from interval_resolver import to_box_form, EMPTY_BOX
+from policy_graph_error import InvalidPolicyGraphError
+
+'''
+条件编译：把 DiEdge.condition 的字符串（如 'filed_connections > 2'）、策略状态与 decompose_states 的原子状态
+编译为只读计数器数组的 Python 闭包，运行时选择生效的原子状态不再经过 sympy 或 eval。
+    parse_condition     以 ast 解析条件字符串为 sympy 表达式（只接受比较、布尔与算术运算）
+    CounterLayout       计数器变量 -> 计数器数组下标
+    compile_condition   条件 -> 闭包 predicate(values)，values 为按 CounterLayout 排列的计数器数组
+    PredicateTable      一组互斥原子状态的选择器，单次选择逐个调用闭包，批量选择在上下界数组上向量化判断
+
+    layout = CounterLayout()
+    selectors = compile_pair_states(model.compiled, layout)
+    values = layout.vector({'connection': 5})
+    state = selectors[pair].state_of(values)
+'''
+
+_BUILD_COMPARE = {ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+                  ast.Eq: Eq, ast.NotEq: Ne}
+_BUILD_BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+                 ast.Pow: operator.pow}
+# & 与 | 只作为逻辑运算接受，两侧须为比较或逻辑表达式：& 的优先级高于比较，a > 1 & b < 2 实为 a > (1 & b) < 2
+_BUILD_LOGIC = {ast.BitAnd: And, ast.BitOr: Or}
+
+_RUNTIME_COMPARE = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+                    '==': operator.eq, '!=': operator.ne}
+
+
+def _is_boolean(expr):
+    return isinstance(expr, (Relational, BooleanFunction, BooleanAtom))
+
+
+def _build(node, text):
+    if isinstance(node, ast.Expression):
+        return _build(node.body, text)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+        return S(node.value)
+    if isinstance(node, ast.Name):
+        return Symbol(node.id)
+    if isinstance(node, ast.BoolOp):
+        parts = [_build(value, text) for value in node.values]
+        return And(*parts) if isinstance(node.op, ast.And) else Or(*parts)
+    if isinstance(node, ast.UnaryOp):
+        operand = _build(node.operand, text)
+        if isinstance(node.op, ast.Not) or (isinstance(node.op, ast.Invert) and _is_boolean(operand)):
+            return Not(operand)
+        if isinstance(node.op, ast.USub):
+            return -operand
+        if isinstance(node.op, ast.UAdd):
+            return operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _BUILD_BINARY:
+        return _BUILD_BINARY[type(node.op)](_build(node.left, text), _build(node.right, text))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BUILD_LOGIC:
+        left, right = _build(node.left, text), _build(node.right, text)
+        if not (_is_boolean(left) and _is_boolean(right)):
+            raise InvalidPolicyGraphError(f'& 与 | 两侧须为比较或逻辑表达式（比较需加括号）: {text}')
+        return _BUILD_LOGIC[type(node.op)](left, right)
+    if isinstance(node, ast.Compare) and all(type(op) in _BUILD_COMPARE for op in node.ops):
+        # 链式比较 a < b < c 即 a < b and b < c
+        operands = [_build(node.left, text)] + [_build(comparator, text) for comparator in node.comparators]
+        return And(*(_BUILD_COMPARE[type(op)](left, right)
+                     for op, left, right in zip(node.ops, operands, operands[1:])))
+    raise InvalidPolicyGraphError(f'不支持的条件语法: {text}')
+
+
+def parse_condition(text):
+    '''
+    解析条件字符串为 sympy 表达式，不经过 eval
+    '''
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise InvalidPolicyGraphError(f'条件无法解析: {text}') from e
+    return _build(tree, text)
+
+
+def as_condition(condition):
+    # 字符串、布尔值、None（无条件）统一为 sympy 表达式
+    if condition is None or (isinstance(condition, str) and not condition.strip()):
+        return S.true
+    if isinstance(condition, str):
+        return parse_condition(condition)
+    if isinstance(condition, bool):
+        return S(condition)
+    return condition
+
+
+def condition_variables(condition):
+    # 条件引用的计数器变量名
+    return frozenset(symbol.name for symbol in as_condition(condition).free_symbols)
+
+
+class CounterLayout:
+    '''
+    计数器变量名 -> 计数器数组下标，编译条件时遇到的新变量依次追加
+    '''
+
+    def __init__(self, variables=()):
+        self.index = {}
+        self.names = []
+        for var in variables:
+            self.slot(var)
+
+    def __len__(self):
+        return len(self.names)
+
+    def slot(self, var):
+        name = var.name if isinstance(var, Symbol) else var
+        slot = self.index.get(name)
+        if slot is None:
+            slot = self.index[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def vector(self, values=None):
+        '''
+        :param values: 变量名 -> 取值，缺省的计数器为 0
+        :return: 计数器数组（Python 列表，逐个下标读取比 NumPy 数组快）
+        '''
+        values = values or {}
+        slots = [(self.slot(name), value) for name, value in values.items()]  # 先登记新变量再分配数组
+        vector = [0] * len(self.names)
+        for slot, value in slots:
+            vector[slot] = value
+        return vector
+
+
+def _number(expr):
+    if expr is S.Infinity:
+        return float('inf')
+    if expr is S.NegativeInfinity:
+        return float('-inf')
+    if expr.is_Integer:
+        return int(expr)
+    return float(expr)
+
+
+def _compile_value(expr, layout):
+    if isinstance(expr, Symbol):
+        slot = layout.slot(expr)
+        return lambda values: values[slot]
+    if expr.is_number:
+        constant = _number(expr)
+        return lambda values: constant
+    if isinstance(expr, (Add, Mul)):
+        parts = [_compile_value(arg, layout) for arg in expr.args]
+        if isinstance(expr, Add):
+            return lambda values: sum(part(values) for part in parts)
+
+        def multiply(values):
+            result = 1
+            for part in parts:
+                result *= part(values)
+            return result
+        return multiply
+    if isinstance(expr, Pow):
+        base, exponent = _compile_value(expr.base, layout), _compile_value(expr.exp, layout)
+        return lambda values: base(values) ** exponent(values)
+    raise InvalidPolicyGraphError(f'条件中不支持的表达式: {expr}')
+
+
+def _always_true(values):
+    return True
+
+
+def _always_false(values):
+    return False
+
+
+def _compile(expr, layout):
+    if isinstance(expr, BooleanTrue):
+        return _always_true
+    if isinstance(expr, BooleanFalse):
+        return _always_false
+    if isinstance(expr, Symbol):
+        slot = layout.slot(expr)
+        return lambda values: bool(values[slot])
+    if expr.is_Relational:
+        compare = _RUNTIME_COMPARE.get(expr.rel_op)
+        if compare is None:
+            raise InvalidPolicyGraphError(f'条件中不支持的比较: {expr}')
+        lhs, rhs = expr.lhs, expr.rhs
+        if isinstance(lhs, Symbol) and rhs.is_number:
+            # 最常见的 变量 op 阈值，直接按下标比较
+            slot, threshold = layout.slot(lhs), _number(rhs)
+            return lambda values: compare(values[slot], threshold)
+        left, right = _compile_value(lhs, layout), _compile_value(rhs, layout)
+        return lambda values: compare(left(values), right(values))
+    if isinstance(expr, Not):
+        operand = _compile(expr.args[0], layout)
+        return lambda values: not operand(values)
+    if isinstance(expr, (And, Or)):
+        parts = [_compile(arg, layout) for arg in expr.args]
+        if isinstance(expr, And):
+            def conjunction(values):
+                for part in parts:
+                    if not part(values):
+                        return False
+                return True
+            return conjunction
+
+        def disjunction(values):
+            for part in parts:
+                if part(values):
+                    return True
+            return False
+        return disjunction
+    raise InvalidPolicyGraphError(f'条件中不支持的表达式: {expr}')
+
+
+def compile_condition(condition, layout):
+    '''
+    :param condition: sympy 表达式、条件字符串（DiEdge.condition）或 None
+    :param layout: CounterLayout，条件中新出现的变量追加到其末尾
+    :return: predicate(values) -> bool
+    '''
+    return _compile(as_condition(condition), layout)
+
+
+class PredicateTable:
+    '''
+    一组互斥原子状态的选择器。
+    可化为区域（单变量阈值条件的合取）的状态展开为上下界数组的行，一个变量取多个区间时按组合展开为多行；
+    其余状态在 select_many 中对尚未命中的行逐个回退到闭包
+    '''
+
+    def __init__(self, states, layout):
+        self.states = list(states)
+        self.predicates = [compile_condition(state, layout) for state in self.states]
+        self.variables = frozenset().union(*(condition_variables(state) for state in self.states))
+
+        rows = []  # (状态下标, {计数器下标: 区间})
+        self.fallback = []  # 无法化为区域的状态下标
+        for index, state in enumerate(self.states):
+            box = to_box_form(state)
+            if box is None:
+                self.fallback.append(index)
+            elif box != EMPTY_BOX:
+                slots = [layout.slot(var) for var in box]
+                for combination in product(*box.values()):
+                    rows.append((index, dict(zip(slots, combination))))
+        self.slots = sorted({slot for _, bounds in rows for slot in bounds})
+        shape = (len(rows), len(self.slots))
+        self.lo = np.full(shape, -np.inf)
+        self.hi = np.full(shape, np.inf)
+        self.lo_closed = np.zeros(shape, dtype=bool)
+        self.hi_closed = np.zeros(shape, dtype=bool)
+        for row, (_, bounds) in enumerate(rows):
+            for column, slot in enumerate(self.slots):
+                interval = bounds.get(slot)
+                if interval is not None:
+                    self.lo[row, column], self.lo_closed[row, column] = _number(interval.lo), interval.lo_closed
+                    self.hi[row, column], self.hi_closed[row, column] = _number(interval.hi), interval.hi_closed
+        self.row_states = np.array([index for index, _ in rows], dtype=np.int64)
+
+    def select(self, values):
+        '''
+        :return: values 下成立的原子状态下标，均不成立时为 -1
+        '''
+        for index, predicate in enumerate(self.predicates):
+            if predicate(values):
+                return index
+        return -1
+
+    def state_of(self, values):
+        index = self.select(values)
+        return None if index < 0 else self.states[index]
+
+    def select_many(self, matrix):
+        '''
+        :param matrix: (流/样本数, 计数器数) 的计数器矩阵
+        :return: 每行成立的原子状态下标数组，均不成立时为 -1
+        '''
+        matrix = np.asarray(matrix, dtype=float)
+        result = np.full(len(matrix), -1, dtype=np.int64)
+        if len(self.row_states) and len(matrix):
+            x = matrix[:, self.slots][:, None, :]
+            inside = (((x > self.lo) | ((x == self.lo) & self.lo_closed))
+                      & ((x < self.hi) | ((x == self.hi) & self.hi_closed))).all(axis=2)
+            hit = inside.any(axis=1)
+            result[hit] = self.row_states[inside.argmax(axis=1)[hit]]
+        for index in self.fallback:
+            predicate = self.predicates[index]
+            for row in np.flatnonzero(result < 0):
+                if predicate(matrix[row]):
+                    result[row] = index
+        return result
+
+
+def compile_pair_states(compiled, layout=None):
+    '''
+    为编译结果的每个源目的对构建原子状态选择器，原子状态序列相同的源目的对共用同一个 PredicateTable
+    :param compiled: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)
+    :return: {源目的对: PredicateTable}，计数器下标记录在 layout 中
+    '''
+    layout = layout if layout is not None else CounterLayout()
+    tables = {}
+    selectors = {}
+    for pair, atomic_state_value_map in compiled.items():
+        states = tuple(atomic_state_value_map)
+        table = tables.get(states)
+        if table is None:
+            table = tables[states] = PredicateTable(states, layout)
+        selectors[pair] = table
+    return selectors
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 22:00
+@Auth ： xiaolongtuan
+@File ：flow_classifier.py
+"""
+import ipaddress
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+from policy_graph_error import InvalidPolicyGraphError
+
+'''
+编译结果的流分类器：给定叶标签的 IP 前缀（EPG 的叶成员），把 Flow 的源/目的地址映射到叶标签、
+再映射到所属原子，查出源目的原子对在各原子状态下的 NF 链与 Qos。
+    PrefixTable     按前缀长度分桶的哈希表做最长前缀匹配，也可展开为互不相交的有序区间
+    FlowClassifier  编译结果变化后以 rebuild() 整体重建表，查询时只做几次字典查找；
+                    classify_batch() 对列式地址数组做向量化分类，与单流查询共用同一套表
+
+    classifier = FlowClassifier.from_model(model, {'t0.1.0': '10.0.1.0/24', 't0.1.1': ['10.0.2.0/24']})
+    result = classifier.classify(Flow('10.0.1.7', '10.0.2.9', 'tcp', 80))
+    result.states  # 原子状态 -> (NFs, Qos)
+    pair_ids, chain_ids = classifier.classify_batch(src_ips, dst_ips)  # 未命中为 -1
+
+编译结果只以源目的原子对与原子状态为键，协议与端口不影响 NF 链的选择，批量接口只需要源/目的地址列。
+每个源目的对同一时刻只有一个生效的原子状态，chain_ids 取该状态的链编号；只有一个原子状态的源目的对
+默认生效，其余需以 set_active_state() 指定，之前为 -1。
+'''
+
+# pair_id 为源目的对在分类器中的编号，states 为 原子状态 -> (NFs, Qos)
+ClassifyResult = namedtuple('ClassifyResult', ['pair_id', 'src', 'dst', 'states'])
+
+# 向量化分类用的数组表：区间起点及其原子编号，按 src编号 * 原子数 + dst编号 排序的源目的对键及其 pair_id
+BatchTables = namedtuple('BatchTables', ['starts', 'range_atoms', 'pair_keys', 'pair_order', 'atom_count'])
+
+
+class PrefixTable:
+    '''
+    IP 前缀 -> 取值 的最长前缀匹配表，只容纳同一地址族的前缀。
+    每个前缀长度一张哈希表，键为网络号右移后的整数，查询按长度从长到短探测
+    '''
+
+    def __init__(self):
+        self.version = None
+        self.bits = 0
+        self.tables = {}  # 前缀长度 -> {网络号 >> (地址位数 - 前缀长度): 取值}
+        self.lengths = []  # 已有的前缀长度，降序
+        self._ranges = None
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def _network(self, prefix):
+        network = ipaddress.ip_network(prefix, strict=False)
+        if self.version is None:
+            self.version = network.version
+            self.bits = network.max_prefixlen
+        elif network.version != self.version:
+            raise InvalidPolicyGraphError(f'前缀表只能容纳同一地址族的前缀: {network}')
+        return network
+
+    def _key(self, network):
+        return int(network.network_address) >> (self.bits - network.prefixlen)
+
+    def insert(self, prefix, value):
+        network = self._network(prefix)
+        table = self.tables.get(network.prefixlen)
+        if table is None:
+            table = self.tables[network.prefixlen] = {}
+            self.lengths = sorted(self.tables, reverse=True)
+        key = self._key(network)
+        old = table.get(key)
+        if old is not None and old != value:
+            raise InvalidPolicyGraphError(f'前缀 {network} 同时属于 {old} 与 {value}')
+        table[key] = value
+        self._ranges = None
+
+    def remove(self, prefix):
+        network = self._network(prefix)
+        table = self.tables.get(network.prefixlen)
+        if table is None or table.pop(self._key(network), None) is None:
+            raise KeyError(str(network))
+        if not table:
+            del self.tables[network.prefixlen]
+            self.lengths.remove(network.prefixlen)
+        self._ranges = None
+
+    def address(self, value):
+        # 整数原样返回，字符串或 ipaddress 地址转换为整数
+        if isinstance(value, int):
+            return value
+        address = ipaddress.ip_address(value)
+        if self.version is not None and address.version != self.version:
+            raise InvalidPolicyGraphError(f'地址族与前缀表不一致: {address}')
+        return int(address)
+
+    def lookup(self, address):
+        '''
+        :return: 包含 address 的最长前缀的取值，没有前缀包含时返回 None
+        '''
+        address = self.address(address)
+        bits = self.bits
+        for length in self.lengths:
+            value = self.tables[length].get(address >> (bits - length))
+            if value is not None:
+                return value
+        return None
+
+    def ranges(self):
+        '''
+        将嵌套的前缀展开为互不相交的有序区间，内层（更长）的前缀覆盖外层
+        :return: (starts, values)，starts 升序；地址 a 的取值为 values[bisect_right(starts, a) - 1]，None 表示未覆盖
+        '''
+        if self._ranges is not None:
+            return self._ranges
+        prefixes = sorted(((key << (self.bits - length), ((key + 1) << (self.bits - length)) - 1, value)
+                           for length, table in self.tables.items() for key, value in table.items()),
+                          key=lambda item: (item[0], -item[1]))  # 同起点时外层在前
+        starts, values = [], []
+
+        def emit(start, value):
+            if starts and starts[-1] == start:
+                values[-1] = value
+            elif not values or values[-1] != value:
+                starts.append(start)
+                values.append(value)
+
+        stack = []  # 包含当前位置的前缀 (end, value)，由外到内
+        for start, end, value in prefixes:
+            while stack and stack[-1][0] < start:
+                closed, _ = stack.pop()
+                emit(closed + 1, stack[-1][1] if stack else None)
+            emit(start, value)
+            stack.append((end, value))
+        while stack:
+            closed, _ = stack.pop()
+            emit(closed + 1, stack[-1][1] if stack else None)
+        self._ranges = (starts, values)
+        return self._ranges
+
+    def lookup_range(self, address):
+        # 与 lookup 等价，在展开后的有序区间上二分查找
+        starts, values = self.ranges()
+        index = bisect_right(starts, self.address(address)) - 1
+        return values[index] if index >= 0 else None
+
+
+def _prefix_list(prefixes):
+    if isinstance(prefixes, (str, ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        return [prefixes]
+    return list(prefixes)
+
+
+class FlowClassifier:
+    '''
+    Flow -> 源目的原子对及其各原子状态下的 (NFs, Qos)。
+    叶标签 -> 原子 由编译结果中出现的原子位图得到，未出现在任何源目的对中的叶标签不会命中
+    '''
+
+    def __init__(self, label_interner, leaf_prefixes=None, compiled=None):
+        '''
+        :param label_interner: 编译结果所用的叶标签驻留表（model.label_interner）
+        :param leaf_prefixes: 叶标签 -> IP 前缀或前缀列表
+        :param compiled: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)，dict 或 compile_store.LazyCompiled
+        '''
+        self.label_interner = label_interner
+        self.prefixes = PrefixTable()
+        self.leaf_atom = {}  # 叶标签 -> 原子
+        self.atoms = []  # 原子编号 -> 原子
+        self.atom_ids = {}  # 原子 -> 原子编号
+        self.pairs = []  # pair_id -> (src原子, dst原子)
+        self.pair_ids = {}  # (src原子, dst原子) -> pair_id
+        self.pair_states = []  # pair_id -> 原子状态 -> (NFs, Qos)
+        self.chains = []  # 链编号 -> (NFs, Qos)，不同源目的对中相同的链共用编号
+        self.pair_chains = []  # pair_id -> 原子状态 -> 链编号
+        self.active_states = []  # pair_id -> 生效的原子状态，未知时为 None
+        self.active_chain = np.empty(0, dtype=np.int64)  # pair_id -> 生效状态的链编号，未知时为 -1
+        self._batch_tables = None
+        if leaf_prefixes is not None:
+            self.set_prefixes(leaf_prefixes)
+        if compiled is not None:
+            self.rebuild(compiled)
+
+    @classmethod
+    def from_model(cls, model, leaf_prefixes):
+        compiled = model.compiled if model.compiled is not None else model.compile()
+        return cls(model.label_interner, leaf_prefixes, compiled)
+
+    def set_prefixes(self, leaf_prefixes):
+        # 整体替换前缀表
+        prefixes = PrefixTable()
+        for label, values in leaf_prefixes.items():
+            for prefix in _prefix_list(values):
+                prefixes.insert(prefix, label)
+        self.prefixes = prefixes
+        self._batch_tables = None
+
+    def rebuild(self, compiled):
+        '''
+        按编译结果整体重建原子与源目的对表，模型重新编译后调用；新表建好后一次性替换。
+        仍然存在的源目的对保留其生效的原子状态
+        '''
+        previous = {self.pairs[pair_id]: state for pair_id, state in enumerate(self.active_states) if state is not None}
+        atom_ids = {}
+        pairs = []
+        pair_states = []
+        chain_ids = {}
+        chains = []
+        pair_chains = []
+        active_states = []
+        for pair, atomic_state_value_map in compiled.items():
+            for atom in pair:
+                if atom not in atom_ids:
+                    atom_ids[atom] = len(atom_ids)
+            state_chains = {}
+            for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items():
+                key = (tuple(atomic_FNs), atomic_qos)
+                chain_id = chain_ids.get(key)
+                if chain_id is None:
+                    chain_id = chain_ids[key] = len(chains)
+                    chains.append((atomic_FNs, atomic_qos))
+                state_chains[atomic_state] = chain_id
+            state = previous.get(pair)
+            if state not in state_chains:
+                state = next(iter(state_chains)) if len(state_chains) == 1 else None
+            pairs.append(pair)
+            pair_states.append(atomic_state_value_map)
+            pair_chains.append(state_chains)
+            active_states.append(state)
+        leaf_atom = {}
+        for atom in atom_ids:
+            for label in self.label_interner.from_mask(atom):
+                leaf_atom[label] = atom
+
+        self.atoms = list(atom_ids)
+        self.atom_ids = atom_ids
+        self.pairs = pairs
+        self.pair_ids = {pair: pair_id for pair_id, pair in enumerate(pairs)}
+        self.pair_states = pair_states
+        self.chains = chains
+        self.pair_chains = pair_chains
+        self.active_states = active_states
+        self.active_chain = np.array([-1 if state is None else state_chains[state]
+                                      for state, state_chains in zip(active_states, pair_chains)], dtype=np.int64)
+        self.leaf_atom = leaf_atom
+        self._batch_tables = None
+
+    def set_active_state(self, pair_id, state):
+        '''
+        指定源目的对生效的原子状态，state 为 None 表示未知
+        :return: 生效的链编号，未知时为 -1
+        '''
+        chain_id = -1 if state is None else self.pair_chains[pair_id][state]
+        self.active_states[pair_id] = state
+        self.active_chain[pair_id] = chain_id
+        return chain_id
+
+    def atom_of(self, address):
+        label = self.prefixes.lookup(address)
+        return None if label is None else self.leaf_atom.get(label)
+
+    def classify(self, flow):
+        '''
+        :return: ClassifyResult；源或目的地址不属于任何原子，或该源目的对没有策略时返回 None
+        '''
+        src = self.atom_of(flow.src_ip)
+        dst = self.atom_of(flow.dst_ip)
+        pair_id = self.pair_ids.get((src, dst))
+        if pair_id is None:
+            return None
+        return ClassifyResult(pair_id, src, dst, self.pair_states[pair_id])
+
+    def chain(self, flow, state):
+        '''
+        :return: 该流在原子状态 state 下的 (NFs, Qos)，没有对应策略时返回 None
+        '''
+        result = self.classify(flow)
+        return None if result is None else result.states.get(state)
+
+    def batch_tables(self):
+        '''
+        由前缀表与源目的对表派生的数组表，两者任一重建后在下一次批量分类时重新生成
+        '''
+        if self._batch_tables is None:
+            starts, labels = self.prefixes.ranges()
+            # IPv6 地址超出 64 位，以 Python 整数对象数组比较
+            dtype = np.uint64 if self.prefixes.bits <= 64 else object
+            range_atoms = np.array([self.atom_ids.get(self.leaf_atom.get(label), -1) for label in labels],
+                                   dtype=np.int64)
+            atom_count = len(self.atoms)
+            keys = np.array([self.atom_ids[src] * atom_count + self.atom_ids[dst] for src, dst in self.pairs],
+                            dtype=np.int64)
+            order = np.argsort(keys, kind='stable')
+            self._batch_tables = BatchTables(np.array(starts, dtype=dtype), range_atoms, keys[order], order,
+                                             atom_count)
+        return self._batch_tables
+
+    def atoms_batch(self, addresses, tables=None):
+        '''
+        :param addresses: 整数地址数组
+        :return: 原子编号数组（self.atoms 的下标），不属于任何原子为 -1
+        '''
+        tables = tables or self.batch_tables()
+        addresses = np.asarray(addresses, dtype=tables.starts.dtype)
+        if not len(tables.starts):
+            return np.full(len(addresses), -1, dtype=np.int64)
+        index = np.searchsorted(tables.starts, addresses, side='right') - 1
+        return np.where(index >= 0, tables.range_atoms[np.maximum(index, 0)], -1)
+
+    def classify_batch(self, src_ips, dst_ips):
+        '''
+        向量化分类：src_ips、dst_ips 为等长的整数地址数组
+        :return: (pair_ids, chain_ids)，未命中的流为 -1；链编号为 self.chains 的下标，取各源目的对生效的原子状态
+        '''
+        tables = self.batch_tables()
+        src = self.atoms_batch(src_ips, tables)
+        dst = self.atoms_batch(dst_ips, tables)
+        pair_ids = np.full(len(src), -1, dtype=np.int64)
+        valid = (src >= 0) & (dst >= 0)
+        if len(tables.pair_keys) and valid.any():
+            keys = src[valid] * tables.atom_count + dst[valid]
+            position = np.minimum(np.searchsorted(tables.pair_keys, keys), len(tables.pair_keys) - 1)
+            pair_ids[valid] = np.where(tables.pair_keys[position] == keys, tables.pair_order[position], -1)
+        chain_ids = np.where(pair_ids >= 0, self.active_chain[np.maximum(pair_ids, 0)], -1) \
+            if len(self.active_chain) else pair_ids.copy()
+        return pair_ids, chain_ids
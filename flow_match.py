@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 14:30
+@Auth ： xiaolongtuan
+@File ：flow_match.py
+"""
+import ipaddress
+from bisect import bisect_right
+from collections import defaultdict
+
+'''
+匹配代数：NFBNode.match 中每个字段的取值可以是
+    通配：缺省、None 或 '*'
+    CIDR 前缀：'10.0.0.0/8'、'10.0.0.1'（IPv4/IPv6）
+    范围：(lo, hi) 元组或 '1000-2000' 字符串（如端口范围）
+    数值：整数或纯数字字符串（'80' 与 80 等价）
+    精确值：其他字符串（如协议）
+前缀、范围、数值统一转换为整数闭区间，并按种类区分：IPv4 前缀、IPv6 前缀、数值（端口等）各自处于不同的取值空间，
+不同种类的区间互不相交；两个匹配条件在所有字段上都相交即为重叠
+'''
+
+WILDCARDS = (None, '*')
+RANGE_KINDS = ('int', 'ip4', 'ip6')
+
+
+def parse_field(value):
+    '''
+    :return: None 表示通配；(种类, lo, hi) 为整数闭区间，种类为 RANGE_KINDS 之一；
+             ('exact', value) 为不可比较大小的精确值
+    '''
+    if value in WILDCARDS:
+        return None
+    if isinstance(value, bool):
+        return 'exact', value
+    if isinstance(value, int):
+        return 'int', value, value
+    if isinstance(value, tuple) and len(value) == 2:
+        return 'int', value[0], value[1]
+    if isinstance(value, str):
+        if '.' in value or ':' in value:
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+                return f'ip{network.version}', int(network.network_address), int(network.broadcast_address)
+            except ValueError:
+                pass
+        if value.isdigit():
+            return 'int', int(value), int(value)
+        lo, sep, hi = value.partition('-')
+        if sep and lo.isdigit() and hi.isdigit():
+            return 'int', int(lo), int(hi)
+    return 'exact', value
+
+
+def field_overlap(parsed, other):
+    if parsed is None or other is None:
+        return True
+    if parsed[0] != other[0]:
+        return False
+    if parsed[0] == 'exact':
+        return parsed[1] == other[1]
+    return parsed[1] <= other[2] and other[1] <= parsed[2]
+
+
+def match_overlap(flow, match):
+    # flow 与 match 是否可能匹配同一个包：所有字段均相交，缺省字段视为通配
+    for key, value in match.items():
+        if not field_overlap(parse_field(flow.get(key)), parse_field(value)):
+            return False
+    return True
+
+
+class IntervalIndex:
+    '''
+    静态区间树：区间按左端点排序，以线段树维护子树内最大右端点，
+    查询与 [lo, hi] 相交的区间为 O(log n + k)；插入后在下一次查询时重建
+    '''
+
+    def __init__(self):
+        self._pending = []
+        self._los = []
+        self._his = []
+        self._items = []
+        self._max_hi = []
+        self._dirty = False
+
+    def add(self, lo, hi, item):
+        self._pending.append((lo, hi, item))
+        self._dirty = True
+
+    def _build(self):
+        entries = sorted(self._pending, key=lambda entry: (entry[0], entry[1]))
+        self._los = [entry[0] for entry in entries]
+        self._his = [entry[1] for entry in entries]
+        self._items = [entry[2] for entry in entries]
+        size = 1
+        while size < len(entries):
+            size *= 2
+        self._size = size
+        self._max_hi = [None] * (2 * size)
+        for index, hi in enumerate(self._his):
+            self._max_hi[size + index] = hi
+        for node in range(size - 1, 0, -1):
+            children = [hi for hi in (self._max_hi[2 * node], self._max_hi[2 * node + 1]) if hi is not None]
+            self._max_hi[node] = max(children) if children else None
+        self._dirty = False
+
+    def query(self, lo, hi):
+        if self._dirty:
+            self._build()
+        end = bisect_right(self._los, hi)  # 左端点不大于 hi 的区间
+        if not end:
+            return []
+        result = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, node_lo, node_hi = stack.pop()
+            max_hi = self._max_hi[node]
+            if node_lo >= end or max_hi is None or max_hi < lo:
+                continue
+            if node >= self._size:
+                result.append(self._items[node - self._size])
+                continue
+            middle = (node_lo + node_hi) // 2
+            stack.append((2 * node + 1, middle, node_hi))
+            stack.append((2 * node, node_lo, middle))
+        return result
+
+
+class MatchIndex:
+    '''
+    匹配条件索引：每个字段的区间条件按种类分别存入区间树、精确值存入哈希表，未约束该字段的条目单独记录。
+    查询时对流的每个受约束字段分别取候选，取最小的候选集合再逐条校验
+    '''
+
+    def __init__(self):
+        self.entries = []  # (match, item)
+        self.ranges = defaultdict(IntervalIndex)  # (字段, 种类) -> 区间树
+        self.exacts = defaultdict(lambda: defaultdict(list))  # 字段 -> 精确值 -> 条目下标
+        self.unconstrained = {}  # 字段 -> 未约束该字段的条目下标
+
+    def add(self, match, item):
+        index = len(self.entries)
+        constrained = set()
+        for key, value in match.items():
+            parsed = parse_field(value)
+            if parsed is None:
+                continue
+            constrained.add(key)
+            if key not in self.unconstrained:
+                self.unconstrained[key] = list(range(index))  # 之前的条目都未约束新字段
+            if parsed[0] != 'exact':
+                self.ranges[key, parsed[0]].add(parsed[1], parsed[2], index)
+            else:
+                self.exacts[key][parsed[1]].append(index)
+        for key, indexes in self.unconstrained.items():
+            if key not in constrained:
+                indexes.append(index)
+        self.entries.append((match, item))
+
+    def query(self, flow):
+        '''
+        :return: 与 flow 重叠的条目
+        '''
+        best = None
+        for key, value in flow.items():
+            parsed = parse_field(value)
+            if parsed is None or key not in self.unconstrained:
+                continue  # 流在该字段通配，或没有条目约束该字段，均无法缩小范围
+            if parsed[0] != 'exact':
+                tree = self.ranges.get((key, parsed[0]))
+                hits = tree.query(parsed[1], parsed[2]) if tree is not None else []
+            else:
+                hits = self.exacts[key].get(parsed[1], []) if key in self.exacts else []
+            size = len(hits) + len(self.unconstrained[key])
+            if best is None or size < best[0]:
+                best = (size, hits, self.unconstrained[key])
+
+        if best is None:
+            indexes = range(len(self.entries))
+        else:
+            indexes = best[1] + best[2]
+        return [self.entries[index][1] for index in indexes
+                if match_overlap(flow, self.entries[index][0])]
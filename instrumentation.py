@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 21:30
+@Auth ： xiaolongtuan
+@File ：instrumentation.py
+"""
+import json
+import time
+import tracemalloc
+from collections import namedtuple, defaultdict
+
+'''
+编译流水线的插桩：分阶段计时、计数器、缓存指标、可选的 tracemalloc 快照，以及导出回调。
+模型默认持有 DISABLED，其 stage() 返回共享的空上下文、count() 为空操作，
+热路径中需要额外计算的计数先判断 enabled，关闭时几乎没有开销。
+
+    inst = Instrumentation(trace_memory=True)
+    inst.add_exporter(print)
+    model = JanusPolicyModel(trees, mappings, instrumentation=inst)
+    model.compile()
+    print(inst.format())
+'''
+
+# 阶段结束事件：memory 为开启 trace_memory 时该阶段内的峰值字节数，否则为 None
+StageEvent = namedtuple('StageEvent', ['name', 'seconds', 'memory'])
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class NullInstrumentation:
+    enabled = False
+
+    def stage(self, name):
+        return NULL_STAGE
+
+    def count(self, name, value=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+
+DISABLED = NullInstrumentation()
+
+
+class _Stage:
+    __slots__ = ('owner', 'name', 'start')
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.owner._enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.owner._exit(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation(NullInstrumentation):
+    '''
+    :param trace_memory: 为 memory_stages 中的阶段记录峰值内存与 tracemalloc 快照（会明显拖慢编译）
+    :param memory_stages: 记录内存的阶段，默认只记录顶层阶段
+    '''
+    enabled = True
+
+    def __init__(self, trace_memory=False, memory_stages=('graph_normalization', 'graph_union')):
+        self.trace_memory = trace_memory
+        self.memory_stages = set(memory_stages)
+        self.timers = defaultdict(lambda: [0, 0.0])  # 阶段 -> [次数, 总秒数]
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.peaks = {}  # 阶段 -> 最近一次的峰值内存字节数
+        self.snapshots = {}  # 阶段 -> 最近一次结束时的 tracemalloc 快照
+        self.exporters = []
+        self._started_tracing = False
+
+    def add_exporter(self, exporter):
+        # exporter(StageEvent) 在每个阶段结束时调用
+        self.exporters.append(exporter)
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def _enter(self, name):
+        if self.trace_memory and name in self.memory_stages:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+
+    def _exit(self, name, seconds):
+        timer = self.timers[name]
+        timer[0] += 1
+        timer[1] += seconds
+        memory = None
+        if self.trace_memory and name in self.memory_stages and tracemalloc.is_tracing():
+            memory = self.peaks[name] = tracemalloc.get_traced_memory()[1]
+            self.snapshots[name] = tracemalloc.take_snapshot()
+        if self.exporters:
+            event = StageEvent(name, seconds, memory)
+            for exporter in self.exporters:
+                exporter(event)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def close(self):
+        # 停止由本实例开启的 tracemalloc
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+        self.gauges.clear()
+        self.peaks.clear()
+        self.snapshots.clear()
+
+    def summary(self):
+        return {
+            'stages': {name: {'calls': calls, 'seconds': seconds, 'peak_bytes': self.peaks.get(name)}
+                       for name, (calls, seconds) in self.timers.items()},
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+    def format(self):
+        lines = [f'{name:<28}{calls:>8} 次{seconds * 1000:>12.2f}ms'
+                 + (f'{self.peaks[name] / 1024:>10.0f}KiB' if name in self.peaks else '')
+                 for name, (calls, seconds) in sorted(self.timers.items(), key=lambda item: -item[1][1])]
+        lines.extend(f'{name:<28}{value:>8}' for name, value in sorted(self.counters.items()))
+        lines.extend(f'{name:<28}{value}' for name, value in sorted(self.gauges.items()))
+        return '\n'.join(lines)
+
+
+class JsonLinesExporter:
+    '''
+    将阶段事件逐行写为 JSON
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, event: StageEvent):
+        self.stream.write(json.dumps(event._asdict()) + '\n')
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 10:12
+@Auth ： xiaolongtuan
+@File ：interval_resolver.py
+"""
+from bisect import bisect_left
+from collections import namedtuple, defaultdict
+from itertools import product
+
+from sympy import S, Symbol, And, Or, Not, Eq
+from sympy.logic.boolalg import BooleanTrue, BooleanFalse
+
+# 实数区间，端点可为 ±oo，lo_closed/hi_closed 表示端点是否闭合
+Interval = namedtuple('Interval', ['lo', 'lo_closed', 'hi', 'hi_closed'])
+
+FULL = (Interval(S.NegativeInfinity, False, S.Infinity, False),)
+EMPTY = ()
+EMPTY_BOX = 'empty'  # 不可满足区域
+
+
+def _relational_intervals(op, value):
+    if op == '>':
+        return (Interval(value, False, S.Infinity, False),)
+    if op == '>=':
+        return (Interval(value, True, S.Infinity, False),)
+    if op == '<':
+        return (Interval(S.NegativeInfinity, False, value, False),)
+    if op == '<=':
+        return (Interval(S.NegativeInfinity, False, value, True),)
+    if op == '==':
+        return (Interval(value, True, value, True),)
+    if op == '!=':
+        return (Interval(S.NegativeInfinity, False, value, False), Interval(value, False, S.Infinity, False))
+    return None
+
+
+_REVERSED_OP = {'>': '<', '>=': '<=', '<': '>', '<=': '>=', '==': '==', '!=': '!='}
+
+
+def _is_threshold(value):
+    return value.is_number and value.is_extended_real
+
+
+def _lo_key(interval):
+    # 左端点排序键：同一位置闭合端点在前
+    return interval.lo, not interval.lo_closed
+
+
+def _touch(left, right):
+    # left 与 right（right 左端点不小于 left 左端点）是否重叠或相接
+    if right.lo < left.hi:
+        return True
+    return right.lo == left.hi and (left.hi_closed or right.lo_closed)
+
+
+def union_intervals(intervals):
+    merged = []
+    for interval in sorted((i for i in intervals if not is_empty_interval(i)), key=_lo_key):
+        if merged and _touch(merged[-1], interval):
+            last = merged[-1]
+            if interval.hi > last.hi or (interval.hi == last.hi and interval.hi_closed):
+                merged[-1] = Interval(last.lo, last.lo_closed, interval.hi, interval.hi_closed)
+        else:
+            merged.append(interval)
+    return tuple(merged)
+
+
+def is_empty_interval(interval):
+    if interval.lo < interval.hi:
+        return False
+    return not (interval.lo == interval.hi and interval.lo_closed and interval.hi_closed)
+
+
+def intersect_intervals(intervals, others):
+    result = []
+    for a in intervals:
+        for b in others:
+            lo, lo_closed = max((a.lo, not a.lo_closed), (b.lo, not b.lo_closed))
+            hi, hi_closed = min((a.hi, a.hi_closed), (b.hi, b.hi_closed))
+            interval = Interval(lo, not lo_closed, hi, hi_closed)
+            if not is_empty_interval(interval):
+                result.append(interval)
+    return union_intervals(result)
+
+
+def complement_intervals(intervals):
+    result = []
+    lo, lo_closed = S.NegativeInfinity, False
+    for interval in union_intervals(intervals):
+        result.append(Interval(lo, lo_closed, interval.lo, not interval.lo_closed))
+        lo, lo_closed = interval.hi, not interval.hi_closed
+    result.append(Interval(lo, lo_closed, S.Infinity, False))
+    return union_intervals(result)
+
+
+def contains_intervals(intervals, others):
+    # intervals 是否包含 others
+    return intersect_intervals(others, complement_intervals(intervals)) == EMPTY
+
+
+def to_interval_form(expr):
+    '''
+    将单变量阈值表达式（如 connection >= 3，及其 And/Or/Not 组合）转换为 (变量, 区间元组)，
+    true/false 的变量为 None；无法处理时返回 None
+    '''
+    if isinstance(expr, BooleanTrue):
+        return None, FULL
+    if isinstance(expr, BooleanFalse):
+        return None, EMPTY
+    if expr.is_Relational:
+        lhs, rhs, op = expr.lhs, expr.rhs, expr.rel_op
+        if isinstance(rhs, Symbol) and _is_threshold(lhs):
+            lhs, rhs, op = rhs, lhs, _REVERSED_OP.get(op)
+        if not (isinstance(lhs, Symbol) and _is_threshold(rhs)):
+            return None
+        intervals = _relational_intervals(op, rhs)
+        return None if intervals is None else (lhs, intervals)
+    if isinstance(expr, (And, Or, Not)):
+        parts = [to_interval_form(arg) for arg in expr.args]
+        if any(part is None for part in parts):
+            return None
+        variables = {var for var, _ in parts if var is not None}
+        if len(variables) > 1:
+            return None
+        var = variables.pop() if variables else None
+        if isinstance(expr, Not):
+            return var, complement_intervals(parts[0][1])
+        intervals = parts[0][1]
+        for _, other in parts[1:]:
+            intervals = intersect_intervals(intervals, other) if isinstance(expr, And) \
+                else union_intervals(intervals + other)
+        return var, intervals
+    return None
+
+
+def to_box_form(expr):
+    '''
+    将若干单变量阈值条件的合取转换为区域 {变量: 区间元组}，缺省变量不受限；
+    不可满足时返回 EMPTY_BOX，无法处理时返回 None
+    '''
+    form = to_interval_form(expr)
+    if form is not None:
+        var, intervals = form
+        if not intervals:
+            return EMPTY_BOX
+        return {} if var is None or intervals == FULL else {var: intervals}
+    if not isinstance(expr, And):
+        return None
+
+    box = {}
+    for part in expr.args:
+        part_box = to_box_form(part)
+        if part_box is None or part_box == EMPTY_BOX:
+            return part_box
+        for var, intervals in part_box.items():
+            if var in box:
+                intervals = intersect_intervals(box[var], intervals)
+                if not intervals:
+                    return EMPTY_BOX
+            box[var] = intervals
+    return box
+
+
+def box_contains(box, other):
+    # 区域 box 是否包含区域 other
+    if other == EMPTY_BOX:
+        return True
+    if box == EMPTY_BOX:
+        return False
+    return all(contains_intervals(intervals, other.get(var, FULL)) for var, intervals in box.items())
+
+
+def canonical_box(box):
+    # 区域的可哈希规范形式
+    if box == EMPTY_BOX:
+        return box
+    return tuple(sorted(box.items(), key=lambda item: item[0].name))
+
+
+def _segment_bounds(breakpoints, first, last):
+    # 将连续的基本段 [first, last] 还原为区间，偶数段为相邻断点间的开区间，奇数段为断点本身
+    if first % 2:
+        lo, lo_closed = breakpoints[first // 2], True
+    else:
+        lo, lo_closed = (breakpoints[first // 2 - 1], False) if first else (S.NegativeInfinity, False)
+    if last % 2:
+        hi, hi_closed = breakpoints[last // 2], True
+    else:
+        hi, hi_closed = (breakpoints[last // 2], False) if last // 2 < len(breakpoints) else (S.Infinity, False)
+    return Interval(lo, lo_closed, hi, hi_closed)
+
+
+def _split_variable(state_intervals):
+    '''
+    对单个变量做扫描线：断点排序后划分基本段，按活跃状态集合（签名）归并
+
+    :param state_intervals: [(状态下标, 区间元组)]
+    :return: [(区间元组, 状态下标 frozenset)]，覆盖整条数轴
+    '''
+    breakpoints = sorted({bound for _, intervals in state_intervals for interval in intervals
+                          for bound in (interval.lo, interval.hi) if bound.is_finite})
+    segment_count = 2 * len(breakpoints) + 1
+    enters = defaultdict(list)
+    exits = defaultdict(list)
+    for index, intervals in state_intervals:
+        for interval in intervals:
+            if interval.lo.is_finite:
+                first = 2 * bisect_left(breakpoints, interval.lo) + (1 if interval.lo_closed else 2)
+            else:
+                first = 0
+            if interval.hi.is_finite:
+                last = 2 * bisect_left(breakpoints, interval.hi) + (1 if interval.hi_closed else 0)
+            else:
+                last = segment_count - 1
+            enters[first].append(index)
+            exits[last + 1].append(index)
+
+    regions = defaultdict(list)  # 签名 -> 区间
+    active = set()
+    signature = frozenset()
+    run_start = 0
+    for segment in range(segment_count + 1):
+        if segment in enters or segment in exits:
+            if segment:
+                regions[signature].append(_segment_bounds(breakpoints, run_start, segment - 1))
+            active.difference_update(exits.get(segment, ()))
+            active.update(enters.get(segment, ()))
+            signature = frozenset(active)
+            run_start = segment
+        elif segment == segment_count:
+            regions[signature].append(_segment_bounds(breakpoints, run_start, segment - 1))
+    return [(union_intervals(intervals), signature) for signature, intervals in regions.items()]
+
+
+def decompose_intervals(states):
+    '''
+    单变量阈值状态的快速分解：每个变量的断点排序后扫描一次，得到全部互不相交的原子区域
+
+    :param states: 逻辑状态表达式列表
+    :return: [(box, 签名)]，box 为 {变量: 区间元组}（空 box 表示全空间），签名为包含该区域的原始状态下标 frozenset；
+             存在无法处理的表达式时返回 None
+    '''
+    forms = [to_interval_form(state) for state in states]
+    if any(form is None for form in forms):
+        return None
+
+    everywhere = frozenset(index for index, (var, intervals) in enumerate(forms) if var is None and intervals)
+    by_variable = defaultdict(list)
+    for index, (var, intervals) in enumerate(forms):
+        if var is not None:
+            by_variable[var].append((index, intervals))
+
+    variables = sorted(by_variable, key=lambda var: var.name)
+    per_variable = [_split_variable(by_variable[var]) for var in variables]
+    regions = []
+    for combination in product(*per_variable):
+        signature = everywhere.union(*(part_signature for _, part_signature in combination))
+        if not signature:
+            continue
+        box = {var: intervals for var, (intervals, _) in zip(variables, combination) if intervals != FULL}
+        regions.append((box, signature))
+    return regions
+
+
+def interval_to_expr(var, interval):
+    if interval.lo == interval.hi:
+        return Eq(var, interval.lo)
+    conditions = []
+    if interval.lo.is_finite:
+        conditions.append(var >= interval.lo if interval.lo_closed else var > interval.lo)
+    if interval.hi.is_finite:
+        conditions.append(var <= interval.hi if interval.hi_closed else var < interval.hi)
+    return And(*conditions)
+
+
+def box_to_expr(box):
+    # 将区域转换为 sympy 表达式，变量内取析取、变量间取合取
+    return And(*(Or(*(interval_to_expr(var, interval) for interval in intervals))
+                 for var, intervals in box.items()))
@@ -7,21 +7,91 @@
 
 from collections import defaultdict
 
+import numpy as np
+
+from colections_cul import mask_from_indices, iter_bits
+from policy_graph_error import InvalidPolicyGraphError
+
 
 # 并查集，寻找groupNode归属
 class UnionFind:
-    def __init__(self, size):
-        self.parent = list(range(size))
-        self.rank = [1] * size
+    '''
+    标签驻留的并查集：任意可哈希标签映射为连续编号，parent/rank 存于 NumPy 数组，容量不足时倍增。
+    find 为迭代的路径减半；union_many / connected_many 对边数组与查询数组整体做向量化处理。
+    未加入的标签视为自成一个分量，find 返回其本身
+    '''
+
+    def __init__(self, size=0, labels=()):
+        self.index = {}  # 标签 -> 编号
+        self.labels = []  # 编号 -> 标签
+        self.parent = np.arange(max(size, 16), dtype=np.int64)
+        self.rank = np.ones(max(size, 16), dtype=np.int64)
+        for label in range(size):  # 兼容原先 0..size-1 的整数标签
+            self.add(label)
+        for label in labels:
+            self.add(label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def add(self, label):
+        p = self.index.get(label)
+        if p is None:
+            p = len(self.labels)
+            if p == len(self.parent):
+                self.parent = np.concatenate([self.parent, np.arange(p, 2 * p, dtype=np.int64)])
+                self.rank = np.concatenate([self.rank, np.ones(p, dtype=np.int64)])
+            self.index[label] = p
+            self.labels.append(label)
+        return p
+
+    def _ids(self, labels):
+        return np.fromiter((self.add(label) for label in labels), dtype=np.int64)
+
+    def _find(self, p):
+        parent = self.parent
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]  # 路径减半
+            p = parent[p]
+        return int(p)
+
+    def _find_many(self, ids):
+        parent = self.parent
+        roots = ids.copy()
+        while True:
+            up = parent[roots]
+            moving = up != roots
+            if not moving.any():
+                return roots
+            grand = parent[up]
+            parent[roots[moving]] = grand[moving]  # 路径减半
+            roots[moving] = grand[moving]
 
     def find(self, p):  # 找到最大的group
-        if self.parent[p] != p:
-            self.parent[p] = self.find(self.parent[p])
-        return self.parent[p]
+        index = self.index.get(p)
+        if index is None:
+            return p
+        return self.labels[self._find(index)]
+
+    def find_many(self, labels):
+        '''
+        :return: 各标签所在分量的根标签列表，未加入的标签为其本身
+        '''
+        labels = list(labels)
+        known = [index for index, label in enumerate(labels) if label in self.index]
+        roots = list(labels)
+        if known:
+            ids = np.fromiter((self.index[labels[index]] for index in known), dtype=np.int64, count=len(known))
+            for index, root in zip(known, self._find_many(ids)):
+                roots[index] = self.labels[root]
+        return roots
 
     def union(self, p, q):
-        rootP = self.find(p)
-        rootQ = self.find(q)
+        rootP = self._find(self.add(p))
+        rootQ = self._find(self.add(q))
 
         if rootP != rootQ:
             if self.rank[rootP] > self.rank[rootQ]:
@@ -32,11 +102,42 @@ class UnionFind:
                 self.parent[rootQ] = rootP
                 self.rank[rootP] += 1
 
+    def union_many(self, edges):
+        '''
+        批量合并边 (u, v)：每轮求出两端的根，将较大的根挂到较小的根下（同一根的多个候选取最小），
+        直到所有边两端同根；每轮只处理仍未连通的边
+        '''
+        edges = list(edges)
+        if not edges:
+            return
+        us = self._ids(u for u, _ in edges)
+        vs = self._ids(v for _, v in edges)
+        while True:
+            roots_u = self._find_many(us)
+            roots_v = self._find_many(vs)
+            differ = roots_u != roots_v
+            if not differ.any():
+                break
+            roots_u, roots_v = roots_u[differ], roots_v[differ]
+            low = np.minimum(roots_u, roots_v)
+            high = np.maximum(roots_u, roots_v)
+            np.minimum.at(self.parent, high, low)
+            us, vs = us[differ], vs[differ]
+        self._find_many(np.arange(len(self.labels), dtype=np.int64))  # 压缩为一层，rank 不再反映树高
+
     def connected(self, p, q):
         return self.find(p) == self.find(q)
 
+    def connected_many(self, pairs):
+        '''
+        :return: 与 pairs 对应的 bool 数组
+        '''
+        pairs = list(pairs)
+        roots = self.find_many([p for p, _ in pairs] + [q for _, q in pairs])
+        return np.array([roots[index] == roots[index + len(pairs)] for index in range(len(pairs))], dtype=bool)
+
 
-def label_namespace_define(label_trees: []):
+def label_namespace_define(label_trees: [], label_mapping_pairs=()):
     '''
     形如：
     trees = [
@@ -45,68 +146,143 @@ def label_namespace_define(label_trees: []):
         [(5, 6), (6, 7)]   # 树3
     ]
 
-    任何不具有祖先关系的标签集都是互斥的
+    任何不具有祖先关系的标签集都是互斥的；标签映射对 (a, b) 把两棵树连为同一个命名空间
     '''
-    label_set = set()
-    for tree in label_trees:
-        for u, v in tree:
-            label_set.add(u)
-            label_set.add(v)
-    num_nodes = len(label_set)
-
-    uf = UnionFind(num_nodes)
+    uf = UnionFind()
     # 合并树中的节点
-    for tree in label_trees:
-        for u, v in tree:
-            uf.union(u, v)
-
+    uf.union_many(edge for tree in label_trees for edge in tree)
+    uf.union_many((pair[0], pair[1]) for pair in label_mapping_pairs)
     return uf
 
 
-def tree_to_dnf(edges, label_mapping_pairs: []):
-    # 标签层次结果转为正析取范式
-    # 构建子节点的列表
-    tree = defaultdict(list)
-    for parent, child in edges:
-        tree[parent].append(child)
+class LeafClosure:
+    '''
+    标签层次的叶闭包：节点 -> 其子树全部叶标签构成的 frozenset。
+    采用迭代的后序遍历，按需计算并缓存，子节点的闭包对象被祖先直接共享（单子节点时不复制），
+    标签映射对 (a, b) 表示 b 包含 a，a 的叶闭包并入 b 的闭包。
+    '''
 
-    label_mapping = defaultdict(str)
-    for pair in label_mapping_pairs:
-        label_mapping[pair[1]] = label_mapping_pairs[0]  # 单项映射，后者包含前者
+    def __init__(self, edges, label_mapping_pairs=()):
+        self.tree = defaultdict(list)
+        self.all_nodes = set()
+        for parent, child in edges:
+            self.tree[parent].append(child)
+            self.all_nodes.add(parent)
+            self.all_nodes.add(child)
 
-    # 找到所有节点
-    all_nodes = set(tree.keys()).union({child for children in tree.values() for child in children})
+        self.label_mapping = defaultdict(list)
+        for pair in label_mapping_pairs:
+            self.label_mapping[pair[1]].append(pair[0])  # 单项映射，后者包含前者
 
-    # 找到所有叶节点
-    leaf_nodes = all_nodes - set(tree.keys())
+        self._closures = {}
 
-    # 初始化结果
-    result = {}
+    def _successors(self, node):
+        return self.tree.get(node, []) + self.label_mapping.get(node, [])
+
+    def closure(self, node):
+        '''
+        返回单个节点的叶闭包，只计算该节点可达的部分；不在任何标签树中的标签视为叶节点
+        '''
+        closure = self._closures.get(node)
+        if closure is not None:
+            return closure
+
+        in_progress = {node}
+        stack = [(node, iter(self._successors(node)))]
+        while stack:
+            current, successors = stack[-1]
+            for successor in successors:
+                if successor in self._closures:
+                    continue
+                if successor in in_progress:
+                    raise InvalidPolicyGraphError(f'标签层次或标签映射存在环: {successor}')
+                in_progress.add(successor)
+                stack.append((successor, iter(self._successors(successor))))
+                break
+            else:
+                # 所有后继均已完成，合并其闭包
+                stack.pop()
+                in_progress.discard(current)
+                self._closures[current] = self._merge(current)
 
-    # 从叶节点开始，递归构建表达式
-    def build_dnf(node):
+        return self._closures[node]
 
-        if node in leaf_nodes:
-            return str(node)
-        if node in result:
-            return result[node]
+    def _merge(self, node):
+        children = self.tree.get(node)
+        parts = [self._closures[child] for child in children] if children else [frozenset((node,))]
+        parts.extend(self._closures[mapped] for mapped in self.label_mapping.get(node, []))
+        if len(parts) == 1:
+            return parts[0]  # 共享子节点的闭包对象
+        return frozenset().union(*parts)
 
-        # 构建当前节点的析取表达式
-        sub_label = [build_dnf(child) for child in tree[node]]
-        if node in label_mapping:  # 处理标签映射对析取式的影响
-            sub_label.append(label_mapping[node])
-        children_dnf = ' or '.join(sub_label)
-        result[node] = children_dnf
-        return children_dnf
+    def closures(self):
+        # 物化全部节点的叶闭包
+        for node in self.all_nodes:
+            self.closure(node)
+        return dict(self._closures)
 
-    # 构建所有节点的DNF表达式
-    for node in all_nodes:
-        if node not in result:
-            build_dnf(node)
 
+def tree_to_dnf(edges, label_mapping_pairs: []):
+    # 标签层次结果转为正析取范式，叶闭包由 LeafClosure 迭代计算
+    result = {}
+    for node, leaves in LeafClosure(edges, label_mapping_pairs).closures().items():
+        result[node] = ' or '.join(sorted(str(leaf) for leaf in leaves))
     return result
 
 
+def iter_tree_edges(label_trees):
+    # 将标签树列表展开为边序列
+    for tree in label_trees:
+        for edge in tree:
+            yield edge
+
+
+class LabelInterner:
+    '''
+    标签驻留表：为每个叶标签分配稠密的整数编号，标签集合以 Python int 位图表示，
+    子集、交集判断即为按字的位运算
+    '''
+
+    def __init__(self, labels=()):
+        self.index = {}  # 标签 -> 编号
+        self.labels = []  # 编号 -> 标签
+        for label in labels:
+            self.intern(label)
+
+    @classmethod
+    def from_ids(cls, label_ids):
+        '''
+        由 {标签: 编号} 构建，编号可以不连续（如分片只带自己的叶标签及其全局编号），位图与原编号一致；
+        之后新驻留的标签编号排在最大编号之后
+        '''
+        interner = cls()
+        interner.index = dict(label_ids)
+        interner.labels = [None] * (max(interner.index.values(), default=-1) + 1)
+        for label, index in interner.index.items():
+            interner.labels[index] = label
+        return interner
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def intern(self, label):
+        index = self.index.get(label)
+        if index is None:
+            index = len(self.labels)
+            self.index[label] = index
+            self.labels.append(label)
+        return index
+
+    def to_mask(self, labels):
+        return mask_from_indices(self.intern(label) for label in labels)
+
+    def from_mask(self, mask):
+        return [self.labels[index] for index in iter_bits(mask)]
+
+
 def dnf_mapping_2_set(dnf_mapping: {}):
     res = {}
     sets = []
@@ -118,7 +294,6 @@ def dnf_mapping_2_set(dnf_mapping: {}):
     return res, sets # node-集合映射表，和集合列表
 
 
-
 def label_mapping(label_mapping_pairs: []):
     '''
     签映射使组合能够通过捕获不同标签树（例如 租户和位置标签树）之间的标签之间的关系来 避免生成此类不可能的 EPG 组合。
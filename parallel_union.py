@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 16:05
+@Auth ： xiaolongtuan
+@File ：parallel_union.py
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+'''
+graph_union 的多进程执行：各源目的对的合并互相独立，按批次分发到进程池。
+每个批次只携带其引用到的 NF 与状态，NF 以 (标签, match, action, priority, qos) 元组表示，
+链与结果中的 NF 均以全局编号引用，主进程按输入顺序拼接结果并换回原始 NF 对象
+'''
+
+# 进程池不可用（无法创建进程、进程异常退出、对象无法序列化）时回退到串行；合并本身抛出的异常照常向上传递
+POOL_ERRORS = (BrokenProcessPool, pickle.PicklingError, OSError)
+
+
+def encode_NF(NF):
+    return NF.label, NF.match, NF.action, NF.priority, NF.qos
+
+
+def decode_NF(spec):
+    from policy_graph_model_janus import NFBNode, NetworkFunctionBlock
+
+    label, match, action, priority, qos = spec
+    return NFBNode(NetworkFunctionBlock[label], match, action, priority, qos)
+
+
+def encode_chunk(items, NF_ids):
+    '''
+    :param items: [(源目的对, 状态 -> NFs_Qos 列表)]
+    :param NF_ids: NF -> 全局编号，跨批次共享
+    :return: (NF表 {编号: spec}, 状态表, [(状态编号, [(NF编号元组, Qos)])] 列表)
+    '''
+    NF_table = {}
+    state_ids = {}
+    pairs = []
+    for _, states_value_map in items:
+        encoded = []
+        for state, NFs_Qos_list in states_value_map.items():
+            state_id = state_ids.setdefault(state, len(state_ids))
+            chains = []
+            for NFs, Qos in NFs_Qos_list:
+                chain = []
+                for NF in NFs:
+                    NF_id = NF_ids.setdefault(NF, len(NF_ids))
+                    if NF_id not in NF_table:
+                        NF_table[NF_id] = encode_NF(NF)
+                    chain.append(NF_id)
+                chains.append((tuple(chain), Qos))
+            encoded.append((state_id, chains))
+        pairs.append(encoded)
+    return NF_table, list(state_ids), pairs
+
+
+def merge_chunk(chunk):
+    '''
+    工作进程入口：在独立的模型实例中合并一个批次
+    :return: 每个源目的对的 [(原子状态, NF编号列表, Qos)]
+    '''
+    from policy_graph_model_janus import JanusPolicyModel
+
+    NF_table, states, pairs = chunk
+    NFs = {NF_id: decode_NF(spec) for NF_id, spec in NF_table.items()}
+    NF_ids = {NF: NF_id for NF_id, NF in NFs.items()}
+    inputs = []
+    for encoded in pairs:
+        states_value_map = {}
+        for state_id, chains in encoded:
+            states_value_map[states[state_id]] = [([NFs[NF_id] for NF_id in chain], Qos) for chain, Qos in chains]
+        inputs.append(states_value_map)
+
+    merger = JanusPolicyModel(label_trees_edges=[], label_mapping_pairs=[])
+    merger._start_compile(inputs)
+    results = []
+    for states_value_map in inputs:
+        atomic_state_value_map = merger._merge_pair(states_value_map)
+        results.append([(atomic_state, [NF_ids[NF] for NF in atomic_FNs], atomic_qos)
+                        for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items()])
+    return results
+
+
+def parallel_merge(items, workers, chunk_size):
+    '''
+    :param items: [(源目的对, 状态 -> NFs_Qos 列表)]
+    :return: 与 items 顺序一致的 原子状态 -> (NFs, Qos) 列表
+    '''
+    NF_ids = {}
+    chunks = [encode_chunk(items[start:start + chunk_size], NF_ids) for start in range(0, len(items), chunk_size)]
+    NFs = [None] * len(NF_ids)
+    for NF, NF_id in NF_ids.items():
+        NFs[NF_id] = NF
+
+    merged = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(merge_chunk, chunks):
+            for result in results:
+                merged.append({atomic_state: ([NFs[NF_id] for NF_id in atomic_FN_ids], atomic_qos)
+                               for atomic_state, atomic_FN_ids, atomic_qos in result})
+    return merged
@@ -9,8 +9,9 @@ from collections import defaultdict
 from enum import Enum
 import networkx as nx
 
-from colections_cul import split_into_disjoint_sets
-from label_namespace import label_namespace_define, tree_to_dnf, dnf_mapping_2_set
+from colections_cul import AtomIndex, InternTable, freeze
+from label_namespace import label_namespace_define, LabelInterner, LeafClosure, iter_tree_edges
+from instrumentation import DISABLED
 from policy_graph_error import InvalidPolicyGraphError
 from topological_sort import topological_sort
 
@@ -32,11 +33,29 @@ class Flow:
     protocol: str
     dst_port: int
 
+    __slots__ = ('src_ip', 'dst_ip', 'protocol', 'dst_port', '_hash')
+
     def __init__(self, src_ip, dst_ip, protocol, dst_port):
-        self.src_ip = src_ip
-        self.dst_ip = dst_ip
-        self.protocol = protocol
-        self.dst_port = dst_port
+        object.__setattr__(self, 'src_ip', src_ip)
+        object.__setattr__(self, 'dst_ip', dst_ip)
+        object.__setattr__(self, 'protocol', protocol)
+        object.__setattr__(self, 'dst_port', dst_port)
+        object.__setattr__(self, '_hash', hash(self._fields()))
+
+    def _fields(self):
+        return self.src_ip, self.dst_ip, self.protocol, self.dst_port
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._fields() == self._fields()
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), self._fields()
 
 
 class NodeType(Enum):
@@ -47,22 +66,56 @@ class NodeType(Enum):
     group = 2
 
 
+NODE_TABLE = InternTable()  # 节点驻留表
+
+
 class Node:
+    '''
+    不可变节点，按内容驻留，哈希在构造时计算
+    '''
     type: NodeType
+    __slots__ = ('label', '_hash', '__weakref__')
+
+    def __new__(cls, label):
+        return cls._intern((cls, label), label=label)
+
+    def __init__(self, *args, **kwargs):
+        pass  # 字段已在 __new__ 中设置
 
-    def __init__(self, label):
-        self.label
+    @classmethod
+    def _intern(cls, key, **fields):
+        def create():
+            node = object.__new__(cls)
+            for name, value in fields.items():
+                object.__setattr__(node, name, value)
+            object.__setattr__(node, '_hash', hash(key))
+            return node
+
+        return NODE_TABLE.intern(key, create)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), (self.label,)
 
 
 class NFBNode(Node):  # 中间盒，用优先级匹配操作规则表示
-    def __init__(self, nf: NetworkFunctionBlock, match: {}, action: {}, priority=1, qos={}):
-        super(nf.name)
-        self.qos = qos
-        self.type = NodeType.fnb
+    type = NodeType.fnb
+    __slots__ = ('qos', 'priority', 'action', 'match')
+
+    def __new__(cls, nf: NetworkFunctionBlock, match: {}, action: {}, priority=1, qos={}):
+        match, action, qos = freeze(match), freeze(action), freeze(qos)
+        return cls._intern((cls, nf.name, match, action, priority, qos), label=nf.name, qos=qos,
+                           priority=priority,  # 优先级
+                           action=action,  # 动作，转发，修改，丢弃
+                           match=match)  # 匹配条件
 
-        self.priority = priority  # 优先级
-        self.action = action  # 动作，转发，修改，丢弃
-        self.match = match  # 匹配条件
+    def __reduce__(self):
+        return type(self), (NetworkFunctionBlock[self.label], self.match, self.action, self.priority, self.qos)
 
     def is_modify(self):
         if self.action['aciton_type'] in [ActionType.modify]:
@@ -70,10 +123,11 @@ class NFBNode(Node):  # 中间盒，用优先级匹配操作规则表示
         return False
 
     def get_output_flow(self):
+        # match 不可修改，修改动作作用于副本
+        output_flow = dict(self.match)
         if self.action['aciton_type'] in [ActionType.modify]:
-            for key, value in self.action['content']:
-                self.match[key] = value
-        return self.match
+            output_flow.update(self.action['content'])
+        return output_flow
 
     def get_input_flow(self):
         return self.match
@@ -100,23 +154,39 @@ class ActionType(Enum):
 
 
 class GroupNode(Node):  # EPG
-    def __init__(self, label, ):
-        super(label)
-        self.type = NodeType.group
+    type = NodeType.group
+    __slots__ = ()
 
 
 class DiEdge:
     src: str
     dst: str
     attr: {}
+    __slots__ = ('src', 'dst', 'attr', 'condition', '_hash')
 
     def __init__(self, src_label, dst_label, condition: str, attr={}):
         # 现在attr只设定带宽，且范围为low (< 100 Mbps),medium (> 100 Mbps and < 500 Mbps) & high (> 500 Mbps)
         # condition 表示条件策略，其被区分为动态策略和临时策略，这里是字符串形式如：filed_connections > 2
-        self.src = src_label
-        self.dst = dst_label
-        self.attr = attr  # attr['b/w'] = ('min',high)
-        self.condition = condition
+        object.__setattr__(self, 'src', src_label)
+        object.__setattr__(self, 'dst', dst_label)
+        object.__setattr__(self, 'attr', freeze(attr))  # attr['b/w'] = ('min',high)
+        object.__setattr__(self, 'condition', condition)
+        object.__setattr__(self, '_hash', hash(self._fields()))
+
+    def _fields(self):
+        return self.src, self.dst, self.condition, self.attr
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._fields() == self._fields()
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), (self.src, self.dst, self.condition, self.attr)
 
     def check_node(self, label):
         if self.src == label or self.dst == label:
@@ -131,7 +201,9 @@ class Policy:
     3. 每个策略图必须严格限制
     '''
 
-    def __init__(self, middle_nodes: list(Node), edges: [], src_EPG: GroupNode, dst_EPG: GroupNode):
+    __slots__ = ('policy_graph', 'middle_nodes', 'edges', 'src_EPG', 'dst_EPG')
+
+    def __init__(self, middle_nodes: [], edges: [], src_EPG: GroupNode, dst_EPG: GroupNode):
         self.policy_graph = nx.DiGraph()
         for node in middle_nodes:
             self.policy_graph.add_node(node.label, type=node.type, attr=node)
@@ -169,18 +241,23 @@ class PolicyModel:
     处理多个策略图冲突模型
     '''
 
-    def __init__(self, label_trees_edges, label_mapping_pairs):
+    def __init__(self, label_trees_edges, label_mapping_pairs, instrumentation=None):
         self.policys = []
         self.label_namespace = label_namespace_define(label_trees=label_trees_edges)
         self.EPGs = set()
         self.EPGs_policy_map = defaultdict(list)
         self.label_mapping_pairs = label_mapping_pairs
         self.label_trees_edges = label_trees_edges
+        self.label_interner = LabelInterner()  # 叶标签驻留表，原子与EPG均以其位图表示
+        self.label_closure = LeafClosure(edges=iter_tree_edges(label_trees_edges),
+                                         label_mapping_pairs=label_mapping_pairs)  # 按需计算的叶闭包
+        self.instrumentation = instrumentation if instrumentation is not None else DISABLED  # 分阶段计时与计数
 
     def add_policy(self, p: Policy):
         self.policys.append(p)
 
         self.EPGs.add(p.src_EPG.label)
+        self.EPGs.add(p.dst_EPG.label)  # 目的EPG同样参与拆分
         self.EPGs_policy_map[p.src_EPG.label].append(p)
 
     def graph_normalization(self):
@@ -188,35 +265,33 @@ class PolicyModel:
         将所有策略拆分为最小单位graph
         :return:
         '''
-        self.label_dfn = tree_to_dnf(edges=self.label_trees_edges, label_mapping_pairs=self.label_mapping_pairs)
-        # 将EPG拆分为全局不相关的
-        EPGs_dfn_mapping = {}
-        for EPG in self.EPGs:
-            EPGs_dfn_mapping[EPG] = self.label_dfn[EPG]
-
-        # 将当前EPGs转换为dnf
-        label_set_mapping, leaf_sets = dnf_mapping_2_set(EPGs_dfn_mapping)
-
-        # 将当前EPGs拆分为完全互斥
-        normalized_EPGs = split_into_disjoint_sets(leaf_sets)
-
-        # 复制、合并 组合约束
-        src_dst_policy_map = defaultdict(list)
-        for p in self.policys:
-            l_EPGs_srcs = []
-            l_EPGs_dsts = []
-            for little_EPGs in normalized_EPGs:
-                if little_EPGs.issubset(label_set_mapping[p.src_EPG.label]):
-                    l_EPGs_srcs.append(little_EPGs)
-                elif little_EPGs.issubset(label_set_mapping[p.dst_EPG.label]):
-                    l_EPGs_dsts.append(little_EPGs)
-
-            for l_EPGs_src in l_EPGs_srcs:
-                for l_EPGs_dst in l_EPGs_dsts:
-                    # n*m个源目标对
-                    new_policy = p.update_EPGS()
-
-                    src_dst_policy_map[(l_EPGs_src, l_EPGs_dst)].append(p)
+        inst = self.instrumentation
+        with inst.stage('graph_normalization'):
+            # 将EPG拆分为全局不相关的：只计算当前EPGs的叶闭包，并以位图表示
+            with inst.stage('leaf_closure'):
+                label_mask_mapping = {}
+                for EPG in self.EPGs:
+                    label_mask_mapping[EPG] = self.label_interner.to_mask(self.label_closure.closure(EPG))
+
+            # 将当前EPGs拆分为完全互斥，并建立 叶标签/EPG -> 原子 的倒排索引
+            with inst.stage('split_atoms'):
+                self.atom_index = AtomIndex(label_mask_mapping)
+
+            # 复制、合并 组合约束
+            with inst.stage('expand_pairs'):
+                src_dst_policy_map = defaultdict(list)
+                for p in self.policys:
+                    # 源和目的可能重叠（如组内通信），两者分别查表
+                    l_EPGs_srcs = self.atom_index.atoms_of(p.src_EPG.label)
+                    l_EPGs_dsts = self.atom_index.atoms_of(p.dst_EPG.label)
+
+                    for l_EPGs_src in l_EPGs_srcs:
+                        for l_EPGs_dst in l_EPGs_dsts:
+                            # n*m个源目标对，策略按原样归入源目的对
+                            src_dst_policy_map[(l_EPGs_src, l_EPGs_dst)].append(p)
+        if inst.enabled:
+            inst.count('atoms', len(self.atom_index.members))
+            inst.count('normalized_pairs', len(src_dst_policy_map))
         return src_dst_policy_map
 
     def graph_union(self, src_dst_policy_map):
@@ -226,25 +301,31 @@ class PolicyModel:
         :param src_dst_policy_map:
         :return:
         '''
-        # 在标准图中，所有的EPG都只可能是相等或不想交，所以直接将所有的图放在一张图中
-        for (src, dst), policy_list in src_dst_policy_map.items():
-            # 约束列表
-            constraints = []
-            # 1. 组合，确定已有功能盒间的依赖关系作为约束，首先将功能盒转换为优先级匹配规则，根据packge-in 和 创建的package-out来确定依赖关系
-            for policy_in in policy_list:
-                for policy_out in policy_list:
-                    if policy_out == policy_in:
-                        continue
-                    # 判断是否policy_out创建修改的出流是policy_in要匹配的入流
-                    policy_in_match = policy_in.get_input_flow()
-                    policy_out_flow = policy_out.get_output_flow()
-                    if is_overlap(policy_out_flow, policy_in_match):  # 存在依赖关系
-                        constraints.append((policy_out, policy_in))
-
-            # 有向图拓扑求解，根据依赖关系Pyretic使用启发式方法确定功能盒的顺序
-            result_policy_list = topological_sort(policy_list, constraints)
-            if result_policy_list == -1:
-                # 抛出异常，不存在可行的功能盒顺序
-                raise InvalidPolicyGraphError("不存在可行的功能盒顺序")
-            src_dst_policy_map[(src, dst)] = result_policy_list  # 更新策略盒顺序
+        inst = self.instrumentation
+        with inst.stage('graph_union'):
+            # 在标准图中，所有的EPG都只可能是相等或不想交，所以直接将所有的图放在一张图中
+            for (src, dst), policy_list in src_dst_policy_map.items():
+                # 约束列表
+                constraints = []
+                # 1. 组合，确定已有功能盒间的依赖关系作为约束，首先将功能盒转换为优先级匹配规则，根据packge-in 和 创建的package-out来确定依赖关系
+                with inst.stage('is_overlap'):
+                    for policy_in in policy_list:
+                        for policy_out in policy_list:
+                            if policy_out == policy_in:
+                                continue
+                            # 判断是否policy_out创建修改的出流是policy_in要匹配的入流
+                            policy_in_match = policy_in.get_input_flow()
+                            policy_out_flow = policy_out.get_output_flow()
+                            if is_overlap(policy_out_flow, policy_in_match):  # 存在依赖关系
+                                constraints.append((policy_out, policy_in))
+
+                # 有向图拓扑求解，根据依赖关系Pyretic使用启发式方法确定功能盒的顺序
+                with inst.stage('topological_sort'):
+                    result_policy_list = topological_sort(policy_list, constraints)
+                if result_policy_list == -1:
+                    # 抛出异常，不存在可行的功能盒顺序
+                    raise InvalidPolicyGraphError("不存在可行的功能盒顺序")
+                if inst.enabled:
+                    inst.count('constraints', len(constraints))
+                src_dst_policy_map[(src, dst)] = result_policy_list  # 更新策略盒顺序
         return src_dst_policy_map
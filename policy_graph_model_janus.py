@@ -5,16 +5,19 @@
 @File ：policy_graph_model.py
 """
 import copy
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from enum import Enum
+from itertools import islice
 import networkx as nx
-from sympy import Implies
 
-from colections_cul import split_into_disjoint_sets
-from label_namespace import label_namespace_define, tree_to_dnf, dnf_mapping_2_set
-from policy_graph_error import InvalidPolicyGraphError
-from state_resolver import decompose_states, union_qos
-from topological_sort import topological_sort
+from colections_cul import AtomIndex, InternTable, freeze, freeze_result
+from compiled_export import CompiledRecord
+from flow_match import match_overlap, MatchIndex
+from instrumentation import DISABLED
+from label_namespace import label_namespace_define, LabelInterner, LeafClosure, iter_tree_edges
+from parallel_union import parallel_merge, POOL_ERRORS
+from state_resolver import decompose_states, union_qos, StateImplicationChecker, CacheInfo
+from topological_sort import priority_topological_sort
 
 
 class NetworkFunctionBlock(Enum):
@@ -33,12 +36,29 @@ class Flow:
     dst_ip: int
     protocol: str
     dst_port: int
+    __slots__ = ('src_ip', 'dst_ip', 'protocol', 'dst_port', '_hash')
 
     def __init__(self, src_ip, dst_ip, protocol, dst_port):
-        self.src_ip = src_ip
-        self.dst_ip = dst_ip
-        self.protocol = protocol
-        self.dst_port = dst_port
+        object.__setattr__(self, 'src_ip', src_ip)
+        object.__setattr__(self, 'dst_ip', dst_ip)
+        object.__setattr__(self, 'protocol', protocol)
+        object.__setattr__(self, 'dst_port', dst_port)
+        object.__setattr__(self, '_hash', hash(self._fields()))
+
+    def _fields(self):
+        return self.src_ip, self.dst_ip, self.protocol, self.dst_port
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._fields() == self._fields()
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), self._fields()
 
 
 class NodeType(Enum):
@@ -49,22 +69,59 @@ class NodeType(Enum):
     group = 2
 
 
+# 节点驻留表：内容相同的节点只保留一个对象，大量源目的对中的 NF 引用共享同一份存储
+NODE_TABLE = InternTable()
+
+
 class Node:
+    '''
+    不可变节点，构造时按内容驻留并计算哈希；内容相同即为同一对象，因此相等比较沿用对象身份
+    '''
     type: NodeType
+    __slots__ = ('label', '_hash', '__weakref__')
 
-    def __init__(self, label):
-        self.label
+    def __new__(cls, label):
+        return cls._intern((cls, label), label=label)
+
+    def __init__(self, *args, **kwargs):
+        pass  # 字段已在 __new__ 中设置，驻留的节点不重复初始化
+
+    @classmethod
+    def _intern(cls, key, **fields):
+        def create():
+            node = object.__new__(cls)
+            for name, value in fields.items():
+                object.__setattr__(node, name, value)
+            object.__setattr__(node, '_hash', hash(key))
+            return node
+
+        return NODE_TABLE.intern(key, create)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), (self.label,)
 
 
 class NFBNode(Node):  # 中间盒，用优先级匹配操作规则表示
-    def __init__(self, nf: NetworkFunctionBlock, match: {}, action: {}, priority=1, qos={}):
-        super(nf.name)
-        self.qos = qos
-        self.type = NodeType.fnb
+    type = NodeType.fnb
+    __slots__ = ('qos', 'priority', 'action', 'match', '_order_key')
 
-        self.priority = priority  # 优先级
-        self.action = action  # 动作，转发，修改，丢弃
-        self.match = match  # 匹配条件
+    def __new__(cls, nf: NetworkFunctionBlock, match: {}, action: {}, priority=1, qos={}):
+        # match/action/qos 转换为 FrozenDict
+        match, action, qos = freeze(match), freeze(action), freeze(qos)
+        return cls._intern((cls, nf.name, match, action, priority, qos), label=nf.name, qos=qos,
+                           priority=priority,  # 优先级
+                           action=action,  # 动作，转发，修改，丢弃
+                           match=match,  # 匹配条件
+                           _order_key=None)  # 排序键，首次使用时计算，见 NF_order_key
+
+    def __reduce__(self):
+        return type(self), (NetworkFunctionBlock[self.label], self.match, self.action, self.priority, self.qos)
 
     def is_modify(self):
         if self.action['aciton_type'] in [ActionType.modify]:
@@ -72,21 +129,144 @@ class NFBNode(Node):  # 中间盒，用优先级匹配操作规则表示
         return False
 
     def get_output_flow(self):
-        if self.action['aciton_type'] in [ActionType.modify]:
-            for key, value in self.action['content']:
-                self.match[key] = value
-        return self.match
+        # 修改动作作用于匹配条件的副本，不改变 NF 自身的匹配条件
+        output_flow = dict(self.match)
+        if self.is_modify():
+            output_flow.update(self.action['content'])
+        return output_flow
 
     def get_input_flow(self):
         return self.match
 
 
-# 判断后者是否会捕获前者flow，用于识别依赖
+def _sorted_repr(value):
+    if isinstance(value, dict):
+        return repr(sorted((str(key), _sorted_repr(item)) for key, item in value.items()))
+    return repr(value)
+
+
+def NF_order_key(NF):
+    # NF 的确定性排序键，只由内容决定；NF 已驻留，键在节点上只计算一次
+    key = NF._order_key
+    if key is None:
+        key = NF.label, _sorted_repr(NF.match), _sorted_repr(NF.action), NF.priority, _sorted_repr(NF.qos)
+        object.__setattr__(NF, '_order_key', key)
+    return key
+
+
+# 判断后者是否会捕获前者flow，用于识别依赖；字段支持CIDR前缀、范围与通配，见 flow_match
 def is_overlap(output_flow, match2):
-    for key, value in match2.items():
-        if output_flow[key] != value:
-            return False
-    return True
+    return match_overlap(output_flow, match2)
+
+
+class NFDependencyIndex:
+    '''
+    NF 依赖检测引擎：一次编译中出现的所有 NF 的匹配条件存入 MatchIndex（区间树 + 哈希表），
+    某个 NF 的出流只需与索引给出的候选 NF 比较；每个 NF 的依赖集合（即它与其余 NF 的判断结果）在编译期内缓存。
+    已缓存 NF 的出流另存入一个 MatchIndex，新登记的 NF 只补入出流与其匹配条件重叠的缓存项
+    '''
+
+    def __init__(self, NFs=()):
+        self.match_index = MatchIndex()
+        self.output_index = MatchIndex()  # 已缓存依赖集合的 NF 的出流
+        self.registered = set()
+        self._dependents = {}
+        self.hits = 0
+        self.misses = 0
+        self.register(NFs)
+
+    def register(self, NFs):
+        for NF in NFs:
+            if NF in self.registered:
+                continue
+            self.registered.add(NF)
+            match = NF.get_input_flow()
+            self.match_index.add(match, NF)
+            if self._dependents:
+                # 新的 NF 只会成为出流与其匹配条件重叠的 NF 的依赖
+                for cached_NF in self.output_index.query(match):
+                    if cached_NF is not NF:
+                        self._dependents[cached_NF] = self._dependents[cached_NF] | {NF}
+
+    def dependents(self, NF):
+        '''
+        :return: 会捕获 NF 出流的其余已登记 NF（frozenset）
+        '''
+        dependents = self._dependents.get(NF)
+        if dependents is not None:
+            self.hits += 1
+            return dependents
+
+        self.misses += 1
+        output_flow = NF.get_output_flow()
+        found = set(self.match_index.query(output_flow))
+        found.discard(NF)
+        dependents = self._dependents[NF] = frozenset(found)
+        self.output_index.add(output_flow, NF)
+        return dependents
+
+    def depends(self, NF, other_NF):
+        # other_NF 是否会捕获 NF 的出流
+        return other_NF in self.dependents(NF)
+
+    def constraints(self, NF_set):
+        '''
+        :return: NF_set 内部的依赖约束 (NF, other_NF)
+        '''
+        if not isinstance(NF_set, (set, frozenset)):
+            NF_set = set(NF_set)
+        constraints = set()
+        for NF in NF_set:
+            dependents = self.dependents(NF)
+            if len(dependents) < len(NF_set):
+                constraints.update((NF, other_NF) for other_NF in dependents if other_NF in NF_set)
+            else:
+                constraints.update((NF, other_NF) for other_NF in NF_set if other_NF in dependents)
+        return constraints
+
+
+class MergeResultCache:
+    '''
+    合并结果的哈希一致化缓存：源目的对的输入（状态及其 NF 链、Qos，保持顺序）规范化为可哈希的键，
+    输入相同的源目的对共享同一个结果对象，因此结果以只读形式（FrozenDict，NF 链为元组）保存与返回。
+    LRU 淘汰，maxsize 为 0 时不缓存
+    '''
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    @staticmethod
+    def key(states_value_map):
+        # NF 已驻留，元组直接以其缓存的哈希参与计算
+        return tuple((state, tuple((tuple(NFs_Qos[0]), freeze(NFs_Qos[1])) for NFs_Qos in NFs_Qos_list))
+                     for state, NFs_Qos_list in states_value_map.items())
+
+    def get(self, key):
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        '''
+        :return: 结果的只读形式，调用方应使用它代替传入的 result
+        '''
+        result = freeze_result(result)
+        if not self.maxsize:
+            return result
+        self._results[key] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return result
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._results))
 
 
 class ActionType(Enum):
@@ -102,23 +282,39 @@ class ActionType(Enum):
 
 
 class GroupNode(Node):  # EPG
-    def __init__(self, label, ):
-        super(label)
-        self.type = NodeType.group
+    type = NodeType.group
+    __slots__ = ()
 
 
 class DiEdge:
     src: str
     dst: str
     attr: {}
+    __slots__ = ('src', 'dst', 'attr', 'condition', '_hash')
 
     def __init__(self, src_label, dst_label, condition: str, attr={}):
         # 现在attr只设定带宽，且范围为low (< 100 Mbps),medium (> 100 Mbps and < 500 Mbps) & high (> 500 Mbps)
         # condition 表示条件策略，其被区分为动态策略和临时策略，这里是字符串形式如：filed_connections > 2
-        self.src = src_label
-        self.dst = dst_label
-        self.attr = attr  # attr['b/w'] = ('min',high)
-        self.condition = condition
+        object.__setattr__(self, 'src', src_label)
+        object.__setattr__(self, 'dst', dst_label)
+        object.__setattr__(self, 'attr', freeze(attr))  # attr['b/w'] = ('min',high)
+        object.__setattr__(self, 'condition', condition)
+        object.__setattr__(self, '_hash', hash(self._fields()))
+
+    def _fields(self):
+        return self.src, self.dst, self.condition, self.attr
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 不可修改')
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._fields() == self._fields()
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), (self.src, self.dst, self.condition, self.attr)
 
     def check_node(self, label):
         if self.src == label or self.dst == label:
@@ -133,7 +329,9 @@ class Policy:
     3. 每个策略图必须严格限制
     '''
 
-    def __init__(self, state_NFs_map: set(tuple), src_EPG: GroupNode, dst_EPG: GroupNode):
+    __slots__ = ('state_NFs_map', 'src_EPG', 'dst_EPG')
+
+    def __init__(self, state_NFs_map: {}, src_EPG: GroupNode, dst_EPG: GroupNode):
         self.state_NFs_map = state_NFs_map
         # 列表顺序代表NF顺序，以及Qos需求，都是放在state（逻辑表达式，提前定义Symbol类变量）下的，
         # 这里的tuple第一个值为NFs(list(NFBNode))， 第二个为Qos
@@ -144,62 +342,245 @@ class Policy:
 class JanusPolicyModel:
     '''
     处理多个策略图冲突模型
+    compile() 首次全量编译，之后 add_policy / remove_policy / update_policy 只记录受影响的原子与源目的对，
+    再次 compile() 时仅重新拆分受影响的原子、重新合并脏的源目的对
     '''
 
-    def __init__(self, label_trees_edges, label_mapping_pairs):
+    def __init__(self, label_trees_edges, label_mapping_pairs, implication_cache_size=65536, workers=1,
+                 chunk_size=256, label_interner=None, merge_cache_size=4096, instrumentation=None):
         self.policys = []
-        self.label_namespace = label_namespace_define(label_trees=label_trees_edges)
+        self.label_namespace = label_namespace_define(label_trees=label_trees_edges,
+                                                      label_mapping_pairs=label_mapping_pairs)  # 命名空间分量
         self.EPGs = set()
         self.EPGs_policy_map = defaultdict(list)
         self.label_mapping_pairs = label_mapping_pairs
         self.label_trees_edges = label_trees_edges
+        # 叶标签驻留表，原子与EPG均以其位图表示；分片编译时各分片共享同一份编号
+        self.label_interner = label_interner if label_interner is not None else LabelInterner()
+        self.label_closure = LeafClosure(edges=iter_tree_edges(label_trees_edges),
+                                         label_mapping_pairs=label_mapping_pairs)  # 按需计算的叶闭包
+
+        self.compiled = None  # 编译结果：(src原子, dst原子) -> 原子状态 -> (NFs, Qos)
+        self.dirty_pairs = set()  # 待重新合并的源目的对
+        self.atom_pairs = defaultdict(set)  # 原子 -> 编译结果中涉及它的源目的对
+        self.pair_inputs = {}  # 源目的对 -> 编译时的 状态 -> NFs_Qos 列表，用于判断增量更新是否只有新增
+
+        self.implication_cache_size = implication_cache_size
+        self.implication_checker = StateImplicationChecker(implication_cache_size)  # 每次编译重建，跨源目的对共享
+        self.nf_dependency = NFDependencyIndex()
+        self.merge_cache = MergeResultCache(merge_cache_size)  # 跨编译保留，结果只由输入决定
+        self.compile_store = None  # 可选的持久化存储（见 compile_store），编译时复用其中输入未变的结果
+
+        self.workers = workers  # graph_union 的进程数，1 为串行
+        self.chunk_size = chunk_size  # 每个进程批次包含的源目的对数量
+        # 分阶段计时与计数（instrumentation.Instrumentation），缺省为几乎无开销的空实现
+        self.instrumentation = instrumentation if instrumentation is not None else DISABLED
 
     def add_policy(self, p: Policy):
         self.policys.append(p)
 
-        self.EPGs.add(p.src_EPG.label)
-        self.EPGs.add(p.dst_EPG.label)
+        for label in (p.src_EPG.label, p.dst_EPG.label):
+            if self.compiled is not None and label not in self.EPGs:
+                self._add_EPG(label)
+            self.EPGs.add(label)
 
         self.EPGs_policy_map[p.src_EPG.label].append(p)
         self.EPGs_policy_map[p.dst_EPG.label].append(p)  # 源目的地节点都映射到该policy
 
+        if self.compiled is not None:
+            self._mark_policy_pairs(p)
+
+    def remove_policy(self, p: Policy):
+        if self.compiled is not None:
+            self._mark_policy_pairs(p)
+
+        self.policys.remove(p)
+        for label in (p.src_EPG.label, p.dst_EPG.label):
+            policies = self.EPGs_policy_map.get(label)
+            if policies is None:
+                continue  # 源目的相同，已处理
+            policies.remove(p)
+            if not policies:  # 该EPG不再被任何策略引用
+                del self.EPGs_policy_map[label]
+                self.EPGs.discard(label)
+                if self.compiled is not None:
+                    self._mark_atoms(*self.atom_index.remove_set(label))
+
+    def update_policy(self, old_p: Policy, new_p: Policy):
+        self.remove_policy(old_p)
+        self.add_policy(new_p)
+
+    def _add_EPG(self, label):
+        mask = self.label_interner.to_mask(self.label_closure.closure(label))
+        self._mark_atoms(*self.atom_index.add_set(label, mask))
+
+    def _mark_atoms(self, removed, added):
+        # 被拆分/合并的原子的所有源目的对失效，新原子的源目的对需重新生成
+        for atom in removed:
+            self.dirty_pairs.update(self.atom_pairs.pop(atom, ()))
+        for atom in added:
+            self.dirty_pairs.update(self._pairs_of_atom(atom))
+
+    def _mark_policy_pairs(self, p: Policy):
+        self.dirty_pairs.update(self._expand(p))
+
+    def _pairs_of_atom(self, atom):
+        pairs = set()
+        for EPG in self.atom_index.members[atom]:
+            for p in self.EPGs_policy_map[EPG]:
+                if p.src_EPG.label == EPG:
+                    pairs.update((atom, dst) for dst in self.atom_index.atoms_of(p.dst_EPG.label))
+                if p.dst_EPG.label == EPG:
+                    pairs.update((src, atom) for src in self.atom_index.atoms_of(p.src_EPG.label))
+        return pairs
+
+    def _expand(self, p: Policy):
+        '''
+        策略的 源原子 × 目的原子：源与目的是不同的端点，任意组合都可能出现；
+        标签映射带来的约束只作用于同一端点上的标签，已由叶闭包体现在原子中
+        '''
+        return [(src, dst) for src in self.atom_index.atoms_of(p.src_EPG.label)
+                for dst in self.atom_index.atoms_of(p.dst_EPG.label)]
+
+    def _pair_input(self, src, dst):
+        '''
+        由 EPGs_policy_map 重新收集某个源目的对的 状态 -> NFs_Qos 列表
+        '''
+        states_value_map = defaultdict(list)
+        dst_EPGs = set(self.atom_index.members[dst])
+        seen = set()
+        for EPG in self.atom_index.members[src]:
+            for p in self.EPGs_policy_map[EPG]:
+                if p.src_EPG.label != EPG or p.dst_EPG.label not in dst_EPGs or id(p) in seen:
+                    continue
+                seen.add(id(p))
+                for state, NFs_Qos in p.state_NFs_map.items():
+                    states_value_map[state].append(NFs_Qos)
+        return states_value_map
+
+    def compile(self):
+        '''
+        首次调用全量编译，之后只重新合并脏的源目的对，其余编译结果保持不变
+        :return: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)
+        '''
+        with self.instrumentation.stage('compile'):
+            compiled = self._compile()
+        if self.instrumentation.enabled:
+            self._report_caches()
+        return compiled
+
+    def _report_caches(self):
+        inst = self.instrumentation
+        inst.gauge('pairs', len(self.compiled))
+        inst.gauge('merge_cache', self.merge_cache.cache_info())
+        inst.gauge('implication_cache', self.implication_checker.cache_info())
+        inst.gauge('nf_dependency_hits', self.nf_dependency.hits)
+        inst.gauge('nf_dependency_misses', self.nf_dependency.misses)
+
+    def _compile(self):
+        if self.compiled is None:
+            src_dst_states_value_map = self.graph_normalization()
+            self.pair_inputs = dict(src_dst_states_value_map)
+            self.compiled = self.graph_union(src_dst_states_value_map)
+            self.atom_pairs = defaultdict(set)
+            for src, dst in self.compiled:
+                self.atom_pairs[src].add((src, dst))
+                self.atom_pairs[dst].add((src, dst))
+            return self.compiled
+
+        dirty_pairs, self.dirty_pairs = self.dirty_pairs, set()
+        pair_inputs = {}
+        for src, dst in dirty_pairs:
+            if src in self.atom_index.members and dst in self.atom_index.members:
+                pair_inputs[(src, dst)] = self._pair_input(src, dst)
+        self._start_compile(pair_inputs.values())
+        for src, dst in dirty_pairs:
+            states_value_map = pair_inputs.get((src, dst))
+            if states_value_map:
+                self.compiled[(src, dst)] = self._remerge_pair((src, dst), states_value_map)
+                self.pair_inputs[(src, dst)] = states_value_map
+                self.atom_pairs[src].add((src, dst))
+                self.atom_pairs[dst].add((src, dst))
+            else:
+                self.compiled.pop((src, dst), None)
+                self.pair_inputs.pop((src, dst), None)
+                for atom in (src, dst):
+                    pairs = self.atom_pairs.get(atom)
+                    if pairs is not None:
+                        pairs.discard((src, dst))
+                        if not pairs:
+                            del self.atom_pairs[atom]
+        return self.compiled
+
+    def _remerge_pair(self, pair, states_value_map):
+        # 增量编译中重新合并一个源目的对：输入未变的原子状态沿用上次的结果，只合并输入变化的原子状态
+        key = self.merge_cache.key(states_value_map)
+        result = self.merge_cache.get(key)
+        if result is not None:
+            return result
+        previous = None
+        old_input = self.pair_inputs.get(pair)
+        if old_input is not None and pair in self.compiled:
+            previous = (self.merge_cache.key(old_input), self.compiled[pair])
+        return self.merge_cache.put(key, self._merge_pair(states_value_map, previous))
+
     def graph_normalization(self):
         '''
         将所有策略拆分为最小单位graph
         :return:
         '''
-        self.label_dfn = tree_to_dnf(edges=self.label_trees_edges, label_mapping_pairs=self.label_mapping_pairs)
-        # 将EPG拆分为全局不相关的
-        EPGs_dfn_mapping = {}
-        for EPG in self.EPGs:
-            EPGs_dfn_mapping[EPG] = self.label_dfn[EPG]
-
-        # 将当前EPGs转换为dnf
-        label_set_mapping, leaf_sets = dnf_mapping_2_set(EPGs_dfn_mapping)
-
-        # 将当前EPGs拆分为完全互斥
-        normalized_EPGs = split_into_disjoint_sets(leaf_sets)
-
-        # 复制、合并 组合约束
-        src_dst_policy_map = defaultdict(defaultdict(list))
-        for p in self.policys:
-            l_EPGs_srcs = []
-            l_EPGs_dsts = []
-            for little_EPGs in normalized_EPGs:
-                if little_EPGs.issubset(label_set_mapping[p.src_EPG.label]):
-                    l_EPGs_srcs.append(little_EPGs)
-
-                elif little_EPGs.issubset(label_set_mapping[p.dst_EPG.label]):
-                    l_EPGs_dsts.append(little_EPGs)
-
-            for l_EPGs_src in l_EPGs_srcs:
-                for l_EPGs_dst in l_EPGs_dsts:
-                    # n*m个源目标对
-                    for state, NFs_Qos in p.state_NFs_map.items():
-                        src_dst_policy_map[(l_EPGs_src, l_EPGs_dst)][state].append(NFs_Qos)
-
+        inst = self.instrumentation
+        with inst.stage('graph_normalization'):
+            self._split_atoms()
+
+            # 复制、合并 组合约束
+            with inst.stage('expand_pairs'):
+                src_dst_policy_map = defaultdict(lambda: defaultdict(list))
+                for p in self.policys:
+                    # 源和目的可能重叠（如组内通信），两者分别查表
+                    for pair in self._expand(p):
+                        # n*m个源目标对
+                        for state, NFs_Qos in p.state_NFs_map.items():
+                            src_dst_policy_map[pair][state].append(NFs_Qos)
+
+        if inst.enabled:
+            inst.count('normalized_pairs', len(src_dst_policy_map))
         return src_dst_policy_map
 
+    def _split_atoms(self):
+        inst = self.instrumentation
+        # 将EPG拆分为全局不相关的：只计算当前EPGs的叶闭包，并以位图表示
+        with inst.stage('leaf_closure'):
+            label_mask_mapping = {}
+            for EPG in self.EPGs:
+                label_mask_mapping[EPG] = self.label_interner.to_mask(self.label_closure.closure(EPG))
+
+        # 将当前EPGs拆分为完全互斥，并建立 叶标签/EPG -> 原子 的倒排索引；
+        # 不同命名空间分量的EPG必然互斥，原子按分量分别划分
+        with inst.stage('split_atoms'):
+            EPGs = list(label_mask_mapping)
+            components = dict(zip(EPGs, self.label_namespace.find_many(EPGs)))
+            self.atom_index = AtomIndex(label_mask_mapping, components)
+        if inst.enabled:
+            inst.count('EPGs', len(label_mask_mapping))
+            inst.count('atoms', len(self.atom_index.members))
+
+    def _iter_pair_inputs(self):
+        '''
+        逐个源原子收集以其为源的策略，展开为 (源目的对, 状态 -> NFs_Qos 列表)；
+        同一源目的对内 NFs_Qos 的先后与 graph_normalization 一致（按策略加入的先后）
+        '''
+        position = {id(p): index for index, p in enumerate(self.policys)}
+        for src, member_EPGs in self.atom_index.members.items():
+            policies = {id(p): p for EPG in member_EPGs for p in self.EPGs_policy_map[EPG] if p.src_EPG.label == EPG}
+            dst_states_value_map = defaultdict(lambda: defaultdict(list))
+            for p in sorted(policies.values(), key=lambda p: position[id(p)]):
+                for dst in self.atom_index.atoms_of(p.dst_EPG.label):
+                    for state, NFs_Qos in p.state_NFs_map.items():
+                        dst_states_value_map[dst][state].append(NFs_Qos)
+            for dst, states_value_map in dst_states_value_map.items():
+                yield (src, dst), states_value_map
+
     def graph_union(self, src_dst_states_value_map):
         '''
         首先我得确定什么是冲突的，冲突分为两种，即
@@ -208,49 +589,175 @@ class JanusPolicyModel:
         :return:
         '''
         # 在标准图中，所有的EPG都只可能是相等或不想交，所以直接将所有的图放在一张图中
-        for (src, dst), states_value_map in src_dst_states_value_map.items():
-            # 约束列表
-            atomic_state_value_map = defaultdict(list)
-            states = list(states_value_map.keys())
-            # 对status进行扩充
-            atomic_states = decompose_states(states)
-            for atomic_state in atomic_states:
-                for fa_state in states:
-                    if Implies(atomic_state, fa_state):
-                        atomic_state_value_map[atomic_state].append(states_value_map[fa_state])
-                # 我需要合并该状态下的所有的NFs_Qos
-            for atomic_state, NFs_Qos_list in atomic_state_value_map.items():
-                final_NFs_Qos = []  # 合并后的NFs_Qos
-
-                constraints = set()  # 依赖约束， 包括原来的前后关系
-                NF_set = set()
-                Qos_set = set()
-                for NFs_Qos in NFs_Qos_list:
-                    NFs = NFs_Qos[0]
-                    for current_NF, next_NF in zip(NFs, NFs[1:]):
-                        constraints.add((current_NF, next_NF))
-                        NF_set.add(current_NF)
-                        NF_set.add(next_NF)
-
-                    Qos = NFs_Qos[1]
-                    Qos_set.add(Qos)
-
-                # 合并QOS
-                atomic_qos = union_qos(list(Qos_set))
-
-                # 合并NF链
-                for NF in NF_set:
-                    for other_NF in NF_set:
-                        if (NF != other_NF) and ((NF, other_NF) not in constraints):
-                            policy_out_flow = NF.get_output_flow()
-                            policy_in_match = other_NF.get_input_flow()
-                            if is_overlap(policy_out_flow, policy_in_match):  # 存在依赖关系
-                                constraints.add((NF, other_NF))
-                atomic_FNs = topological_sort(list(NF_set), list(constraints))
-                if atomic_FNs == -1:
-                    # 抛出异常，不存在可行的功能盒顺序
-                    raise InvalidPolicyGraphError("不存在可行的功能盒顺序")
-                atomic_state_value_map[atomic_state] = (atomic_FNs, atomic_qos)
-            src_dst_states_value_map[(src, dst)] = atomic_state_value_map
-        return src_dst_states_value_map
+        items = list(src_dst_states_value_map.items())
+        with self.instrumentation.stage('graph_union'):
+            for (pair, _), result in zip(items, self._merge_items(items)):
+                src_dst_states_value_map[pair] = result
+        # 规范化得到的是 defaultdict：返回普通字典，查询缺失的源目的对不会插入空项，结果也可以 pickle
+        return dict(src_dst_states_value_map)
+
+    def iter_union(self, src_dst_states_value_map):
+        '''
+        graph_union 的生成器版本：按批次合并并依次产出 (源目的对, 原子状态 -> (NFs, Qos))，
+        已合并的输入从 src_dst_states_value_map 中移除，结果不在模型中保留
+        '''
+        pairs = list(src_dst_states_value_map)
+        yield from self._iter_merged((pair, src_dst_states_value_map.pop(pair)) for pair in pairs)
+
+    def _iter_merged(self, items):
+        # 从 (源目的对, 输入) 的迭代器中逐批取出并合并，只保留当前批次
+        self._start_compile(())
+        batch_size = self.chunk_size * max(self.workers, 1)
+        items = iter(items)
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                return
+            with self.instrumentation.stage('graph_union'):
+                results = self._merge_items(batch, start=False)
+            yield from zip((pair for pair, _ in batch), results)
+
+    def iter_compile(self):
+        '''
+        流式编译：划分原子后逐个源原子展开源目的对的输入，按批次合并并产出 CompiledRecord。
+        常驻内存的只有原子索引、当前源原子的输入、当前批次与合并缓存，不构建全部源目的对的输入，也不保留结果；
+        不更新 self.compiled，之后调用 compile() 仍为全量编译
+        '''
+        with self.instrumentation.stage('graph_normalization'):
+            self._split_atoms()
+        for (src, dst), atomic_state_value_map in self._iter_merged(self._iter_pair_inputs()):
+            for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items():
+                yield CompiledRecord(src, dst, atomic_state, atomic_FNs, atomic_qos)
 
+    def _merge_items(self, items, start=True):
+        '''
+        合并一批 (源目的对, 输入)：输入相同的只合并一次，依次查合并缓存、持久化存储，其余串行或在进程池中合并
+        :param start: 是否重建编译期缓存；流式编译的后续批次沿用已有缓存，只登记新出现的 NF
+        :return: 与 items 顺序一致的结果列表，输入相同的源目的对共享结果对象
+        '''
+        keys = [self.merge_cache.key(states_value_map) for _, states_value_map in items]
+        results = {}
+        pending = {}
+        for key, (_, states_value_map) in zip(keys, items):
+            if key in results or key in pending:
+                continue
+            result = self.merge_cache.get(key)
+            if result is None and self.compile_store is not None:
+                result = self.compile_store.lookup(states_value_map)
+                if result is not None:
+                    result = self.merge_cache.put(key, result)
+            if result is None:
+                pending[key] = states_value_map
+            else:
+                results[key] = result
+        if self.instrumentation.enabled:
+            self.instrumentation.count('merge_reused', len(results))
+            self.instrumentation.count('merged', len(pending))
+
+        pending_items = list(pending.items())
+        merged = None
+        if self.workers > 1 and len(pending_items) > self.chunk_size:
+            try:
+                merged = parallel_merge(pending_items, self.workers, self.chunk_size)
+            except POOL_ERRORS:
+                merged = None  # 进程池不可用，回退到串行
+        if merged is None:
+            if start:
+                self._start_compile(pending.values())
+            else:
+                self.nf_dependency.register(NF for states_value_map in pending.values()
+                                            for NFs_Qos_list in states_value_map.values()
+                                            for NFs_Qos in NFs_Qos_list
+                                            for NF in NFs_Qos[0])
+            merged = [self._merge_pair(states_value_map) for states_value_map in pending.values()]
+        for key, result in zip(pending, merged):
+            results[key] = self.merge_cache.put(key, result)
+        return [results[key] for key in keys]
+
+    def _start_compile(self, states_value_maps):
+        # 重建编译期共享的缓存：状态蕴含判断，以及本次参与合并的全部 NF 的依赖索引
+        self.implication_checker = StateImplicationChecker(self.implication_cache_size)
+        self.nf_dependency = NFDependencyIndex(
+            NF for states_value_map in states_value_maps
+            for NFs_Qos_list in states_value_map.values()
+            for NFs_Qos in NFs_Qos_list
+            for NF in NFs_Qos[0])
+
+    def _merge_pair(self, states_value_map, previous=None):
+        '''
+        合并单个源目的对：分解原子状态，并在每个原子状态下合并QoS与NF链
+        :param previous: (旧输入的 MergeResultCache.key, 旧结果)；原子状态在旧结果中，且它蕴含的各状态及其 NFs_Qos
+                         与旧输入相同时，合并输入不变，直接沿用旧结果
+        :return: 原子状态 -> (NFs, Qos)
+        '''
+        inst = self.instrumentation
+        # 约束列表
+        atomic_state_value_map = defaultdict(list)
+        # 对status进行扩充，并将原始状态的 NFs_Qos 复制到其包含的原子状态下
+        with inst.stage('decompose_states'):
+            for atomic_state, NFs_Qos_list in self._atomic_inputs(states_value_map):
+                atomic_state_value_map[atomic_state] = NFs_Qos_list
+        if inst.enabled:
+            inst.count('atomic_states', len(atomic_state_value_map))
+        if previous is not None:
+            old_key, old_result = previous
+            new_key = self.merge_cache.key(states_value_map)
+        # 我需要合并该状态下的所有的NFs_Qos
+        for atomic_state, NFs_Qos_list in atomic_state_value_map.items():
+            if previous is not None and atomic_state in old_result and \
+                    self._implied_inputs(atomic_state, old_key) == self._implied_inputs(atomic_state, new_key):
+                atomic_state_value_map[atomic_state] = old_result[atomic_state]
+                if inst.enabled:
+                    inst.count('atomic_states_reused')
+                continue
+            NF_list, constraints = self._chain_constraints(NFs_Qos_list)
+
+            # 合并QOS
+            atomic_qos = self._merge_qos(NFs_Qos_list)
+
+            # 合并NF链：某个NF的出流会被另一个NF捕获即存在依赖关系
+            with inst.stage('nf_dependency'):
+                constraints |= self.nf_dependency.constraints(NF_list)
+            # 有向图拓扑求解，就绪的功能盒按优先级排序；不存在可行顺序时抛出异常
+            with inst.stage('topological_sort'):
+                atomic_FNs = priority_topological_sort(NF_list, list(constraints))
+            if inst.enabled:
+                inst.count('constraints', len(constraints))
+            atomic_state_value_map[atomic_state] = (atomic_FNs, atomic_qos)
+        return atomic_state_value_map
+
+    def _atomic_inputs(self, states_value_map):
+        states = list(states_value_map.keys())
+        for atomic_state in decompose_states(states):
+            NFs_Qos_list = []
+            for fa_state in states:
+                if self.implication_checker.implies(atomic_state, fa_state):
+                    NFs_Qos_list.extend(states_value_map[fa_state])
+            if NFs_Qos_list:
+                yield atomic_state, NFs_Qos_list
+
+    def _implied_inputs(self, atomic_state, key):
+        # 原子状态蕴含的 (状态, NFs_Qos 序列)，按输入中的先后；两者相同即该原子状态的合并输入相同
+        return [(state, NFs_Qos_key) for state, NFs_Qos_key in key
+                if self.implication_checker.implies(atomic_state, state)]
+
+    @staticmethod
+    def _chain_constraints(NFs_Qos_list):
+        # 收集NF并按内容排序（同优先级的次序），排序结果与策略、状态的先后无关；原有链上的前后关系作为约束
+        NF_list = []
+        seen = set()
+        constraints = set()  # 依赖约束， 包括原来的前后关系
+        for NFs_Qos in NFs_Qos_list:
+            NFs = NFs_Qos[0]
+            for NF in NFs:
+                if NF not in seen:
+                    seen.add(NF)
+                    NF_list.append(NF)
+            for current_NF, next_NF in zip(NFs, NFs[1:]):
+                constraints.add((current_NF, next_NF))
+        NF_list.sort(key=NF_order_key)
+        return NF_list, constraints
+
+    @staticmethod
+    def _merge_qos(NFs_Qos_list):
+        return union_qos(list({NFs_Qos[1] for NFs_Qos in NFs_Qos_list}))
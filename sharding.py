@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 17:20
+@Auth ： xiaolongtuan
+@File ：sharding.py
+"""
+import os
+import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from label_namespace import UnionFind, LabelInterner
+from parallel_union import POOL_ERRORS
+
+'''
+按标签命名空间连通分量分片编译：
+不同连通分量（如不同租户）的叶标签互不相交，原子与源目的对也互不相关，可以独立编译后直接拼接。
+策略的源/目的EPG以及标签映射对会把多个分量连到同一个分片中。
+
+跨机器使用时：协调端 write_shards 写出分片文件，各机器 compile_shard_file 编译并写出结果文件，
+协调端 merge_shard_results 用同一个模型拼接结果。
+协调端统一为叶标签编号，每个分片只带自己用到的叶标签及其全局编号，因此原子位图在全局一致；结果中的 NF 以其在分片策略中的出现顺序编号，
+拼接时换回协调端模型中的 NF 对象
+'''
+
+Shard = namedtuple('Shard', ['label_trees', 'label_mapping_pairs', 'policies'])
+
+
+def plan_shards(model):
+    '''
+    :return: Shard 列表，顺序由策略的添加顺序决定
+    '''
+    uf = UnionFind()
+    uf.union_many(edge for tree in model.label_trees_edges for edge in tree)
+    uf.union_many((pair[0], pair[1]) for pair in model.label_mapping_pairs)
+    uf.union_many((p.src_EPG.label, p.dst_EPG.label) for p in model.policys)
+
+    shard_ids = {}
+    shards = []
+
+    def shard_of(label):
+        root = uf.find(label)
+        if root not in shard_ids:
+            shard_ids[root] = len(shards)
+            shards.append(Shard([], [], []))
+        return shards[shard_ids[root]]
+
+    for p in model.policys:
+        shard_of(p.src_EPG.label).policies.append(p)
+    # 未被任何策略引用的标签树与映射对不参与编译
+    for pair in model.label_mapping_pairs:
+        if uf.find(pair[0]) in shard_ids:
+            shard_of(pair[0]).label_mapping_pairs.append(pair)
+    for tree in model.label_trees_edges:
+        if tree and uf.find(tree[0][0]) in shard_ids:
+            shard_of(tree[0][0]).label_trees.append(tree)
+    return shards
+
+
+def _prepare_interner(model):
+    # 在协调端为所有EPG的叶标签统一编号
+    for EPG in model.EPGs:
+        model.label_interner.to_mask(model.label_closure.closure(EPG))
+
+
+def _shard_label_ids(model, shard):
+    # 分片的策略涉及的EPG的叶标签 -> 全局编号
+    index = model.label_interner.index
+    return {label: index[label]
+            for EPG in {label for p in shard.policies for label in (p.src_EPG.label, p.dst_EPG.label)}
+            for label in model.label_closure.closure(EPG)}
+
+
+def _NF_order(policies):
+    # 分片内 NF 的确定性编号：按策略、状态、链的顺序首次出现的先后
+    NFs = []
+    seen = set()
+    for p in policies:
+        for NFs_Qos in p.state_NFs_map.values():
+            for NF in NFs_Qos[0]:
+                if id(NF) not in seen:
+                    seen.add(id(NF))
+                    NFs.append(NF)
+    return NFs
+
+
+def _shard_spec(model, shard, options):
+    return {
+        'label_trees': shard.label_trees,
+        'label_mapping_pairs': shard.label_mapping_pairs,
+        'policies': shard.policies,
+        'label_ids': _shard_label_ids(model, shard),
+        'options': options,
+    }
+
+
+def compile_shard(spec):
+    '''
+    编译单个分片（可在工作进程或其他机器上执行）
+    :return: 源目的对 -> 原子状态 -> (NF编号列表, Qos)
+    '''
+    from policy_graph_model_janus import JanusPolicyModel
+
+    model = JanusPolicyModel(spec['label_trees'], spec['label_mapping_pairs'],
+                             label_interner=LabelInterner.from_ids(spec['label_ids']), **spec['options'])
+    for p in spec['policies']:
+        model.add_policy(p)
+    NF_ids = {id(NF): NF_id for NF_id, NF in enumerate(_NF_order(spec['policies']))}
+    return {pair: {atomic_state: ([NF_ids[id(NF)] for NF in atomic_FNs], atomic_qos)
+                   for atomic_state, (atomic_FNs, atomic_qos) in atomic_state_value_map.items()}
+            for pair, atomic_state_value_map in model.compile().items()}
+
+
+def _stitch(shards, results):
+    compiled = {}
+    for shard, result in zip(shards, results):
+        NFs = _NF_order(shard.policies)
+        for pair, atomic_state_value_map in result.items():
+            compiled[pair] = {atomic_state: (tuple(NFs[NF_id] for NF_id in atomic_FN_ids), atomic_qos)
+                              for atomic_state, (atomic_FN_ids, atomic_qos) in atomic_state_value_map.items()}
+    return compiled
+
+
+def compile_sharded(model, workers=1, **options):
+    '''
+    本地分片编译：各分片在进程池中并行编译（workers 为 1 或进程池不可用时串行），结果拼接为一个编译结果
+    :param options: 传给每个分片 JanusPolicyModel 的参数，如 implication_cache_size
+    :return: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)，原子以 model.label_interner 的位图表示
+    '''
+    shards = plan_shards(model)
+    _prepare_interner(model)
+    specs = [_shard_spec(model, shard, options) for shard in shards]
+    results = None
+    if workers > 1 and len(specs) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(compile_shard, specs))
+        except POOL_ERRORS:
+            results = None
+    if results is None:
+        results = [compile_shard(spec) for spec in specs]
+    return _stitch(shards, results)
+
+
+def write_shards(model, directory, **options):
+    '''
+    写出分片文件 shard_<i>.pkl
+    :return: 分片文件路径列表
+    '''
+    os.makedirs(directory, exist_ok=True)
+    _prepare_interner(model)
+    paths = []
+    for index, shard in enumerate(plan_shards(model)):
+        path = os.path.join(directory, f'shard_{index}.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump({'index': index, 'spec': _shard_spec(model, shard, options)}, f)
+        paths.append(path)
+    return paths
+
+
+def compile_shard_file(shard_path, result_path):
+    with open(shard_path, 'rb') as f:
+        shard = pickle.load(f)
+    result = compile_shard(shard['spec'])
+    with open(result_path, 'wb') as f:
+        pickle.dump({'index': shard['index'], 'compiled': result}, f)
+    return result_path
+
+
+def merge_shard_results(model, result_paths):
+    '''
+    用写出分片时的同一个模型拼接各分片的结果文件
+    '''
+    shards = plan_shards(model)
+    results = [None] * len(shards)
+    for path in result_paths:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        results[result['index']] = result['compiled']
+    missing = [index for index, result in enumerate(results) if result is None]
+    if missing:
+        raise FileNotFoundError(f'缺少分片结果: {missing}')
+    return _stitch(shards, results)
@@ -4,16 +4,21 @@
 @Auth ： xiaolongtuan
 @File ：state_resolver.py
 """
-from enum import Enum
+from collections import OrderedDict, namedtuple
+from enum import IntEnum
 
 from sympy import symbols, And, Not, simplify
+from sympy.logic.inference import satisfiable
 
+from interval_resolver import decompose_intervals, box_to_expr, to_box_form, box_contains, canonical_box
 from policy_graph_error import InvalidPolicyGraphError
 
 
 def decompose_states(states):
     """
     将多个逻辑状态表达式分解为互不相交的细粒度状态。
+    单变量阈值条件（如 connection >= 3）走区间快速路径，输出全部原子区域；
+    其余表达式回退到 sympy 化简。
 
     参数：
     states (list): 包含逻辑状态表达式的列表。
@@ -21,6 +26,10 @@ def decompose_states(states):
     返回：
     list: 包含互不相交的状态的列表。
     """
+    regions = decompose_intervals(states)
+    if regions is not None:
+        return [box_to_expr(box) for box, _ in regions]
+
     atomic_states = []
 
     # 构建细粒度状态：遍历每个状态，并排除其余状态
@@ -34,7 +43,54 @@ def decompose_states(states):
     return atomic_states
 
 
-class QUALITY_LEVAL(Enum):
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class StateImplicationChecker:
+    '''
+    判断原子状态是否蕴含原始状态：阈值状态按区间包含判断，其余表达式判断 And(a, Not(b)) 的可满足性。
+    结果存入有界 LRU 缓存，键为规范化后的表达式对，一次编译内所有源目的对共享同一个实例
+    '''
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._boxes = {}  # 表达式 -> 区域（或 None），状态数量远小于状态对数量
+
+    def _box(self, expr):
+        if expr not in self._boxes:
+            self._boxes[expr] = to_box_form(expr)
+        return self._boxes[expr]
+
+    def implies(self, state, other):
+        box, other_box = self._box(state), self._box(other)
+        key = (canonical_box(box) if box is not None else state,
+               canonical_box(other_box) if other_box is not None else other)
+        result = self._cache.get(key)
+        if result is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return result
+
+        self.misses += 1
+        if box is not None and other_box is not None:
+            result = box_contains(other_box, box)
+        else:
+            # 可满足性判断把关系式视为命题变量，不可满足时蕴含一定成立
+            counterexample = simplify(And(state, Not(other)))
+            result = counterexample == False or not satisfiable(counterexample)
+        self._cache[key] = result
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return result
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+
+class QUALITY_LEVAL(IntEnum):
     LOW = 1
     MIDIUM = 2
     HIGH = 3
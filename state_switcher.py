@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 23:10
+@Auth ： xiaolongtuan
+@File ：state_switcher.py
+"""
+import asyncio
+import time
+from collections import namedtuple, defaultdict
+
+from condition_compiler import CounterLayout, compile_pair_states
+
+'''
+动态/临时策略的事件驱动状态切换：围绕 JanusPolicyModel 的编译结果，接收计数器更新事件，
+维护每个源目的对生效的原子状态，只重新判断条件引用了变化计数器的源目的对（变量 -> 源目的对 倒排索引），
+生效状态变化时输出 StateChange。
+事件队列与变化队列均有界：消费者跟不上时 run() 阻塞在输出上，事件队列随之填满，submit() 的调用方被反压。
+run() 因 apply() 抛出异常而结束时保存该异常，之后的 submit()/submit_nowait()/stop() 重新抛出，生产者不会在无人消费的队列上永久等待。
+临时策略的时间变量由 run_clock() 按间隔作为计数器写入。
+
+    switcher = StateSwitcher(model.compiled, counters={'connection': 0})
+    task = switcher.start()
+    await switcher.submit({'connection': 5})
+    change = await switcher.changes.get()
+'''
+
+# old_state / new_state 为原子状态，没有成立的原子状态时为 None，此时 NFs 与 qos 也为 None
+StateChange = namedtuple('StateChange', ['pair', 'old_state', 'new_state', 'NFs', 'qos'])
+
+
+class StateSwitcher:
+    '''
+    :param compiled: (src原子, dst原子) -> 原子状态 -> (NFs, Qos)
+    :param counters: 计数器初值，缺省为 0
+    :param classifier: 可选的 flow_classifier.FlowClassifier，生效状态变化时同步其 active_chain
+    :param queue_size: 事件队列容量
+    :param output_size: 变化队列容量
+    :param batch_size: 一次合并处理的最多事件数，同一计数器的多次更新只保留最后一次
+    '''
+
+    def __init__(self, compiled, counters=None, layout=None, classifier=None,
+                 queue_size=1024, output_size=1024, batch_size=256):
+        self.compiled = compiled
+        self.layout = layout if layout is not None else CounterLayout()
+        self.selectors = compile_pair_states(compiled, self.layout)
+        self.values = self.layout.vector(counters)
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.events = asyncio.Queue(maxsize=queue_size)
+        self.changes = asyncio.Queue(maxsize=output_size)
+        self.processed = 0  # 已处理的事件数
+        self.emitted = 0  # 已放入变化队列的变化数
+        self.evaluated = 0  # 重新判断的源目的对次数
+
+        self.pairs_of_variable = defaultdict(list)  # 计数器下标 -> 条件引用它的源目的对
+        self.active = {}  # 源目的对 -> 生效的原子状态
+        for pair, selector in self.selectors.items():
+            for name in selector.variables:
+                self.pairs_of_variable[self.layout.index[name]].append(pair)
+            self._activate(pair, selector.state_of(self.values))
+        self._task = None
+        self._error = None  # run() 中 apply() 抛出的异常
+
+    def _activate(self, pair, state):
+        self.active[pair] = state
+        if self.classifier is not None:
+            pair_id = self.classifier.pair_ids.get(pair)
+            if pair_id is not None:
+                self.classifier.set_active_state(pair_id, state)
+
+    def state_of(self, pair):
+        return self.active.get(pair)
+
+    def chain_of(self, pair):
+        '''
+        :return: 源目的对当前生效的 (NFs, Qos)，没有成立的原子状态时为 None
+        '''
+        state = self.active.get(pair)
+        return None if state is None else self.compiled[pair][state]
+
+    def apply(self, updates):
+        '''
+        同步写入计数器并重新判断受影响的源目的对
+        :param updates: 计数器名 -> 取值；没有条件引用的计数器被忽略
+        :return: StateChange 列表
+        '''
+        dirty = set()
+        for name, value in updates.items():
+            slot = self.layout.index.get(name)
+            if slot is None or self.values[slot] == value:
+                continue
+            self.values[slot] = value
+            dirty.update(self.pairs_of_variable[slot])
+
+        changes = []
+        for pair in dirty:
+            state = self.selectors[pair].state_of(self.values)
+            old_state = self.active[pair]
+            if state is old_state or state == old_state:
+                continue
+            self._activate(pair, state)
+            NFs, qos = self.compiled[pair][state] if state is not None else (None, None)
+            changes.append(StateChange(pair, old_state, state, NFs, qos))
+        self.evaluated += len(dirty)
+        return changes
+
+    def _check_running(self):
+        # 任务已结束时不再接收事件：有保存的异常则重新抛出
+        if self._error is not None:
+            raise self._error
+        if self._task is not None and self._task.done():
+            raise RuntimeError('状态切换任务已结束')
+
+    async def submit(self, updates):
+        # 事件队列已满时等待，向生产者传递反压；等待期间任务结束则不再等待
+        self._check_running()
+        if self._task is None or not self.events.full():
+            await self.events.put(dict(updates))
+            return
+        put = asyncio.ensure_future(self.events.put(dict(updates)))
+        await asyncio.wait({put, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self._check_running()
+
+    def submit_nowait(self, updates):
+        # 事件队列已满时抛出 asyncio.QueueFull
+        self._check_running()
+        self.events.put_nowait(dict(updates))
+
+    def _drain(self, first):
+        # 合并已在队列中的事件，减少重复判断
+        merged = dict(first)
+        count = 1
+        while count < self.batch_size and not self.events.empty():
+            merged.update(self.events.get_nowait())
+            count += 1
+        return merged, count
+
+    async def run(self):
+        while True:
+            updates, count = self._drain(await self.events.get())
+            try:
+                try:
+                    changes = self.apply(updates)
+                except Exception as e:
+                    # 保存异常并结束任务，由 submit()/stop() 重新抛出
+                    self._error = e
+                    return
+                for change in changes:
+                    await self.changes.put(change)
+                    self.emitted += 1
+            finally:
+                self.processed += count
+                for _ in range(count):
+                    self.events.task_done()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout=None, stall_interval=1.0):
+        '''
+        处理完已提交的事件后停止。以下情况不再等待，直接取消任务，未处理的事件被丢弃：
+        任务已结束；超过 timeout 秒；变化队列已满且 stall_interval 秒内没有变化被取出（输出端无人读取）。
+        run() 中保存的异常在停止后重新抛出
+        '''
+        task = self._task
+        if task is not None:
+            loop = asyncio.get_running_loop()
+            deadline = None if timeout is None else loop.time() + timeout
+            join = asyncio.ensure_future(self.events.join())
+            try:
+                while not join.done() and not task.done():
+                    wait = stall_interval if deadline is None else min(stall_interval, deadline - loop.time())
+                    if wait <= 0:
+                        break
+                    emitted = self.emitted
+                    await asyncio.wait({join, task}, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                    if not join.done() and self.changes.full() and self.emitted == emitted:
+                        break
+            finally:
+                join.cancel()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    async def run_clock(self, variable='time', interval=1.0, clock=time.time):
+        '''
+        临时策略：每隔 interval 秒把 clock() 作为计数器 variable 提交，没有条件引用该变量时直接返回
+        '''
+        if variable not in self.layout.index:
+            return
+        while True:
+            await self.submit({variable: clock()})
+            await asyncio.sleep(interval)
+
+    async def iter_changes(self):
+        while True:
+            change = await self.changes.get()
+            self.changes.task_done()
+            yield change
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 09:00
+@Auth ： xiaolongtuan
+@File ：conftest.py
+"""
+import os
+import sys
+
+# 模块均位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 12:10
+@Auth ： xiaolongtuan
+@File ：test_atom_index.py
+"""
+import random
+
+import pytest
+
+from colections_cul import AtomIndex, iter_bits, mask_from_indices
+
+
+def random_masks(rng, count, width=24):
+    return {f'EPG{index}': mask_from_indices(rng.sample(range(width), rng.randint(1, 8))) for index in range(count)}
+
+
+def snapshot(index):
+    return {atom: frozenset(keys) for atom, keys in index.members.items()}
+
+
+def check_index(index, keyed_masks):
+    for key, mask in keyed_masks.items():
+        atoms = index.atoms_of(key)
+        union = 0
+        for atom in atoms:
+            assert atom & union == 0
+            union |= atom
+        assert union == mask
+    for atom in index.members:
+        for leaf in iter_bits(atom):
+            assert index.atom_of_leaf(leaf) == atom
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_index_covers_each_set_with_disjoint_atoms(seed):
+    keyed_masks = random_masks(random.Random(seed), 6)
+    index = AtomIndex(keyed_masks)
+    check_index(index, keyed_masks)
+    for atom, keys in index.members.items():
+        assert set(keys) == {key for key, mask in keyed_masks.items() if atom & mask}
+
+
+def test_components_are_split_separately():
+    keyed_masks = {'a': 0b0011, 'b': 0b0110, 'c': 0b110000, 'd': 0b100000}
+    components = {'a': 0, 'b': 0, 'c': 1, 'd': 1}
+    assert snapshot(AtomIndex(keyed_masks, components)) == snapshot(AtomIndex(keyed_masks))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_incremental_edits_match_rebuild(seed):
+    rng = random.Random(seed)
+    pool = random_masks(rng, 10)
+    live = dict(list(pool.items())[:4])
+    index = AtomIndex(live)
+    for _ in range(12):
+        absent = [key for key in pool if key not in live]
+        if live and (not absent or rng.random() < 0.4):
+            key = rng.choice(list(live))
+            del live[key]
+            index.remove_set(key)
+        else:
+            key = rng.choice(absent)
+            live[key] = pool[key]
+            index.add_set(key, pool[key])
+        assert snapshot(index) == snapshot(AtomIndex(live))
+        check_index(index, live)
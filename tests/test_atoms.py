@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 11:40
+@Auth ： xiaolongtuan
+@File ：test_atoms.py
+"""
+import random
+from itertools import combinations
+
+import pytest
+
+from colections_cul import compute_atoms, split_into_disjoint_sets
+
+
+def combinations_sweep(sets):
+    # 原先的实现：枚举全部集合组合求交，按组合从大到小去重
+    disjoint_sets = []
+    used_elements = set()
+    for i in reversed(range(1, len(sets) + 1)):
+        for combo in combinations(sets, i):
+            intersect = set.intersection(*combo) - used_elements
+            if intersect:
+                disjoint_sets.append(intersect)
+                used_elements.update(intersect)
+    return disjoint_sets
+
+
+def random_sets(rng):
+    return [set(rng.sample(range(20), rng.randint(1, 8))) for _ in range(rng.randint(1, 7))]
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_atoms_match_combinations_sweep(seed):
+    sets = random_sets(random.Random(seed))
+    assert split_into_disjoint_sets(sets) == combinations_sweep(sets)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_atoms_partition_by_membership(seed):
+    sets = random_sets(random.Random(seed))
+    atoms, memberships = compute_atoms(sets)
+    assert set().union(*atoms) == set().union(*sets)
+    assert sum(len(atom) for atom in atoms) == len(set().union(*atoms))
+    assert len(set(memberships)) == len(memberships)
+    for atom, membership in zip(atoms, memberships):
+        for element in atom:
+            assert tuple(index for index, s in enumerate(sets) if element in s) == membership
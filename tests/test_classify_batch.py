@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 14:50
+@Auth ： xiaolongtuan
+@File ：test_classify_batch.py
+"""
+import ipaddress
+import random
+
+import numpy as np
+import pytest
+from sympy import symbols, true
+
+from flow_classifier import FlowClassifier
+from policy_graph_model_janus import (JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock,
+                                      ActionType, Flow)
+
+connection = symbols('connection')
+TREES = [[('dc', 'web'), ('dc', 'db'), ('web', 'web1'), ('web', 'web2'), ('db', 'db1'), ('db', 'db2')]]
+FORWARD = {'aciton_type': ActionType.forward}
+NFS = [NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': port}, FORWARD, priority=port) for port in range(1, 4)]
+QOS = ('min', 'b/w', 1)
+STATES = [connection >= 3, connection < 3, true]
+
+
+def build_classifier(rng, leaf_prefixes):
+    model = JanusPolicyModel(TREES, [])
+    labels = ['dc', 'web', 'db', 'web1', 'web2', 'db1', 'db2']
+    for _ in range(6):
+        state_NFs_map = {state: (sorted(rng.sample(NFS, rng.randint(1, 2)), key=NFS.index), QOS)
+                         for state in rng.sample(STATES, rng.randint(1, 2))}
+        model.add_policy(Policy(state_NFs_map, GroupNode(rng.choice(labels)), GroupNode(rng.choice(labels))))
+    return FlowClassifier.from_model(model, leaf_prefixes)
+
+
+def expected(classifier, src_ip, dst_ip):
+    result = classifier.classify(Flow(src_ip, dst_ip, 'tcp', 80))
+    if result is None:
+        return -1, -1
+    return result.pair_id, int(classifier.active_chain[result.pair_id])
+
+
+def check_batch(classifier, addresses, rng, to_int):
+    src = [rng.choice(addresses) for _ in range(300)]
+    dst = [rng.choice(addresses) for _ in range(300)]
+    pair_ids, chain_ids = classifier.classify_batch([to_int(a) for a in src], [to_int(a) for a in dst])
+    assert [(int(p), int(c)) for p, c in zip(pair_ids, chain_ids)] == \
+        [expected(classifier, s, d) for s, d in zip(src, dst)]
+    return pair_ids, chain_ids
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_batch_matches_single_classification(seed):
+    rng = random.Random(seed)
+    prefixes = {'web1': '10.0.1.0/24', 'web2': ['10.0.2.0/24', '10.0.3.0/25'], 'db1': '10.1.0.0/16',
+                'db2': '10.1.5.0/24'}  # db2 嵌套在 db1 的前缀中
+    classifier = build_classifier(rng, prefixes)
+    addresses = ['10.0.1.5', '10.0.2.9', '10.0.3.200', '10.0.3.5', '10.1.7.7', '10.1.5.1', '9.9.9.9', '10.1.255.255']
+    to_int = lambda address: int(ipaddress.ip_address(address))
+    pair_ids, _ = check_batch(classifier, addresses, rng, to_int)
+
+    # 为每个源目的对指定生效状态后，链编号随之变化
+    for pair_id, states in enumerate(classifier.pair_states):
+        classifier.set_active_state(pair_id, rng.choice(list(states)))
+    _, chain_ids = check_batch(classifier, addresses, rng, to_int)
+    assert (chain_ids[chain_ids >= 0] < len(classifier.chains)).all()
+
+
+def test_batch_with_ipv6_prefixes():
+    rng = random.Random(1)
+    classifier = build_classifier(rng, {'web1': '2001:db8:1::/48', 'web2': '2001:db8:2::/48',
+                                        'db1': '2001:db8::/32', 'db2': '2001:db8:ff::/48'})
+    addresses = ['2001:db8:1::1', '2001:db8:2::5', '2001:db8:7::1', '2001:db8:ff::9', '2001:db9::1']
+    check_batch(classifier, addresses, rng, lambda address: int(ipaddress.ip_address(address)))
+
+
+def test_empty_tables_miss_everything():
+    classifier = FlowClassifier(build_classifier(random.Random(0), {}).label_interner, {}, {})
+    pair_ids, chain_ids = classifier.classify_batch(np.array([1, 2]), np.array([3, 4]))
+    assert list(pair_ids) == [-1, -1] and list(chain_ids) == [-1, -1]
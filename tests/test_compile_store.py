@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 13:35
+@Auth ： xiaolongtuan
+@File ：test_compile_store.py
+"""
+import os
+
+from sympy import symbols, true
+
+from compile_store import CompileStore, LazyCompiled, compile_with_store, pair_digest
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4)]]
+FORWARD = {'aciton_type': ActionType.forward}
+FIREWALL = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, FORWARD, priority=2)
+IDS = NFBNode(NetworkFunctionBlock.IDS, {'dst_port': 443}, FORWARD, priority=1)
+QOS = ('min', 'b/w', 1)
+
+
+def build(extra=()):
+    model = JanusPolicyModel(TREES, [])
+    model.add_policy(Policy({connection >= 3: ([FIREWALL, IDS], QOS), connection < 3: ([IDS], QOS)},
+                            GroupNode(3), GroupNode(4)))
+    model.add_policy(Policy({true: ([FIREWALL], QOS)}, GroupNode(2), GroupNode(1)))
+    for p in extra:
+        model.add_policy(p)
+    return model
+
+
+def plain(compiled):
+    return {pair: {state: (tuple(NFs), qos) for state, (NFs, qos) in value.items()}
+            for pair, value in compiled.items()}
+
+
+def count_merges(model):
+    calls = []
+    merge_pair = model._merge_pair
+    model._merge_pair = lambda states_value_map: calls.append(1) or merge_pair(states_value_map)
+    return calls
+
+
+def test_unchanged_input_is_served_lazily(tmp_path):
+    path = os.path.join(tmp_path, 'compiled.store')
+    expected = plain(compile_with_store(build(), path))
+    model = build()
+    compiled = compile_with_store(model, path)
+    assert isinstance(compiled, LazyCompiled)
+    assert model.compiled is None
+    assert plain(compiled) == expected
+
+
+def test_changed_input_merges_only_new_pairs(tmp_path):
+    path = os.path.join(tmp_path, 'compiled.store')
+    compile_with_store(build(), path)
+    extra = [Policy({true: ([IDS], QOS)}, GroupNode(4), GroupNode(2))]
+    model = build(extra)
+    calls = count_merges(model)
+    compiled = compile_with_store(model, path)
+    assert len(calls) == 1  # 只有新增的源目的对需要合并
+    reference = build(extra)
+    assert plain(compiled) == plain(reference.compile())
+    assert len(CompileStore.open(path)) == 3
+
+
+def test_unreadable_store_is_ignored(tmp_path):
+    path = os.path.join(tmp_path, 'compiled.store')
+    with open(path, 'wb') as f:
+        f.write(b'not a store')
+    assert CompileStore.open(path) is None
+    assert plain(compile_with_store(build(), path)) == plain(build().compile())
+    assert CompileStore.open(path) is not None
+
+
+def test_pair_digest_ignores_match_key_order():
+    a = NFBNode(NetworkFunctionBlock.DPI, {'dst_port': 80, 'proto': 'tcp'}, FORWARD)
+    digest = pair_digest({true: [([a], QOS)]})
+    assert digest == pair_digest({true: [([NFBNode(NetworkFunctionBlock.DPI, {'proto': 'tcp', 'dst_port': 80},
+                                                   FORWARD)], QOS)]})
+    assert digest != pair_digest({true: [([a, IDS], QOS)]})
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 13:50
+@Auth ： xiaolongtuan
+@File ：test_compiled_diff.py
+"""
+import random
+
+import pytest
+from sympy import symbols, true
+
+from compiled_diff import (diff_compiled, compile_delta, diff_sorted_records, record_key, ADDED, REMOVED,
+                           MODIFIED)
+from compiled_export import CompiledRecord
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+STATES = [connection >= 3, connection < 3, true]
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4), (2, 5)]]
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def random_policy(rng, NFs):
+    state_NFs_map = {state: (sorted(rng.sample(NFs, rng.randint(1, 3)), key=NFs.index), rng.choice(QOS))
+                     for state in rng.sample(STATES, rng.randint(1, 2))}
+    return Policy(state_NFs_map, GroupNode(rng.randrange(6)), GroupNode(rng.randrange(6)))
+
+
+def make_NFs(rng):
+    return [NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': index}, {'aciton_type': ActionType.forward},
+                    priority=rng.randint(1, 3)) for index in range(5)]
+
+
+def entries(compiled):
+    return {(src, dst, state): (tuple(NFs), qos)
+            for (src, dst), value in compiled.items() for state, (NFs, qos) in value.items()}
+
+
+def apply_delta(current, delta):
+    for entry in delta:
+        key = (entry.src, entry.dst, entry.state)
+        if entry.kind == REMOVED:
+            assert key in current
+            del current[key]
+        else:
+            assert (key in current) == (entry.kind == MODIFIED)
+            current[key] = (tuple(entry.new[0]), entry.new[1])
+    return current
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_applying_deltas_reproduces_each_compile(seed):
+    rng = random.Random(seed)
+    NFs = make_NFs(rng)
+    model = JanusPolicyModel(TREES, [])
+    live = [random_policy(rng, NFs) for _ in range(3)]
+    for p in live:
+        model.add_policy(p)
+    current = apply_delta({}, compile_delta(model))
+    assert current == entries(model.compiled)
+    for _ in range(6):
+        if live and rng.random() < 0.4:
+            model.remove_policy(live.pop(rng.randrange(len(live))))
+        else:
+            live.append(random_policy(rng, NFs))
+            model.add_policy(live[-1])
+        old = dict(model.compiled)
+        current = apply_delta(current, compile_delta(model))
+        assert current == entries(model.compiled)
+        assert apply_delta(entries(old), diff_compiled(old, model.compiled)) == current
+
+
+def records(compiled):
+    return sorted((CompiledRecord(src, dst, state, NFs, qos)
+                   for (src, dst), value in compiled.items() for state, (NFs, qos) in value.items()), key=record_key)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sorted_record_diff_matches_map_diff(seed):
+    rng = random.Random(seed)
+    NFs = make_NFs(rng)
+    policies = [random_policy(rng, NFs) for _ in range(5)]
+    model = JanusPolicyModel(TREES, [])
+    for p in policies:
+        model.add_policy(p)
+    old = dict(model.compile())
+    model.remove_policy(policies[0])
+    model.add_policy(random_policy(rng, NFs))
+    new = model.compile()
+
+    def normalized(delta):
+        return sorted((entry.kind, entry.src, entry.dst, str(entry.state),
+                       entry.old and tuple(entry.old[0]), entry.new and tuple(entry.new[0])) for entry in delta)
+    assert normalized(diff_sorted_records(records(old), records(new))) == normalized(diff_compiled(old, new))
+
+
+def test_diff_kinds():
+    NF = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 1}, {'aciton_type': ActionType.forward})
+    old = {(1, 2): {true: ((NF,), QOS[0])}, (1, 4): {true: ((NF,), QOS[0])}}
+    new = {(1, 2): {true: ((NF,), QOS[1])}, (2, 4): {true: ((), QOS[0])}}
+    kinds = {(entry.src, entry.dst): entry.kind for entry in diff_compiled(old, new)}
+    assert kinds == {(1, 2): MODIFIED, (1, 4): REMOVED, (2, 4): ADDED}
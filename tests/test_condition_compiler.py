@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 15:05
+@Auth ： xiaolongtuan
+@File ：test_condition_compiler.py
+"""
+import random
+
+import numpy as np
+import pytest
+from sympy import symbols, Or, true
+
+from condition_compiler import (parse_condition, compile_condition, condition_variables, CounterLayout,
+                                PredicateTable, compile_pair_states)
+from policy_graph_error import InvalidPolicyGraphError
+from state_resolver import decompose_states
+
+connection, rate = symbols('connection rate')
+CONDITIONS = [
+    'connection > 2',
+    'connection >= 3 and rate < 5',
+    'not (connection == 4) or rate >= 7',
+    '1 < connection <= 6',
+    'connection + 2 * rate > 9',
+    'connection ** 2 - rate != 0',
+    '-connection < -3',
+    '(connection > 1) & (rate < 2) | (rate > 8)',
+    'True',
+    '',
+]
+
+
+def points(rng, count=200):
+    return [{'connection': rng.choice([rng.randint(-2, 10), rng.uniform(-2, 10)]),
+             'rate': rng.choice([rng.randint(-2, 10), rng.uniform(-2, 10)])} for _ in range(count)]
+
+
+def sympy_value(expr, point):
+    return bool(expr.subs({connection: point['connection'], rate: point['rate']}))
+
+
+@pytest.mark.parametrize('text', CONDITIONS)
+def test_compiled_condition_matches_sympy(text):
+    layout = CounterLayout()
+    predicate = compile_condition(text, layout)
+    expr = parse_condition(text) if text else true
+    for point in points(random.Random(text)):
+        assert predicate(layout.vector(point)) == sympy_value(expr, point)
+
+
+@pytest.mark.parametrize('text', ['__import__("os").system("true")', 'connection.real > 1', 'f(connection) > 1',
+                                  'connection >', '"a" < connection', 'connection in [1, 2]',
+                                  'connection > 1 & rate < 2', 'connection | 1 > 0', 'connection & rate', '~connection > 1'])
+def test_unsupported_syntax_is_rejected(text):
+    with pytest.raises(InvalidPolicyGraphError):
+        compile_condition(text, CounterLayout())
+
+
+def test_layout_assigns_slots_in_order():
+    layout = CounterLayout(['rate'])
+    compile_condition('connection > rate', layout)
+    assert layout.names == ['rate', 'connection']
+    assert layout.vector({'connection': 3}) == [0, 3]
+    assert condition_variables('connection > rate and connection < 9') == {'connection', 'rate'}
+
+
+@pytest.mark.parametrize('states', [
+    [connection >= 3, connection < 3, connection > 8],
+    [connection >= 3, rate < 5, connection > 8, rate >= 2],
+    [Or(connection > 3, rate > 3), connection <= 5],  # 不可化为区域，走闭包回退
+])
+def test_predicate_table_selects_the_holding_atomic_state(states):
+    atomic_states = decompose_states(states)
+    layout = CounterLayout()
+    table = PredicateTable(atomic_states, layout)
+    samples = points(random.Random(len(states)))
+    matrix = np.array([layout.vector(point) for point in samples], dtype=float)
+    selected = table.select_many(matrix)
+    for point, row, index in zip(samples, matrix, selected):
+        holding = [i for i, state in enumerate(atomic_states) if sympy_value(state, point)]
+        assert len(holding) <= 1
+        assert table.select(list(row)) == index == (holding[0] if holding else -1)
+        assert table.state_of(list(row)) == (atomic_states[index] if index >= 0 else None)
+
+
+def test_pairs_with_the_same_states_share_a_table():
+    value = ((), ('min', 'b/w', 'HIGH'))
+    compiled = {(1, 2): {connection >= 3: value, connection < 3: value},
+                (2, 1): {connection >= 3: value, connection < 3: value},
+                (1, 1): {true: value}}
+    selectors = compile_pair_states(compiled)
+    assert selectors[(1, 2)] is selectors[(2, 1)]
+    assert selectors[(1, 1)].state_of([0]) == true
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 12:20
+@Auth ： xiaolongtuan
+@File ：test_decompose_states.py
+"""
+import random
+
+import pytest
+from sympy import symbols, Rational, And, Or, Not, Eq, Ne
+
+from interval_resolver import decompose_intervals, box_to_expr
+from state_resolver import decompose_states
+
+x, y = symbols('x y')
+
+
+def random_state(rng):
+    var = rng.choice([x, y])
+    value = rng.randint(0, 6)
+    relation = rng.choice([var > value, var >= value, var < value, var <= value, Eq(var, value), Ne(var, value)])
+    if rng.random() < 0.3:
+        relation = rng.choice([And, Or])(relation, var > rng.randint(0, 6))
+    if rng.random() < 0.1:
+        relation = Not(relation)
+    return relation
+
+
+def sample_points():
+    values = [Rational(value, 2) for value in range(-2, 15)]
+    return [{x: a, y: b} for a in values for b in values]
+
+
+def holds(expr, point):
+    return bool(expr.subs(point))
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_atomic_regions_partition_the_covered_space(seed):
+    rng = random.Random(seed)
+    states = [random_state(rng) for _ in range(rng.randint(1, 4))]
+    regions = decompose_intervals(states)
+    assert regions is not None
+    atomic_states = decompose_states(states)
+    assert len(atomic_states) == len(regions)
+    for point in sample_points():
+        true_states = frozenset(index for index, state in enumerate(states) if holds(state, point))
+        hits = [signature for (box, signature), atomic_state in zip(regions, atomic_states)
+                if holds(atomic_state, point)]
+        if true_states:
+            assert hits == [true_states]
+        else:
+            assert hits == []
+
+
+def test_multi_variable_states_fall_back_to_exclusive_states():
+    states = [And(x > 2, y < 3), x > 4, y >= 1]
+    assert decompose_intervals(states) is None
+    atomic_states = decompose_states(states)
+    for point in sample_points():
+        assert sum(holds(atomic_state, point) for atomic_state in atomic_states) <= 1
+
+
+def test_threshold_states_split_at_breakpoints():
+    connection = symbols('connection')
+    regions = decompose_intervals([connection >= 3, connection < 3, connection > 8])
+    assert sorted(sorted(signature) for _, signature in regions) == [[0], [0, 2], [1]]
+    assert {box_to_expr(box) for box, _ in regions} == set(
+        decompose_states([connection >= 3, connection < 3, connection > 8]))
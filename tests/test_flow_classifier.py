@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 14:35
+@Auth ： xiaolongtuan
+@File ：test_flow_classifier.py
+"""
+import ipaddress
+import random
+
+import pytest
+from sympy import symbols, true
+
+from flow_classifier import PrefixTable, FlowClassifier
+from policy_graph_error import InvalidPolicyGraphError
+from policy_graph_model_janus import (JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock,
+                                      ActionType, Flow)
+
+connection = symbols('connection')
+TREES = [[('dc', 'web'), ('dc', 'db'), ('web', 'web1'), ('web', 'web2')]]
+LEAF_PREFIXES = {'web1': '10.0.1.0/24', 'web2': ['10.0.2.0/24', '10.0.3.0/25'], 'db': '10.1.0.0/16'}
+FORWARD = {'aciton_type': ActionType.forward}
+FIREWALL = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, FORWARD, priority=2)
+IDS = NFBNode(NetworkFunctionBlock.IDS, {'dst_port': 443}, FORWARD, priority=1)
+QOS = ('min', 'b/w', 1)
+
+
+def random_prefixes(rng):
+    prefixes = {}
+    for index in range(30):
+        length = rng.randint(8, 28)
+        network = ipaddress.ip_network(f'10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(256)}/{length}',
+                                       strict=False)
+        prefixes.setdefault(network, f'label{index}')
+    return prefixes
+
+
+def longest_match(prefixes, address):
+    address = ipaddress.ip_address(address)
+    matches = [network for network in prefixes if address in network]
+    return prefixes[max(matches, key=lambda network: network.prefixlen)] if matches else None
+
+
+def random_address(rng):
+    return str(ipaddress.ip_address(int(ipaddress.ip_address('10.0.0.0')) + rng.randrange(4 << 16)))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_prefix_table_matches_brute_force_longest_match(seed):
+    rng = random.Random(seed)
+    prefixes = random_prefixes(rng)
+    table = PrefixTable()
+    for network, label in prefixes.items():
+        table.insert(network, label)
+    removed = rng.choice(list(prefixes))
+    table.remove(removed)
+    del prefixes[removed]
+    addresses = [random_address(rng) for _ in range(200)]
+    addresses += [str(network.network_address) for network in prefixes]
+    addresses += [str(network.broadcast_address) for network in prefixes]
+    for address in addresses:
+        expected = longest_match(prefixes, address)
+        assert table.lookup(address) == expected
+        assert table.lookup_range(address) == expected
+
+
+def test_prefix_table_rejects_conflicts():
+    table = PrefixTable()
+    table.insert('10.0.0.0/8', 'a')
+    with pytest.raises(InvalidPolicyGraphError):
+        table.insert('10.0.0.0/8', 'b')
+    with pytest.raises(InvalidPolicyGraphError):
+        table.insert('2001:db8::/32', 'c')
+    with pytest.raises(KeyError):
+        table.remove('11.0.0.0/8')
+
+
+def build_model():
+    model = JanusPolicyModel(TREES, [])
+    model.add_policy(Policy({connection >= 3: ([FIREWALL, IDS], QOS), connection < 3: ([IDS], QOS)},
+                            GroupNode('web'), GroupNode('db')))
+    model.add_policy(Policy({true: ([FIREWALL], QOS)}, GroupNode('web1'), GroupNode('web2')))
+    return model
+
+
+def expected_states(model, src_ip, dst_ip):
+    # 参照实现：由地址找叶标签，再找包含该叶的原子
+    def atom(address):
+        label = longest_match({ipaddress.ip_network(prefix): leaf for leaf, prefixes in LEAF_PREFIXES.items()
+                               for prefix in ([prefixes] if isinstance(prefixes, str) else prefixes)}, address)
+        return next((atom for pair in model.compiled for atom in pair
+                     if label in model.label_interner.from_mask(atom)), None)
+    return model.compiled.get((atom(src_ip), atom(dst_ip)))
+
+
+def test_classify_matches_compiled_lookup():
+    model = build_model()
+    classifier = FlowClassifier.from_model(model, LEAF_PREFIXES)
+    rng = random.Random(0)
+    addresses = ['10.0.1.5', '10.0.2.9', '10.0.3.200', '10.0.3.5', '10.1.7.7', '192.168.0.1']
+    hits = 0
+    for _ in range(100):
+        src_ip, dst_ip = rng.choice(addresses), rng.choice(addresses)
+        result = classifier.classify(Flow(src_ip, dst_ip, 'tcp', 80))
+        expected = expected_states(model, src_ip, dst_ip)
+        assert (result is None) == (expected is None)
+        if result is not None:
+            hits += 1
+            assert result.states is expected
+            assert classifier.pairs[result.pair_id] == (result.src, result.dst)
+    assert hits
+    state = next(iter(expected_states(model, '10.0.1.5', '10.1.0.1')))
+    assert classifier.chain(Flow('10.0.1.5', '10.1.0.1', 'tcp', 80), state) == \
+        expected_states(model, '10.0.1.5', '10.1.0.1')[state]
+
+
+def test_rebuild_keeps_active_states():
+    model = build_model()
+    classifier = FlowClassifier.from_model(model, LEAF_PREFIXES)
+    result = classifier.classify(Flow('10.0.1.5', '10.1.0.1', 'tcp', 80))
+    state = next(iter(result.states))
+    classifier.set_active_state(result.pair_id, state)
+    model.add_policy(Policy({true: ([IDS], QOS)}, GroupNode('db'), GroupNode('web2')))
+    classifier.rebuild(model.compile())
+    pair_id = classifier.pair_ids[(result.src, result.dst)]
+    assert classifier.active_states[pair_id] == state
+    assert classifier.classify(Flow('10.1.0.1', '10.0.2.1', 'tcp', 80)) is not None
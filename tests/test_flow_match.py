@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 12:50
+@Auth ： xiaolongtuan
+@File ：test_flow_match.py
+"""
+import ipaddress
+import random
+
+import pytest
+
+from flow_match import parse_field, match_overlap, IntervalIndex, MatchIndex
+
+
+def test_parse_field_forms():
+    assert parse_field('*') is None and parse_field(None) is None
+    network = ipaddress.ip_network('10.1.0.0/16')
+    assert parse_field('10.1.0.0/16') == ('ip4', int(network.network_address), int(network.broadcast_address))
+    assert parse_field('10.1.2.3') == ('ip4', int(ipaddress.ip_address('10.1.2.3')),
+                                     int(ipaddress.ip_address('10.1.2.3')))
+    assert parse_field('::/0') == ('ip6', 0, 2 ** 128 - 1)
+    assert parse_field('1000-2000') == ('int', 1000, 2000)
+    assert parse_field((5, 9)) == ('int', 5, 9)
+    assert parse_field(80) == ('int', 80, 80)
+    assert parse_field('80') == ('int', 80, 80)
+    assert parse_field('tcp') == ('exact', 'tcp')
+
+
+def test_match_overlap_semantics():
+    assert match_overlap({'src_ip': '10.1.2.3'}, {'src_ip': '10.0.0.0/8'})
+    assert not match_overlap({'src_ip': '10.1.2.3'}, {'src_ip': '192.168.0.0/16'})
+    assert match_overlap({'dst_port': 80}, {'dst_port': '1-1024', 'proto': 'tcp'})  # 流未约束 proto
+    assert not match_overlap({'dst_port': (1025, 2000)}, {'dst_port': '1-1024'})
+    assert not match_overlap({'proto': 'udp'}, {'proto': 'tcp'})
+    assert match_overlap({'dst_port': 80}, {})
+
+
+def test_address_families_and_numbers_do_not_share_a_space():
+    assert not match_overlap({'dst_ip': '10.1.0.0/16'}, {'dst_ip': '::/0'})
+    assert not match_overlap({'dst_ip': '::ffff:0:0/96'}, {'dst_ip': '0.0.0.0/0'})
+    assert not match_overlap({'dst_ip': '0.0.0.1'}, {'dst_ip': 1})  # 地址与数值不可比较
+    assert match_overlap({'dst_port': '80'}, {'dst_port': 80})
+    assert match_overlap({'dst_port': '80'}, {'dst_port': '1-1024'})
+    index = MatchIndex()
+    index.add({'dst_ip': '::/0'}, 'v6')
+    index.add({'dst_ip': '10.0.0.0/8'}, 'v4')
+    index.add({'dst_port': '80'}, 'http')
+    assert set(index.query({'dst_ip': '10.1.0.0/16'})) == {'v4', 'http'}
+    assert set(index.query({'dst_ip': '2001:db8::1'})) == {'v6', 'http'}
+    assert set(index.query({'dst_port': 80})) == {'v6', 'v4', 'http'}
+    assert set(index.query({'dst_port': 443})) == {'v6', 'v4'}
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_interval_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    index = IntervalIndex()
+    intervals = []
+    for item in range(60):
+        lo = rng.randint(0, 100)
+        hi = lo + rng.randint(0, 20)
+        intervals.append((lo, hi))
+        index.add(lo, hi, item)
+        if item % 15 == 0:
+            lo = rng.randint(0, 110)
+            hi = lo + rng.randint(0, 10)
+            assert sorted(index.query(lo, hi)) == [i for i, (a, b) in enumerate(intervals) if a <= hi and lo <= b]
+
+
+def random_match(rng):
+    match = {}
+    if rng.random() < 0.7:
+        match['dst_port'] = rng.choice([rng.randint(1, 50), (rng.randint(1, 25), rng.randint(25, 50)), '10-30', '*'])
+    if rng.random() < 0.5:
+        match['src_ip'] = rng.choice(['10.0.0.0/8', '10.1.0.0/16', '10.1.2.3', '192.168.0.0/24', '::/0', '::a01:0/112'])
+    if rng.random() < 0.4:
+        match['proto'] = rng.choice(['tcp', 'udp'])
+    return match
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_match_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    index = MatchIndex()
+    entries = []
+    for item in range(40):
+        match = random_match(rng)
+        entries.append(match)
+        index.add(match, item)
+        flow = random_match(rng)
+        assert sorted(index.query(flow)) == [i for i, m in enumerate(entries) if match_overlap(flow, m)]
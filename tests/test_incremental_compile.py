@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 09:30
+@Auth ： xiaolongtuan
+@File ：test_incremental_compile.py
+"""
+import pickle
+import random
+
+import pytest
+from sympy import symbols, true
+
+from compile_store import write_store
+from instrumentation import Instrumentation
+from policy_graph_model_janus import (JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock,
+                                      ActionType)
+
+connection = symbols('connection')
+STATES = [connection >= 3, connection < 3, connection > 8, true, connection <= 5]
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4), (2, 5)], [(6, 7), (6, 8), (7, 9), (7, 10)]]
+LABELS = list(range(11))
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def make_NFs(rng):
+    # 优先级各不相同；部分 NF 把端口改写到后面 NF 的端口，形成依赖
+    NFs = []
+    for index in range(6):
+        action = {'aciton_type': ActionType.forward}
+        if index < 5 and rng.random() < 0.3:
+            action = {'aciton_type': ActionType.modify, 'content': {'dst_port': rng.randrange(index + 1, 6)}}
+        NFs.append(NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': index}, action, priority=rng.randint(1, 5)))
+    return NFs
+
+
+def random_policy(rng, NFs):
+    state_NFs_map = {}
+    for state in rng.sample(STATES, rng.randint(1, 2)):
+        chain = sorted(rng.sample(NFs, rng.randint(1, 3)), key=NFs.index)
+        state_NFs_map[state] = (chain, rng.choice(QOS))
+    return Policy(state_NFs_map, GroupNode(rng.choice(LABELS)), GroupNode(rng.choice(LABELS)))
+
+
+def by_labels(model, compiled):
+    # 原子换为叶标签集合，NF 链保留顺序
+    return {(frozenset(model.label_interner.from_mask(src)), frozenset(model.label_interner.from_mask(dst))):
+            {state: (list(NFs), qos) for state, (NFs, qos) in value.items()}
+            for (src, dst), value in compiled.items()}
+
+
+def full_compile(policies):
+    model = JanusPolicyModel(TREES, [])
+    for p in policies:
+        model.add_policy(p)
+    return by_labels(model, model.compile())
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_incremental_recompile_matches_full_compile(seed):
+    rng = random.Random(seed)
+    NFs = make_NFs(rng)
+    model = JanusPolicyModel(TREES, [])
+    live = [random_policy(rng, NFs) for _ in range(3)]
+    for p in live:
+        model.add_policy(p)
+    model.compile()
+    for _ in range(10):
+        action = rng.random()
+        if action < 0.25 and live:
+            p = rng.choice(live)
+            live.remove(p)
+            model.remove_policy(p)
+        elif action < 0.4 and live:
+            p, q = rng.choice(live), random_policy(rng, NFs)
+            live[live.index(p)] = q
+            model.update_policy(p, q)
+        else:
+            q = random_policy(rng, NFs)
+            live.append(q)
+            model.add_policy(q)
+        assert by_labels(model, model.compile()) == full_compile(live)
+
+
+def test_recompile_only_touches_affected_pairs():
+    rng = random.Random(0)
+    NFs = make_NFs(rng)
+    policies = [Policy({true: ([NFs[0]], QOS[0])}, GroupNode(3), GroupNode(9)),
+                Policy({true: ([NFs[1]], QOS[0])}, GroupNode(5), GroupNode(10))]
+    model = JanusPolicyModel(TREES, [])
+    for p in policies:
+        model.add_policy(p)
+    before = dict(model.compile())
+    model.add_policy(Policy({true: ([NFs[2]], QOS[1])}, GroupNode(3), GroupNode(9)))
+    after = model.compile()
+    untouched = [pair for pair in before if 3 not in model.label_interner.from_mask(pair[0])]
+    assert untouched
+    for pair in untouched:
+        assert after[pair] is before[pair]
+
+
+def test_compiled_is_a_plain_picklable_dict(tmp_path):
+    rng = random.Random(1)
+    NFs = make_NFs(rng)
+    model = JanusPolicyModel(TREES, [])
+    for _ in range(3):
+        model.add_policy(random_policy(rng, NFs))
+    compiled = model.compile()
+    assert type(compiled) is dict
+    assert by_labels(model, pickle.loads(pickle.dumps(compiled))) == by_labels(model, compiled)
+    with pytest.raises(KeyError):
+        compiled[(0, 0)]  # 缺失的源目的对不会被插入
+    assert (0, 0) not in compiled
+    model.add_policy(random_policy(rng, NFs))
+    assert type(model.compile()) is dict
+    write_store(model, str(tmp_path / 'compiled.store'))
+
+
+def test_recompile_merges_only_changed_atomic_states():
+    rng = random.Random(0)
+    NFs = make_NFs(rng)
+    policies = [Policy({connection >= 3: ([NFs[0]], QOS[0]), connection < 3: ([NFs[1]], QOS[0])},
+                       GroupNode(3), GroupNode(9))]
+    model = JanusPolicyModel(TREES, [], instrumentation=Instrumentation())
+    for p in policies:
+        model.add_policy(p)
+    before = dict(model.compile())  # compile() 原地更新 model.compiled
+    model.add_policy(Policy({connection > 8: ([NFs[2]], QOS[1])}, GroupNode(3), GroupNode(9)))
+    model.instrumentation.counters.clear()
+    after = model.compile()
+    pair, = after
+    # connection < 3 不与新增的 connection > 8 相交，其合并输入不变
+    reused = [state for state in after[pair] if after[pair][state] is before[pair].get(state)]
+    assert model.instrumentation.counters['atomic_states_reused'] == len(reused) >= 1
+    assert by_labels(model, after) == full_compile(policies + [
+        Policy({connection > 8: ([NFs[2]], QOS[1])}, GroupNode(3), GroupNode(9))])
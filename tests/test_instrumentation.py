@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 14:20
+@Auth ： xiaolongtuan
+@File ：test_instrumentation.py
+"""
+import io
+import json
+import tracemalloc
+
+import policy_graph_model as legacy
+from instrumentation import Instrumentation, JsonLinesExporter, DISABLED, NULL_STAGE
+from workload import generate_workload, build_model
+
+
+def plain(compiled):
+    return {pair: {state: (tuple(NFs), qos) for state, (NFs, qos) in value.items()}
+            for pair, value in compiled.items()}
+
+
+def test_instrumented_compile_matches_plain_compile():
+    workload = generate_workload(1, seed=2)
+    inst = Instrumentation()
+    events = []
+    inst.add_exporter(events.append)
+    compiled = build_model(workload, instrumentation=inst).compile()
+    assert plain(compiled) == plain(build_model(workload).compile())
+
+    summary = inst.summary()
+    for stage in ['compile', 'graph_normalization', 'graph_union', 'split_atoms', 'decompose_states']:
+        assert summary['stages'][stage]['calls'] >= 1
+    assert summary['counters']['normalized_pairs'] == len(compiled)
+    assert summary['counters']['merged'] + summary['counters']['merge_reused'] <= len(compiled)
+    assert 'merge_cache' in summary['gauges']
+    assert {event.name for event in events} == set(summary['stages'])
+    assert all(event.memory is None for event in events)
+
+
+def test_trace_memory_records_peaks_and_stops_tracing():
+    was_tracing = tracemalloc.is_tracing()
+    inst = Instrumentation(trace_memory=True)
+    build_model(generate_workload(1, seed=3), instrumentation=inst).compile()
+    assert inst.peaks['graph_normalization'] > 0 and 'graph_union' in inst.snapshots
+    inst.close()
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_json_lines_exporter():
+    stream = io.StringIO()
+    inst = Instrumentation()
+    inst.add_exporter(JsonLinesExporter(stream))
+    with inst.stage('outer'):
+        with inst.stage('inner'):
+            pass
+    names = [json.loads(line)['name'] for line in stream.getvalue().splitlines()]
+    assert names == ['inner', 'outer']
+    inst.reset()
+    assert inst.summary() == {'stages': {}, 'counters': {}, 'gauges': {}}
+
+
+def test_disabled_is_a_no_op():
+    assert not DISABLED.enabled
+    assert DISABLED.stage('compile') is NULL_STAGE
+    DISABLED.count('atoms', 3)
+    DISABLED.gauge('merge_cache', None)
+
+
+def test_legacy_model_normalizes_and_unions_with_instrumentation():
+    firewall = legacy.NFBNode(legacy.NetworkFunctionBlock.FIREWALL, {'dst_port': 80},
+                              {'aciton_type': legacy.ActionType.forward})
+    inst = Instrumentation()
+    model = legacy.PolicyModel([[(0, 1), (0, 2), (1, 3), (1, 4)]], [], instrumentation=inst)
+    model.add_policy(legacy.Policy([firewall], [], legacy.GroupNode(1), legacy.GroupNode(2)))
+    model.add_policy(legacy.Policy([firewall], [], legacy.GroupNode(3), legacy.GroupNode(1)))
+    normalized = model.graph_normalization()
+    # 1 拆分为叶 3、4 两个原子，2 为一个原子：1 -> 2 展开为 2 个源目的对，3 -> 1 展开为 2 个
+    assert len(normalized) == 4
+    assert all(len(policy_list) == 1 for policy_list in normalized.values())
+    united = model.graph_union(normalized)
+    assert set(united) == set(normalized)
+
+    summary = inst.summary()
+    for stage in ['graph_normalization', 'leaf_closure', 'split_atoms', 'expand_pairs', 'graph_union']:
+        assert summary['stages'][stage]['calls'] == 1
+    assert summary['counters']['atoms'] == 3
+    assert summary['counters']['normalized_pairs'] == 4
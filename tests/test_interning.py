@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 13:20
+@Auth ： xiaolongtuan
+@File ：test_interning.py
+"""
+import gc
+import pickle
+
+import pytest
+
+from colections_cul import FrozenDict, InternTable, freeze
+from policy_graph_model_janus import NFBNode, GroupNode, NetworkFunctionBlock, ActionType, Flow, DiEdge
+
+MODIFY = {'aciton_type': ActionType.modify, 'content': {'dst_port': 8080}}
+
+
+def test_equal_content_is_one_object():
+    a = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80, 'proto': 'tcp'}, MODIFY, priority=2)
+    b = NFBNode(NetworkFunctionBlock.FIREWALL, {'proto': 'tcp', 'dst_port': 80}, dict(MODIFY), priority=2)
+    assert a is b and hash(a) == hash(b)
+    assert NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80, 'proto': 'tcp'}, MODIFY, priority=3) is not a
+    assert GroupNode('web') is GroupNode('web')
+
+
+def test_nodes_are_immutable():
+    NF = NFBNode(NetworkFunctionBlock.IDS, {'dst_port': 80}, MODIFY)
+    with pytest.raises(AttributeError):
+        NF.priority = 5
+    with pytest.raises(TypeError):
+        NF.match['dst_port'] = 81
+    with pytest.raises(AttributeError):
+        GroupNode('web').label = 'db'
+
+
+def test_output_flow_does_not_touch_the_match():
+    NF = NFBNode(NetworkFunctionBlock.LOAD_BALANCER, {'dst_port': 80}, MODIFY)
+    assert NF.get_output_flow() == {'dst_port': 8080}
+    assert NF.match == {'dst_port': 80}
+
+
+def test_pickle_round_trip_reinterns():
+    NF = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': (1, 1024)}, MODIFY, priority=4, qos={'b/w': 'high'})
+    assert pickle.loads(pickle.dumps(NF)) is NF
+    assert pickle.loads(pickle.dumps(GroupNode(7))) is GroupNode(7)
+
+
+def test_value_objects_compare_by_content():
+    assert Flow('10.0.0.1', '10.0.0.2', 'tcp', 80) == Flow('10.0.0.1', '10.0.0.2', 'tcp', 80)
+    assert len({DiEdge('a', 'b', 'x > 2', {'b/w': ('min', 'high')}),
+                DiEdge('a', 'b', 'x > 2', {'b/w': ('min', 'high')})}) == 1
+    edge = pickle.loads(pickle.dumps(DiEdge('a', 'b', 'x > 2')))
+    assert edge == DiEdge('a', 'b', 'x > 2')
+    with pytest.raises(AttributeError):
+        edge.condition = 'x > 3'
+
+
+def test_freeze_is_recursive_and_hashable():
+    frozen = freeze({'a': [1, {'b': {2, 3}}], 'c': (4,)})
+    assert isinstance(frozen, FrozenDict)
+    assert frozen == {'a': (1, {'b': frozenset({2, 3})}), 'c': (4,)}
+    assert hash(frozen) == hash(freeze({'c': [4], 'a': (1, {'b': {3, 2}})}))
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_intern_table_releases_unused_objects():
+    class Box:
+        pass
+
+    table = InternTable()
+    box = table.intern('key', Box)
+    assert table.intern('key', Box) is box and table.hits == 1
+    del box
+    gc.collect()
+    assert len(table) == 0
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 09:00
+@Auth ： xiaolongtuan
+@File ：test_label_compatibility.py
+"""
+from sympy import true
+
+from policy_graph_model_janus import (JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock,
+                                      ActionType)
+
+TREES = [[('T', 'T1'), ('T', 'T2')], [('L', 'L1'), ('L', 'L2'), ('L', 'L3')]]
+MAPPINGS = [('T1', 'L1'), ('T1', 'L2')]  # 租户 T1 放置在两个相邻位置
+FIREWALL = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, {'aciton_type': ActionType.forward})
+
+
+def policy(src, dst):
+    return Policy({true: ([FIREWALL], ('min', 'b/w', 1))}, GroupNode(src), GroupNode(dst))
+
+
+def compile_by_labels(model):
+    compiled = model.compile()
+    return {(frozenset(model.label_interner.from_mask(src)), frozenset(model.label_interner.from_mask(dst))): value
+            for (src, dst), value in compiled.items()}
+
+
+def build(policies, mappings=MAPPINGS):
+    model = JanusPolicyModel(TREES, mappings)
+    for p in policies:
+        model.add_policy(p)
+    return model
+
+
+def test_tenant_mapped_to_two_locations_keeps_its_policies():
+    model = build([policy('T1', 'T2'), policy('L1', 'L2')])
+    compiled = compile_by_labels(model)
+    # T1 的叶同时带有 L1、L2 标签，是真实存在的端点
+    assert (frozenset({'T1'}), frozenset({'T2'})) in compiled
+    assert (frozenset({'L1'}), frozenset({'T1'})) in compiled
+    assert (frozenset({'T1'}), frozenset({'L2'})) in compiled
+
+
+def test_explicit_policy_to_unmapped_location_is_never_dropped():
+    # 源与目的是不同的端点：T1 放置在 L1、L2 不妨碍它访问 L3 中的端点
+    model = build([policy('T1', 'L3'), policy('T1', 'L1'), policy('T2', 'L3')])
+    compiled = compile_by_labels(model)
+    assert compiled[(frozenset({'T1'}), frozenset({'L3'}))]
+    assert (frozenset({'T1'}), frozenset({'L1'})) in compiled
+    assert (frozenset({'T2'}), frozenset({'L3'})) in compiled
+
+
+def test_policy_to_location_root_and_leaf_agree():
+    by_leaf = compile_by_labels(build([policy('T1', 'L3')]))
+    by_root = compile_by_labels(build([policy('T1', 'L')]))
+    # 两个模型的原子划分不同，按覆盖 L3 叶的目的原子比较
+    leaf_value = by_leaf[(frozenset({'T1'}), frozenset({'L3'}))]
+    root_values = [value for (src, dst), value in by_root.items() if 'T1' in src and 'L3' in dst]
+    assert len(root_values) == 1
+    assert {state: list(NFs) for state, (NFs, _) in leaf_value.items()} == \
+           {state: list(NFs) for state, (NFs, _) in root_values[0].items()}
+
+
+def test_every_source_destination_atom_pair_is_compiled():
+    policies = [policy(src, dst) for src in ('T1', 'T2', 'L1', 'L2', 'L3') for dst in ('T1', 'L1', 'L3')]
+    model = build(policies)
+    compiled = model.compile()
+    expected = {(src, dst) for p in policies
+                for src in model.atom_index.atoms_of(p.src_EPG.label)
+                for dst in model.atom_index.atoms_of(p.dst_EPG.label)}
+    assert set(compiled) == expected
+
+
+def test_incremental_recompile_matches_full_compile():
+    model = build([policy('T1', 'T2')])
+    model.compile()
+    model.add_policy(policy('T1', 'L3'))
+    model.add_policy(policy('L2', 'T1'))
+    incremental = compile_by_labels(model)
+    full = compile_by_labels(build([policy('T1', 'T2'), policy('T1', 'L3'), policy('L2', 'T1')]))
+    assert incremental.keys() == full.keys()
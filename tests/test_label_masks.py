@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 11:50
+@Auth ： xiaolongtuan
+@File ：test_label_masks.py
+"""
+import random
+
+import pytest
+
+from colections_cul import mask_from_indices, iter_bits
+from label_namespace import LabelInterner
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mask_round_trip(seed):
+    rng = random.Random(seed)
+    indices = sorted(rng.sample(range(300), rng.randint(0, 40)))
+    mask = mask_from_indices(indices)
+    assert mask == sum(1 << index for index in indices)
+    assert list(iter_bits(mask)) == indices
+    assert bin(mask).count('1') == len(indices)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mask_operations_match_set_operations(seed):
+    rng = random.Random(seed)
+    interner = LabelInterner()
+    labels = [f'label{index}' for index in range(70)]
+    sets = [set(rng.sample(labels, rng.randint(1, 20))) for _ in range(5)]
+    masks = [interner.to_mask(s) for s in sets]
+    for s, mask in zip(sets, masks):
+        assert set(interner.from_mask(mask)) == s
+        for other, other_mask in zip(sets, masks):
+            assert (mask & other_mask == mask) == (s <= other)
+            assert set(interner.from_mask(mask & other_mask)) == s & other
+
+
+def test_interner_numbering_is_stable():
+    interner = LabelInterner(['a', 'b'])
+    assert interner.to_mask(['b']) == 0b10
+    assert interner.to_mask(['c', 'a']) == 0b101
+    assert interner.labels == ['a', 'b', 'c']
+    assert 'c' in interner and len(interner) == 3
+
+
+def test_interner_from_sparse_ids_keeps_global_masks():
+    interner = LabelInterner.from_ids({'b': 1, 'e': 4})
+    assert interner.to_mask(['e', 'b']) == 0b10010
+    assert sorted(interner.from_mask(0b10010)) == ['b', 'e']
+    assert 'a' not in interner and len(interner) == 2
+    assert interner.intern('f') == 5  # 新标签排在最大编号之后
+
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 12:00
+@Auth ： xiaolongtuan
+@File ：test_leaf_closure.py
+"""
+import random
+
+import pytest
+
+from label_namespace import LeafClosure, tree_to_dnf
+from policy_graph_error import InvalidPolicyGraphError
+
+
+def random_tree(rng, size):
+    return [(rng.randrange(child), child) for child in range(1, size)]
+
+
+def leaves_of(edges, node):
+    # 递归定义：叶节点的闭包为自身，其余为子节点闭包之并
+    children = [child for parent, child in edges if parent == node]
+    if not children:
+        return {node}
+    return set().union(*(leaves_of(edges, child) for child in children))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_closure_matches_recursive_definition(seed):
+    edges = random_tree(random.Random(seed), 30)
+    closures = LeafClosure(edges).closures()
+    assert set(closures) == set(range(30))
+    for node, leaves in closures.items():
+        assert leaves == leaves_of(edges, node)
+
+
+def test_single_child_shares_the_closure_object():
+    closure = LeafClosure([(0, 1), (1, 2), (2, 3), (2, 4)])
+    assert closure.closure(0) is closure.closure(2)
+
+
+def test_mapping_adds_the_mapped_closure():
+    # (5, 1) 表示 1 包含 5
+    closure = LeafClosure([(0, 1), (0, 2), (5, 6), (5, 7)], [(5, 1)])
+    assert closure.closure(1) == {1, 6, 7}
+    assert closure.closure(0) == {1, 2, 6, 7}
+    assert closure.closure('unknown') == {'unknown'}
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(InvalidPolicyGraphError):
+        LeafClosure([(0, 1), (1, 2)], [(0, 2)]).closure(0)
+
+
+def test_dnf_lists_the_leaves():
+    dnf = tree_to_dnf([(0, 1), (0, 2), (1, 3), (1, 4)], [])
+    assert set(dnf[0].split(' or ')) == {'2', '3', '4'}
+    assert dnf[3] == '3'
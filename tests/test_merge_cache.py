@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 10:20
+@Auth ： xiaolongtuan
+@File ：test_merge_cache.py
+"""
+import os
+
+import pytest
+from sympy import symbols
+
+from colections_cul import FrozenDict
+from compile_store import compile_with_store
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+TREES = [[(0, 1), (0, 2)]]
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def make_model():
+    forward = {'aciton_type': ActionType.forward}
+    firewall = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, forward, priority=3)
+    ids = NFBNode(NetworkFunctionBlock.IDS, {'dst_port': 443}, forward, priority=1)
+    model = JanusPolicyModel(TREES, [])
+    # 同一组状态与 NF 链用于三个源目的对，这些源目的对的输入相同
+    state_NFs_map = {connection >= 3: ([firewall, ids], QOS[0]), connection < 3: ([ids], QOS[1])}
+    for src, dst in [(1, 2), (2, 1), (1, 1)]:
+        model.add_policy(Policy(dict(state_NFs_map), GroupNode(src), GroupNode(dst)))
+    return model
+
+
+def assert_frozen(result):
+    assert isinstance(result, FrozenDict)
+    with pytest.raises(TypeError):
+        result[connection > 100] = ((), QOS[0])
+    for NFs, _ in result.values():
+        assert isinstance(NFs, tuple)
+
+
+def test_pairs_with_same_input_share_a_frozen_result():
+    compiled = make_model().compile()
+    results = list(compiled.values())
+    assert len(results) == 3
+    assert all(result is results[0] for result in results)
+    assert_frozen(results[0])
+
+
+def test_cache_hit_returns_the_frozen_result():
+    model = make_model()
+    first = model.compile()
+    # 另一个模型沿用同一个合并缓存，相同的输入直接取缓存结果
+    other = make_model()
+    other.merge_cache = model.merge_cache
+    again = other.compile()
+    assert model.merge_cache.hits == 1
+    for pair, result in again.items():
+        assert result is first[pair]
+        assert_frozen(result)
+
+
+def test_store_decoded_results_are_frozen(tmp_path):
+    path = os.path.join(tmp_path, 'compiled.store')
+    expected = {pair: dict(result) for pair, result in compile_with_store(make_model(), path).items()}
+    model = make_model()
+    model.merge_cache.maxsize = 0
+    compiled = compile_with_store(model, path)
+    assert set(compiled) == set(expected)
+    for pair, result in compiled.items():
+        assert_frozen(result)
+        assert dict(result) == expected[pair]
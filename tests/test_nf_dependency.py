@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 10:00
+@Auth ： xiaolongtuan
+@File ：test_nf_dependency.py
+"""
+import random
+
+import pytest
+
+from policy_graph_model_janus import NFDependencyIndex, NFBNode, NetworkFunctionBlock, ActionType, is_overlap
+
+
+def random_NFs(rng, count):
+    NFs = []
+    for index in range(count):
+        match = {'dst_port': rng.choice([rng.randint(1, 20), (rng.randint(1, 10), rng.randint(10, 20)), '*'])}
+        if rng.random() < 0.5:
+            match['src_ip'] = rng.choice(['10.0.0.0/8', '10.1.0.0/16', '192.168.0.0/24'])
+        action = {'aciton_type': ActionType.forward}
+        if rng.random() < 0.4:
+            action = {'aciton_type': ActionType.modify, 'content': {'dst_port': rng.randint(1, 20)}}
+        NFs.append(NFBNode(NetworkFunctionBlock.FIREWALL, match, action, priority=index))
+    return NFs
+
+
+def brute_force(NFs):
+    return {(NF, other) for NF in NFs for other in NFs
+            if NF is not other and is_overlap(NF.get_output_flow(), other.get_input_flow())}
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_constraints_match_pairwise_overlap(seed):
+    rng = random.Random(seed)
+    NFs = random_NFs(rng, 25)
+    index = NFDependencyIndex(NFs)
+    assert index.constraints(NFs) == brute_force(NFs)
+    subset = rng.sample(NFs, 8)
+    assert index.constraints(subset) == brute_force(subset)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_registering_new_NFs_keeps_memo_exact(seed):
+    rng = random.Random(seed)
+    NFs = random_NFs(rng, 30)
+    index = NFDependencyIndex(NFs[:15])
+    index.constraints(NFs[:15])
+    index.register(NFs[15:])
+    assert index.constraints(NFs) == brute_force(NFs)
+
+
+def test_register_keeps_unrelated_memo_entries():
+    forward = {'aciton_type': ActionType.forward}
+    a = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, forward, priority=101)
+    b = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 443}, forward, priority=102)
+    index = NFDependencyIndex([a, b])
+    index.dependents(a)
+    index.dependents(b)
+    index.register([NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 443}, forward, priority=103)])
+    misses = index.misses
+    index.dependents(a)
+    index.dependents(b)
+    assert index.misses == misses
+    assert len(index.dependents(b)) == 1
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 11:00
+@Auth ： xiaolongtuan
+@File ：test_parallel_union.py
+"""
+import random
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from sympy import symbols, true
+
+import policy_graph_model_janus
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+STATES = [connection >= 3, connection < 3, connection > 8, true]
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4), (2, 5), (2, 6)]]
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def build(seed, **options):
+    rng = random.Random(seed)
+    NFs = [NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': index}, {'aciton_type': ActionType.forward},
+                   priority=rng.randint(1, 3)) for index in range(5)]
+    model = JanusPolicyModel(TREES, [], **options)
+    for _ in range(10):
+        state_NFs_map = {state: (sorted(rng.sample(NFs, rng.randint(1, 3)), key=NFs.index), rng.choice(QOS))
+                         for state in rng.sample(STATES, rng.randint(1, 3))}
+        model.add_policy(Policy(state_NFs_map, GroupNode(rng.randrange(7)), GroupNode(rng.randrange(7))))
+    return model
+
+
+def chains(compiled):
+    return {pair: {state: (tuple(NFs), qos) for state, (NFs, qos) in value.items()}
+            for pair, value in compiled.items()}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_parallel_merge_matches_serial(seed):
+    serial = build(seed).compile()
+    parallel = build(seed, workers=2, chunk_size=1).compile()
+    assert chains(parallel) == chains(serial)
+
+
+def test_unavailable_pool_falls_back_to_serial(monkeypatch):
+    def broken(*args, **kwargs):
+        raise BrokenProcessPool('进程池异常退出')
+    monkeypatch.setattr(policy_graph_model_janus, 'parallel_merge', broken)
+    assert chains(build(0, workers=2, chunk_size=1).compile()) == chains(build(0).compile())
+
+
+@pytest.mark.parametrize('error', [TypeError, AttributeError])
+def test_merge_bugs_are_not_hidden_by_fallback(monkeypatch, error):
+    def buggy(*args, **kwargs):
+        raise error('合并出错')
+    monkeypatch.setattr(policy_graph_model_janus, 'parallel_merge', buggy)
+    with pytest.raises(error):
+        build(0, workers=2, chunk_size=1).compile()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 13:00
+@Auth ： xiaolongtuan
+@File ：test_sharding.py
+"""
+import random
+
+import pytest
+from sympy import symbols, true
+
+import sharding
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+STATES = [connection >= 3, connection < 3, true]
+# 三个命名空间分量：0-5、6-10、11-13
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4), (2, 5)], [(6, 7), (6, 8), (7, 9), (7, 10)], [(11, 12), (11, 13)]]
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def component(label):
+    return 0 if label < 6 else (1 if label < 11 else 2)
+
+
+def random_policies(rng):
+    NFs = [NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': index}, {'aciton_type': ActionType.forward},
+                   priority=rng.randint(1, 3)) for index in range(5)]
+    policies = []
+    for _ in range(8):
+        src = rng.randrange(14)
+        # 多数策略在分量内，少数跨分量，把两个分量连入同一分片
+        candidates = [label for label in range(14) if component(label) == component(src)] \
+            if rng.random() < 0.8 else range(14)
+        state_NFs_map = {state: (sorted(rng.sample(NFs, rng.randint(1, 3)), key=NFs.index), rng.choice(QOS))
+                         for state in rng.sample(STATES, rng.randint(1, 2))}
+        policies.append(Policy(state_NFs_map, GroupNode(src), GroupNode(rng.choice(candidates))))
+    return policies
+
+
+def build(policies):
+    model = JanusPolicyModel(TREES, [])
+    for p in policies:
+        model.add_policy(p)
+    return model
+
+
+def by_labels(model, compiled):
+    return {(frozenset(model.label_interner.from_mask(src)), frozenset(model.label_interner.from_mask(dst))):
+            {state: (tuple(NFs), qos) for state, (NFs, qos) in value.items()}
+            for (src, dst), value in compiled.items()}
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_sharded_compile_matches_full_compile(seed):
+    policies = random_policies(random.Random(seed))
+    full = build(policies)
+    expected = by_labels(full, full.compile())
+    model = build(policies)
+    assert by_labels(model, sharding.compile_sharded(model, workers=2 if seed % 2 else 1)) == expected
+
+
+def test_shard_files_round_trip(tmp_path):
+    policies = random_policies(random.Random(3))
+    full = build(policies)
+    expected = by_labels(full, full.compile())
+    model = build(policies)
+    paths = sharding.write_shards(model, str(tmp_path))
+    results = [sharding.compile_shard_file(path, path + '.out') for path in paths]
+    assert by_labels(model, sharding.merge_shard_results(model, results)) == expected
+    if len(results) > 1:
+        with pytest.raises(FileNotFoundError):
+            sharding.merge_shard_results(model, results[1:])
+
+
+def test_shards_follow_connected_components():
+    forward = {'aciton_type': ActionType.forward}
+    chain = ([NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 1}, forward)], QOS[0])
+    model = build([Policy({true: chain}, GroupNode(1), GroupNode(2)),
+                   Policy({true: chain}, GroupNode(7), GroupNode(12)),
+                   Policy({true: chain}, GroupNode(3), GroupNode(4))])
+    shards = sharding.plan_shards(model)
+    assert [len(shard.policies) for shard in shards] == [2, 1]
+    assert [len(shard.label_trees) for shard in shards] == [1, 2]
+
+
+def test_each_shard_carries_only_its_own_leaves():
+    policies = random_policies(random.Random(5))
+    model = build(policies)
+    sharding._prepare_interner(model)
+    for shard in sharding.plan_shards(model):
+        label_ids = sharding._shard_spec(model, shard, {})['label_ids']
+        EPGs = {label for p in shard.policies for label in (p.src_EPG.label, p.dst_EPG.label)}
+        leaves = set().union(*(model.label_closure.closure(EPG) for EPG in EPGs))
+        assert set(label_ids) == leaves
+        assert all(model.label_interner.index[label] == index for label, index in label_ids.items())
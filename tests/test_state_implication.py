@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 12:35
+@Auth ： xiaolongtuan
+@File ：test_state_implication.py
+"""
+import random
+
+import pytest
+from sympy import symbols, Rational, And, Or, true
+
+from state_resolver import StateImplicationChecker, decompose_states
+
+x, y = symbols('x y')
+POINTS = [{x: Rational(a, 2), y: Rational(b, 2)} for a in range(-2, 15) for b in range(-2, 15)]
+
+
+def brute_implies(state, other, points=POINTS):
+    return all(bool(other.subs(point)) for point in points if bool(state.subs(point)))
+
+
+def random_state(rng):
+    parts = []
+    for var in rng.sample([x, y], rng.randint(1, 2)):
+        value = rng.randint(0, 6)
+        parts.append(rng.choice([var > value, var >= value, var < value, var <= value]))
+    return And(*parts)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_box_implication_matches_sampling(seed):
+    rng = random.Random(seed)
+    states = [random_state(rng) for _ in range(5)]
+    checker = StateImplicationChecker()
+    for state in states:
+        for other in states:
+            assert checker.implies(state, other) == brute_implies(state, other)
+
+
+def test_non_box_states_use_satisfiability():
+    checker = StateImplicationChecker()
+    either = Or(x > 2, y > 2)
+    assert checker.implies(x > 3, either)
+    assert not checker.implies(either, x > 3)
+    assert checker.implies(And(x > 2, y > 2), either)
+    assert checker.implies(either, true)
+
+
+def test_atomic_states_imply_their_parents():
+    states = [x >= 3, x < 3, x > 8]
+    checker = StateImplicationChecker()
+    for atomic_state in decompose_states(states):
+        parents = [state for state in states if checker.implies(atomic_state, state)]
+        points = [{x: Rational(a, 2)} for a in range(-2, 25)]
+        assert parents == [state for state in states if brute_implies(atomic_state, state, points)]
+
+
+def test_cache_is_bounded_and_reused():
+    checker = StateImplicationChecker(maxsize=2)
+    checker.implies(x > 3, x > 2)
+    checker.implies(x > 3, x > 2)
+    assert checker.cache_info().hits == 1
+    checker.implies(x > 4, x > 2)
+    checker.implies(x > 5, x > 2)
+    assert checker.cache_info().currsize == 2
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 11:20
+@Auth ： xiaolongtuan
+@File ：test_state_switcher.py
+"""
+import asyncio
+
+import pytest
+from sympy import symbols
+
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+from state_switcher import StateSwitcher
+
+connection = symbols('connection')
+FORWARD = {'aciton_type': ActionType.forward}
+FIREWALL = NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': 80}, FORWARD, priority=2)
+IDS = NFBNode(NetworkFunctionBlock.IDS, {'dst_port': 443}, FORWARD, priority=1)
+
+
+def compiled():
+    model = JanusPolicyModel([[(0, 1), (0, 2)]], [])
+    model.add_policy(Policy({connection >= 3: ([FIREWALL, IDS], ('min', 'b/w', 1)),
+                             connection < 3: ([IDS], ('max', 'b/w', 3))}, GroupNode(1), GroupNode(2)))
+    return model.compile()
+
+
+def failing_apply(updates):
+    raise ValueError('apply 出错')
+
+
+def test_submitted_events_switch_the_active_state():
+    async def main():
+        switcher = StateSwitcher(compiled(), counters={'connection': 0})
+        (pair,) = switcher.selectors
+        assert tuple(switcher.chain_of(pair)[0]) == (IDS,)
+        switcher.start()
+        await switcher.submit({'connection': 5})
+        await switcher.submit({'connection': 6})
+        await switcher.stop()
+        change = switcher.changes.get_nowait()
+        assert change.pair == pair and tuple(change.NFs) == (FIREWALL, IDS)
+        assert switcher.changes.empty()
+        assert switcher.processed == 2
+    asyncio.run(main())
+
+
+def test_apply_error_is_raised_from_submit_and_stop():
+    async def main():
+        switcher = StateSwitcher(compiled(), queue_size=1)
+        switcher.apply = failing_apply
+        switcher.start()
+        with pytest.raises(ValueError):
+            # 事件队列已满时的 submit 在任务因异常结束后不再等待
+            for value in range(10):
+                await asyncio.wait_for(switcher.submit({'connection': value}), timeout=1)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(switcher.stop(), timeout=1)
+        assert switcher._task is None
+    asyncio.run(main())
+
+
+def test_stop_cancels_when_nobody_reads_changes():
+    async def main():
+        switcher = StateSwitcher(compiled(), output_size=1, batch_size=1)
+        switcher.start()
+        for value in [5, 0, 5, 0]:
+            await switcher.submit({'connection': value})
+        await asyncio.wait_for(switcher.stop(stall_interval=0.05), timeout=2)
+        assert switcher.changes.full()
+        assert switcher._task is None
+    asyncio.run(main())
+
+
+def test_stop_with_timeout_cancels_a_stalled_task():
+    async def main():
+        switcher = StateSwitcher(compiled(), output_size=1, batch_size=1)
+        switcher.start()
+        for value in [5, 0, 5]:
+            await switcher.submit({'connection': value})
+        await asyncio.wait_for(switcher.stop(timeout=0.05), timeout=2)
+        assert switcher._task is None
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 10:40
+@Auth ： xiaolongtuan
+@File ：test_streaming_compile.py
+"""
+import random
+
+import pytest
+from sympy import symbols, true
+
+from policy_graph_model_janus import JanusPolicyModel, Policy, GroupNode, NFBNode, NetworkFunctionBlock, ActionType
+
+connection = symbols('connection')
+STATES = [connection >= 3, connection < 3, true]
+TREES = [[(0, 1), (0, 2), (1, 3), (1, 4)], [(5, 6), (5, 7), (5, 8)]]
+MAPPINGS = [(3, 6), (4, 7)]
+QOS = [('min', 'b/w', 1), ('max', 'b/w', 3)]
+
+
+def random_policies(rng, count):
+    NFs = [NFBNode(NetworkFunctionBlock.FIREWALL, {'dst_port': index}, {'aciton_type': ActionType.forward},
+                   priority=rng.randint(1, 3)) for index in range(5)]
+    policies = []
+    for _ in range(count):
+        state_NFs_map = {state: (sorted(rng.sample(NFs, rng.randint(1, 3)), key=NFs.index), rng.choice(QOS))
+                         for state in rng.sample(STATES, rng.randint(1, 2))}
+        policies.append(Policy(state_NFs_map, GroupNode(rng.randrange(9)), GroupNode(rng.randrange(9))))
+    return policies
+
+
+def build(policies, **options):
+    model = JanusPolicyModel(TREES, MAPPINGS, **options)
+    for p in policies:
+        model.add_policy(p)
+    return model
+
+
+def records_of_compile(model):
+    return {(src, dst, state, tuple(NFs), qos)
+            for (src, dst), value in model.compile().items() for state, (NFs, qos) in value.items()}
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_streaming_compile_matches_full_compile(seed):
+    rng = random.Random(seed)
+    policies = random_policies(rng, 8)
+    streaming = build(policies, chunk_size=2)
+    records = [(r.src, r.dst, r.state, tuple(r.NFs), r.qos) for r in streaming.iter_compile()]
+    full = build(policies)
+    assert len(records) == len(set(records))
+    assert set(records) == records_of_compile(full)
+    assert streaming.compiled is None
+
+
+def test_streaming_compile_does_not_normalize_all_pairs(monkeypatch):
+    policies = random_policies(random.Random(0), 8)
+    expected = records_of_compile(build(policies))
+    model = build(policies, chunk_size=1)
+
+    def graph_normalization():
+        raise AssertionError('iter_compile 不应构建全部源目的对的输入')
+    monkeypatch.setattr(model, 'graph_normalization', graph_normalization)
+    records = model.iter_compile()
+    first = next(records)
+    assert (first.src, first.dst, first.state, tuple(first.NFs), first.qos) in expected
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_iter_union_matches_graph_union_and_consumes_input(seed):
+    policies = random_policies(random.Random(seed), 8)
+    full = build(policies)
+    expected = full.graph_union(full.graph_normalization())
+
+    model = build(policies, chunk_size=1)
+    normalized = model.graph_normalization()
+    total = len(normalized)
+    merged = {}
+    for count, (pair, value) in enumerate(model.iter_union(normalized), 1):
+        assert pair not in normalized
+        assert len(normalized) == total - count  # 每批只取出一个源目的对
+        merged[pair] = value
+    assert not normalized
+    assert merged == expected
+    assert model.compiled is None
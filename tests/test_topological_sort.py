@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 09:40
+@Auth ： xiaolongtuan
+@File ：test_topological_sort.py
+"""
+import random
+from collections import namedtuple
+
+import pytest
+
+from policy_graph_error import InvalidPolicyGraphError
+from topological_sort import priority_topological_sort
+
+Item = namedtuple('Item', ['name', 'priority'])
+
+
+def random_dag(rng, size):
+    items = [Item(f'n{index}', rng.randint(1, 4)) for index in range(size)]
+    edges = {(items[i], items[j]) for i in range(size) for j in range(i + 1, size) if rng.random() < 0.2}
+    return items, list(edges)
+
+
+def test_ready_elements_are_ordered_by_priority():
+    a, b, c = Item('a', 1), Item('b', 5), Item('c', 3)
+    assert priority_topological_sort([a, b, c], []) == [b, c, a]
+    assert priority_topological_sort([a, b, c], [(a, b)]) == [c, a, b]
+
+
+def test_cycle_raises_with_blocked_elements():
+    a, b = Item('a', 1), Item('b', 1)
+    with pytest.raises(InvalidPolicyGraphError):
+        priority_topological_sort([a, b], [(a, b), (b, a)])
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_order_respects_every_dependency(seed):
+    rng = random.Random(seed)
+    items, edges = random_dag(rng, 12)
+    rng.shuffle(items)
+    position = {item: index for index, item in enumerate(priority_topological_sort(items, edges))}
+    assert len(position) == len(items)
+    assert all(position[u] < position[v] for u, v in edges)
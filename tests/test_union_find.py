@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 13:10
+@Auth ： xiaolongtuan
+@File ：test_union_find.py
+"""
+import random
+
+import pytest
+
+from label_namespace import UnionFind, label_namespace_define
+
+
+def components(labels, edges):
+    # 参照实现：逐边合并集合
+    groups = {label: {label} for label in labels}
+    for u, v in edges:
+        if groups[u] is not groups[v]:
+            merged = groups[u] | groups[v]
+            for label in merged:
+                groups[label] = merged
+    return groups
+
+
+def random_edges(rng, labels, count):
+    return [(rng.choice(labels), rng.choice(labels)) for _ in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_bulk_union_matches_pairwise_union(seed):
+    rng = random.Random(seed)
+    labels = [f'label{index}' for index in range(40)] + list(range(30))  # 超过初始容量，触发扩容
+    edges = random_edges(rng, labels, 45)
+    bulk, single = UnionFind(labels=labels), UnionFind(labels=labels)
+    bulk.union_many(edges)
+    for u, v in edges:
+        single.union(u, v)
+    groups = components(labels, edges)
+    pairs = random_edges(rng, labels, 200)
+    expected = [v in groups[u] for u, v in pairs]
+    assert list(bulk.connected_many(pairs)) == expected
+    assert [single.connected(u, v) for u, v in pairs] == expected
+    roots = bulk.find_many(labels)
+    for label, root in zip(labels, roots):
+        assert root in groups[label] and root == bulk.find(label)
+
+
+def test_unknown_labels_are_their_own_component():
+    uf = label_namespace_define([[(0, 1), (1, 2)], [(3, 4)]], [(2, 3)])
+    assert uf.connected(0, 4)
+    assert uf.find('missing') == 'missing'
+    assert uf.find_many(['missing', 0]) == ['missing', uf.find(0)]
+    assert not uf.connected('missing', 0)
+    assert 'missing' not in uf and len(uf) == 5
+
+
+def test_integer_size_compatibility():
+    uf = UnionFind(4)
+    uf.union(0, 3)
+    assert uf.connected(3, 0) and not uf.connected(1, 2)
+    assert len(uf) == 4
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/19 14:05
+@Auth ： xiaolongtuan
+@File ：test_workload.py
+"""
+import json
+import os
+
+from benchmark import STAGES, bench_size, compare, format_table, main
+from compile_store import model_digest
+from workload import generate_workload, build_model
+
+
+def test_same_seed_gives_the_same_workload():
+    first, second = generate_workload(1, seed=5), generate_workload(1, seed=5)
+    assert first.label_trees == second.label_trees
+    assert first.label_mapping_pairs == second.label_mapping_pairs
+    assert model_digest(build_model(first)) == model_digest(build_model(second))
+    assert model_digest(build_model(generate_workload(1, seed=6))) != model_digest(build_model(first))
+
+
+def test_size_scales_the_workload():
+    small, large = generate_workload(1), generate_workload(2)
+    assert len(large.policies) == 2 * len(small.policies)
+    assert len(large.label_trees) == 2 * len(small.label_trees)
+    assert len(large.NFs) == 2 * len(small.NFs)
+
+
+def test_generated_workload_compiles():
+    compiled = build_model(generate_workload(1, seed=1)).compile()
+    assert compiled
+    for value in compiled.values():
+        assert value
+
+
+def test_bench_size_reports_every_stage():
+    result = bench_size(1, repeat=1, memory=False)
+    assert result['size'] == 1 and result['pairs'] > 0
+    for stage in STAGES:
+        assert result[stage]['seconds'] >= 0 and result[stage]['peak_bytes'] is None
+    assert 'graph_union' in format_table([result])
+
+
+def test_compare_flags_only_slower_stages():
+    baseline = [{'size': 1, **{stage: {'seconds': 1.0} for stage in STAGES}}]
+    current = [{'size': 1, **{stage: {'seconds': 1.1} for stage in STAGES}}]
+    current[0]['graph_union'] = {'seconds': 2.0}
+    assert compare(current, baseline) == [(1, 'graph_union', 1.0, 2.0)]
+
+
+def test_main_writes_results_and_checks_baseline(tmp_path, capsys):
+    output = os.path.join(tmp_path, 'results.json')
+    assert main(['--sizes', '1', '--repeat', '1', '--no-memory', '--output', output]) == 0
+    with open(output) as f:
+        results = json.load(f)
+    for stage in STAGES:
+        results[0][stage]['seconds'] = 1e-9  # 极快的基线，当前结果必然回退
+    baseline = os.path.join(tmp_path, 'baseline.json')
+    with open(baseline, 'w') as f:
+        json.dump(results, f)
+    assert main(['--sizes', '1', '--repeat', '1', '--no-memory', '--baseline', baseline]) == 1
+    assert '回退' in capsys.readouterr().out
@@ -4,8 +4,11 @@
 @Auth ： xiaolongtuan
 @File ：topological_sort.py
 """
+import heapq
 from collections import defaultdict, deque
 
+from policy_graph_error import InvalidPolicyGraphError
+
 
 def topological_sort(elements, dependencies):
     # Step 1: Build the graph and compute in-degrees
@@ -39,6 +42,42 @@ def topological_sort(elements, dependencies):
         return -1
 
 
+def default_priority(element):
+    return getattr(element, 'priority', 0)
+
+
+def priority_topological_sort(elements, dependencies, priority=default_priority):
+    '''
+    优先级感知的拓扑排序：就绪的元素中优先级高者先出，优先级相同按 elements 中的先后，结果确定。
+    存在环时抛出 InvalidPolicyGraphError，并给出无法排序的元素
+    '''
+    position = {element: index for index, element in enumerate(elements)}
+    graph = defaultdict(list)
+    in_degree = dict.fromkeys(elements, 0)
+
+    for u, v in dependencies:
+        graph[u].append(v)
+        in_degree[v] += 1
+
+    heap = [(-priority(element), position[element]) for element in elements if in_degree[element] == 0]
+    heapq.heapify(heap)
+
+    topological_order = []
+    while heap:
+        _, index = heapq.heappop(heap)
+        node = elements[index]
+        topological_order.append(node)
+        for neighbor in graph[node]:
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                heapq.heappush(heap, (-priority(neighbor), position[neighbor]))
+
+    if len(topological_order) != len(elements):
+        blocked = [element for element in elements if in_degree[element] > 0]
+        raise InvalidPolicyGraphError(f"不存在可行的功能盒顺序，以下元素间存在环: {blocked}")
+    return topological_order
+
+
 if __name__ == '__main__':
 
     elements = ['A', 'B', 'C', 'D', 'E', 'F']
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+@Time ： 2026/10/18 20:40
+@Auth ： xiaolongtuan
+@File ：workload.py
+"""
+import random
+from collections import namedtuple
+
+from sympy import symbols, true
+
+from policy_graph_model_janus import (NFBNode, NetworkFunctionBlock, ActionType, GroupNode, Policy,
+                                      JanusPolicyModel)
+
+'''
+可复现的合成负载：标签森林、跨树标签映射、EPG、带 NF 链与 Qos 的有状态策略。
+同一 seed 与参数总是生成相同的负载，规模由 size 统一放大
+'''
+
+Workload = namedtuple('Workload', ['label_trees', 'label_mapping_pairs', 'policies', 'states', 'NFs'])
+
+QOS_CHOICES = [('min', 'b/w', 1), ('max', 'b/w', 3)]  # union_qos 可合并的取值
+
+
+def generate_label_forest(rng, trees, depth, fanout):
+    '''
+    :return: 标签树边列表的列表，标签形如 't0.1.2'（树编号与路径）
+    '''
+    forest = []
+    for tree in range(trees):
+        edges = []
+        level = [f't{tree}']
+        for _ in range(depth):
+            next_level = []
+            for parent in level:
+                for child in range(rng.randint(1, fanout)):
+                    label = f'{parent}.{child}'
+                    edges.append((parent, label))
+                    next_level.append(label)
+            level = next_level
+        forest.append(edges)
+    return forest
+
+
+def tree_labels(tree):
+    labels = [tree[0][0]] if tree else []
+    labels.extend(child for _, child in tree)
+    return labels
+
+
+def generate_label_mappings(rng, forest, count):
+    '''
+    映射对 (a, b) 表示 b 包含 a；a 只取自编号更大的树，保证映射不成环
+    '''
+    pairs = []
+    if len(forest) < 2:
+        return pairs
+    for _ in range(count):
+        low, high = sorted(rng.sample(range(len(forest)), 2))
+        pairs.append((rng.choice(tree_labels(forest[high])[1:] or tree_labels(forest[high])),
+                      rng.choice(tree_labels(forest[low]))))
+    return pairs
+
+
+def generate_states(rng, count, variables=('connection', 'rate')):
+    # 单变量阈值状态及 true，覆盖区间快速路径
+    variables = symbols(list(variables))
+    states = [true]
+    while len(states) < count:
+        var = rng.choice(variables)
+        threshold = rng.randint(0, 20)
+        state = rng.choice([var >= threshold, var < threshold, var > threshold, var <= threshold])
+        if state not in states:
+            states.append(state)
+    return states
+
+
+def generate_NFs(rng, count, modify_ratio=0.1):
+    '''
+    各 NF 的端口区间互不相交；修改动作只把端口改写到编号更大的 NF 的区间，依赖与链的顺序一致，不会成环
+    '''
+    NFs = []
+    blocks = list(NetworkFunctionBlock)
+    for index in range(count):
+        match = {'dst_port': (1000 + 10 * index, 1000 + 10 * index + rng.randint(0, 9))}
+        if rng.random() < 0.5:
+            match['src_ip'] = f'10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.0/24'
+        if rng.random() < 0.3:
+            match['protocol'] = rng.choice(['tcp', 'udp'])
+        action = {'aciton_type': ActionType.forward}
+        if index + 1 < count and rng.random() < modify_ratio:
+            target = rng.randrange(index + 1, count)
+            action = {'aciton_type': ActionType.modify, 'content': {'dst_port': 1000 + 10 * target}}
+        NFs.append(NFBNode(rng.choice(blocks), match, action, priority=rng.randint(1, 5)))
+    return NFs
+
+
+def generate_policies(rng, forest, states, NFs, count, chain_length=3, states_per_policy=2):
+    EPGs = [label for tree in forest for label in tree_labels(tree)]
+    policies = []
+    for _ in range(count):
+        state_NFs_map = {}
+        for state in rng.sample(states, min(len(states), rng.randint(1, states_per_policy))):
+            chain = rng.sample(NFs, min(len(NFs), rng.randint(1, chain_length)))
+            chain.sort(key=NFs.index)  # 链按 NF 编号排列，避免不同策略的链互相矛盾
+            state_NFs_map[state] = (chain, rng.choice(QOS_CHOICES))
+        policies.append(Policy(state_NFs_map, GroupNode(rng.choice(EPGs)), GroupNode(rng.choice(EPGs))))
+    return policies
+
+
+def generate_workload(size=1, seed=0, trees=None, depth=3, fanout=3, mappings=None, states=None, NFs=None,
+                      policies=None, chain_length=3):
+    '''
+    :param size: 规模系数，未显式给出的数量参数按其线性放大
+    :return: Workload
+    '''
+    rng = random.Random(seed)
+    forest = generate_label_forest(rng, trees or 2 * size, depth, fanout)
+    mapping_pairs = generate_label_mappings(rng, forest, size if mappings is None else mappings)
+    state_list = generate_states(rng, states or 4 + size)
+    NF_list = generate_NFs(rng, NFs or 8 * size)
+    policy_list = generate_policies(rng, forest, state_list, NF_list, policies or 20 * size, chain_length)
+    return Workload(forest, mapping_pairs, policy_list, state_list, NF_list)
+
+
+def build_model(workload, **options):
+    model = JanusPolicyModel(workload.label_trees, workload.label_mapping_pairs, **options)
+    for p in workload.policies:
+        model.add_policy(p)
+    return model